@@ -0,0 +1,234 @@
+"""
+Consolidate the extracted Section 301 lists in one pass.
+
+Replaces combine_section301_lists.py, deduplicate_section301_lists.py and
+analyze_section301_duplicates.py. The exports/listN_hts_extracted.csv files
+are k-way merged by HTS code, so every code's rows from all lists arrive
+together, and for each code group the same pass
+
+  - writes its rows to section301_all_lists_combined.csv (sorted by code, list),
+  - keeps the row of the latest list (1 < 2 < 3 < 4a) in section301_deduplicated.csv,
+  - writes codes on more than one list (or twice on one) to section301_duplicates.csv,
+    including whether the code moved from a 25% list to List 4A (7.5%).
+
+Time is linear in the rows and memory is bounded by one code group. The
+extractor writes every list sorted by HTS code; a list file that is not
+sorted stops the run (the outputs are only replaced when it completes) unless
+--sort-in-memory is given, which sorts every list in memory first and so holds
+all of them at once.
+
+Usage:
+  python consolidate_section301.py [--exports-dir DIR] [--sort-in-memory] [--metrics JSON] [--profile [DIR]]
+"""
+
+import argparse
+import csv
+import glob
+import heapq
+import itertools
+import os
+import sys
+from collections import Counter
+from typing import Dict, Any, List, Iterator, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+from pipeline_metrics import add_metrics_arguments, metrics_from_args
+
+# Higher number = more recent = higher priority; the most recent list controls
+LIST_PRIORITY = {'1': 1, '2': 2, '3': 3, '4a': 4}
+FULL_RATE_LISTS = ('1', '2', '3')
+TOP_DUPLICATES = 20
+MOVED_EXAMPLES = 10
+
+COMBINED_FILE = 'section301_all_lists_combined.csv'
+DEDUPLICATED_FILE = 'section301_deduplicated.csv'
+DUPLICATES_FILE = 'section301_duplicates.csv'
+
+def list_tariff(list_number: str) -> str:
+    return "25%" if list_number in FULL_RATE_LISTS else "7.5%" if list_number == '4a' else "Unknown"
+
+def list_files(exports_dir: str) -> List[str]:
+    """listN_hts_extracted.csv files, in list order"""
+    return sorted(glob.glob(os.path.join(exports_dir, 'list*_hts_extracted.csv')))
+
+class UnsortedListError(ValueError):
+    """A list file is not sorted by HTS code"""
+
+def read_list(path: str, sort: bool = False) -> Iterator[List[str]]:
+    """HTS_Code, Description, List rows of one list file in code order (file order within a code).
+
+    Without `sort` the file must already be sorted by code; UnsortedListError
+    is raised at the first row out of order.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        rows = (row + [''] * (3 - len(row)) for row in reader if row)
+        if sort:
+            yield from sorted(rows, key=lambda row: row[0])
+            return
+        previous = ''
+        for line, row in enumerate(rows, 2):
+            if row[0] < previous:
+                raise UnsortedListError(
+                    f"{os.path.basename(path)} is not sorted by HTS code ({row[0]} after {previous}, row {line}). "
+                    "Re-run the extraction or pass --sort-in-memory.")
+            previous = row[0]
+            yield row
+
+def merge_lists(paths: List[str], sort: bool = False) -> Iterator[Tuple[str, List[List[str]]]]:
+    """(HTS code, rows of every list in list order) for each code, in code order"""
+    streams = [((row[0], order, row) for row in read_list(path, sort)) for order, path in enumerate(paths)]
+    merged = heapq.merge(*streams, key=lambda item: item[:2])
+    for code, group in itertools.groupby(merged, key=lambda item: item[0]):
+        yield code, [row for _, _, row in group]
+
+def consolidate(exports_dir: str, metrics, sort: bool = False) -> Dict[str, Any]:
+    """Write the combined, deduplicated and duplicates CSVs; return the report"""
+    paths = list_files(exports_dir)
+    if not paths:
+        raise FileNotFoundError(f"No list*_hts_extracted.csv files in {exports_dir}")
+
+    report: Dict[str, Any] = {
+        'files': [os.path.basename(path) for path in paths],
+        'total_entries': 0,
+        'unique_codes': 0,
+        'duplicate_codes': 0,
+        'duplicate_entries': 0,
+        'moved_to_4a': 0,
+        'moved_examples': [],
+        'top_duplicates': [],
+        'combinations': Counter(),
+        'final_by_list': Counter(),
+    }
+    # Min-heap of the TOP_DUPLICATES largest groups; codes arrive in order, so
+    # among equal counts the later code is the smaller item
+    top: List[Tuple[int, int, str, List[str]]] = []
+
+    # Written to temporary files first, so a failed run leaves the previous outputs in place
+    outputs = [os.path.join(exports_dir, name) for name in (COMBINED_FILE, DEDUPLICATED_FILE, DUPLICATES_FILE)]
+    temp_paths = [f'{path}.{os.getpid()}.tmp' for path in outputs]
+    try:
+        _write_outputs(paths, temp_paths, report, top, metrics, sort)
+        for temp_path, path in zip(temp_paths, outputs):
+            os.replace(temp_path, path)
+    finally:
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    report['top_duplicates'] = [(code, lists) for _, _, code, lists in sorted(top, reverse=True)]
+    return report
+
+def _write_outputs(paths: List[str], temp_paths: List[str], report: Dict[str, Any],
+                   top: List[Tuple[int, int, str, List[str]]], metrics, sort: bool):
+    """The merge pass: write the three CSVs to temp_paths and fill in the report"""
+    combined_path, dedup_path, dup_path = temp_paths
+    with open(combined_path, 'w', encoding='utf-8', newline='') as combined_f, \
+         open(dedup_path, 'w', encoding='utf-8', newline='') as dedup_f, \
+         open(dup_path, 'w', encoding='utf-8', newline='') as dup_f:
+        combined = csv.writer(combined_f, lineterminator='\n')
+        deduplicated = csv.writer(dedup_f, lineterminator='\n')
+        duplicates = csv.writer(dup_f, lineterminator='\n')
+        for writer in (combined, deduplicated):
+            writer.writerow(['HTS_Code', 'Description', 'List'])
+        duplicates.writerow(['HTS_Code', 'Lists', 'Count', 'Kept_List', 'Moved_To_4a'])
+
+        for code, rows in metrics.iterate('merge', merge_lists(paths, sort)):
+            report['total_entries'] += len(rows)
+            report['unique_codes'] += 1
+            combined.writerows(rows)
+
+            # The first row of the highest-priority list wins
+            kept = max(rows, key=lambda row: LIST_PRIORITY.get(row[2], 0))
+            deduplicated.writerow(kept)
+            report['final_by_list'][kept[2]] += 1
+
+            if len(rows) == 1:
+                continue
+            lists = sorted(row[2] for row in rows)
+            moved = kept[2] == '4a' and any(name in FULL_RATE_LISTS for name in lists)
+            duplicates.writerow([code, ', '.join(lists), len(rows), kept[2], 'yes' if moved else ''])
+            report['duplicate_codes'] += 1
+            report['duplicate_entries'] += len(rows)
+            report['combinations'][', '.join(lists)] += 1
+            if moved:
+                report['moved_to_4a'] += 1
+                if len(report['moved_examples']) < MOVED_EXAMPLES:
+                    report['moved_examples'].append((code, [name for name in lists if name in FULL_RATE_LISTS]))
+            item = (len(rows), -report['duplicate_codes'], code, lists)
+            if len(top) < TOP_DUPLICATES:
+                heapq.heappush(top, item)
+            elif item > top[0]:
+                heapq.heapreplace(top, item)
+
+def print_report(report: Dict[str, Any], exports_dir: str):
+    print(f"📊 {report['total_entries']:,} entries from {', '.join(report['files'])}")
+    print(f"\n🔍 Found {report['duplicate_codes']:,} HTS codes appearing in multiple lists")
+    print(f"   These represent {report['duplicate_entries']:,} total duplicate entries")
+
+    print(f"\n✅ Deduplicated data saved to: {os.path.join(exports_dir, DEDUPLICATED_FILE)}")
+    print(f"   Final count: {report['unique_codes']:,} unique HTS codes")
+    print(f"   Combined lists: {os.path.join(exports_dir, COMBINED_FILE)}")
+    print(f"   Duplicate report: {os.path.join(exports_dir, DUPLICATES_FILE)}")
+
+    if report['top_duplicates']:
+        print(f"\nTop {len(report['top_duplicates'])} duplicate HTS codes:")
+        print("-" * 70)
+        for code, lists in report['top_duplicates']:
+            lists_str = ', '.join(f"List {name}" for name in lists)
+            tariffs_str = ', '.join(list_tariff(name) for name in lists)
+            print(f"{code} - Appears in: {lists_str} (Tariffs: {tariffs_str})")
+
+    if report['moved_to_4a']:
+        print(f"\n🔄 {report['moved_to_4a']} codes moved from 25% lists to List 4A (7.5%):")
+        for code, old_lists in report['moved_examples']:
+            print(f"   {code}: Was on List(s) {', '.join(old_lists)} (25%) → Now on List 4a (7.5%)")
+        if report['moved_to_4a'] > len(report['moved_examples']):
+            print(f"   ... and {report['moved_to_4a'] - len(report['moved_examples'])} more")
+
+    print("\n📈 Summary by List Combinations:")
+    print("-" * 50)
+    for combination, count in sorted(report['combinations'].items(), key=lambda item: (-item[1], item[0])):
+        print(f"   Lists {combination}: {count} HTS codes")
+
+    print("\n📊 Final Distribution by List:")
+    print("-" * 40)
+    for name, count in sorted(report['final_by_list'].items()):
+        print(f"   List {name}: {count:,} items ({list_tariff(name)} tariff)")
+
+    print("\n💡 Note: This follows USTR's rule that when a code appears on multiple lists,")
+    print("   the most recent list controls (reflecting deletions from earlier lists).")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge, deduplicate and report on the extracted Section 301 lists in one pass.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--exports-dir', default='exports', metavar='DIR',
+                        help="Directory with the list*_hts_extracted.csv files and the outputs (default: exports).")
+    parser.add_argument('--sort-in-memory', action='store_true',
+                        help="Sort list files that are not sorted by HTS code in memory (holds every list at once).")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    metrics = metrics_from_args('consolidate_section301', args)
+    print("📋 Consolidating Section 301 Lists")
+    print("=" * 70)
+    print("Rule: Latest controlling legal text wins")
+    print("Chronology: List 1 → List 2 → List 3 → List 4A")
+    print()
+    try:
+        report = consolidate(args.exports_dir, metrics, args.sort_in_memory)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        print("Please run the extraction scripts first.")
+        sys.exit(1)
+    except UnsortedListError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print_report(report, args.exports_dir)
+    metrics.finish(args.metrics)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Python tariff pipeline stage by stage.
+
+Runs each stage on synthetic tariff databases (synthetic_tariff_data.py) at
+one or more multiples of the real size and times it separately:
+
+  excel_to_csv      excel_to_csv.py on an Excel copy of the input (needs openpyxl;
+                    skipped above one sheet's 1,048,575 rows)
+  overlay_parse     load_overlay_store() parsing the Section 301/201/232 and
+                    trade remedy CSVs
+  overlay_snapshot  load_overlay_store() loading the same from its snapshots
+  process           reading the CSV and process_tariff_values() for every row
+                    (the row engine, with --inject-extra-tariffs)
+  serialize         encoding the entries as the output JSON (StreamingTariffWriter,
+                    byte-identical to json.dump)
+  segment           SegmentWriter writing tariff-XXX.json files to an empty directory
+
+process, serialize and segment run in one pass over the entries, each timed
+separately, so memory stays flat except for the segments SegmentWriter holds
+until close() (about 12 KB per entry; leave 'segment' out of --stages at 100x
+on small machines).
+
+Each stage reports the best of --repeat runs. Results are written as JSON
+together with the git commit, and --compare flags every stage that got slower
+than a baseline results file by more than --threshold percent (exit status 1),
+so regressions show up between commits. Generated inputs are kept in the work
+directory and reused.
+
+Usage:
+  python benchmark_pipeline.py [--scales 1,10,100] [--stages STAGE,...] [--repeat N] [--output JSON] [--compare BASELINE_JSON]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List
+
+import preprocess_tariff_data_new as preprocess
+from overlay_store import load_overlay_store
+from segment_writer import SegmentWriter
+from synthetic_tariff_data import DEFAULT_SECTION_301_CSV, generate_tariff_csv, write_tariff_excel
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WORK_DIR = os.path.join(SCRIPT_DIR, '.benchmark_cache')
+STAGES = ['excel_to_csv', 'overlay_parse', 'overlay_snapshot', 'process', 'serialize', 'segment']
+RESULTS_FORMAT = 1
+DEFAULT_THRESHOLD = 10.0
+# Differences below this are timer noise, whatever the percentage
+MIN_REGRESSION_SECONDS = 0.005
+
+def git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+def _stage_result(runs: List[float], items: Optional[int] = None, **extra) -> Dict[str, Any]:
+    best = min(runs)
+    result = {'seconds': round(best, 6), 'runs': [round(run, 6) for run in runs]}
+    if items is not None:
+        result['items'] = items
+        result['items_per_second'] = round(items / best, 1) if best > 0 else None
+    result.update(extra)
+    return result
+
+def synthetic_input(work_dir: str, scale: float, seed: int, section301_csv: str) -> str:
+    """Path of the synthetic CSV for a scale, generated on first use"""
+    path = os.path.join(work_dir, f'tariff-x{scale:g}-seed{seed}.csv')
+    if not os.path.exists(path):
+        print(f"  Generating {os.path.basename(path)}...")
+        partial = path + '.tmp'
+        generate_tariff_csv(partial, scale, seed, section301_csv)
+        os.replace(partial, path)
+    return path
+
+def bench_excel_to_csv(csv_path: str, work_dir: str, repeat: int) -> Dict[str, Any]:
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return {'skipped': 'openpyxl not installed'}
+    xlsx_path = os.path.splitext(csv_path)[0] + '.xlsx'
+    if not os.path.exists(xlsx_path):
+        try:
+            write_tariff_excel(csv_path, xlsx_path)
+        except ValueError as e:
+            return {'skipped': str(e)}
+    output = os.path.join(work_dir, 'excel_to_csv.out.csv')
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, 'excel_to_csv.py'), xlsx_path, output],
+                       check=True, stdout=subprocess.DEVNULL)
+        runs.append(time.perf_counter() - started)
+    os.remove(output)
+    return _stage_result(runs, bytes=os.path.getsize(xlsx_path))
+
+def bench_overlays(section301_csv: str, work_dir: str, repeat: int, stages: List[str]) -> tuple:
+    """(overlay store, stage results) for the overlay stages"""
+    results = {}
+    cache_dir = os.path.join(work_dir, 'overlay-snapshots')
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    overlays = load_overlay_store(section301_csv, cache_dir=cache_dir)  # Writes the snapshots
+    for stage, stage_cache in (('overlay_parse', None), ('overlay_snapshot', cache_dir)):
+        if stage not in stages:
+            continue
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            overlays = load_overlay_store(section301_csv, cache_dir=stage_cache)
+            runs.append(time.perf_counter() - started)
+        results[stage] = _stage_result(runs, sum(len(source['data']) for source in overlays.sources.values()))
+    return overlays, results
+
+def bench_pipeline(csv_path: str, work_dir: str, repeat: int, stages: List[str],
+                   segment_workers: Optional[int]) -> Dict[str, Any]:
+    """Time processing, serialization and segmentation in one pass per run"""
+    runs = {stage: [] for stage in ('process', 'serialize', 'segment') if stage in stages}
+    output_path = os.path.join(work_dir, 'pipeline.out.json')
+    segments_dir = os.path.join(work_dir, 'pipeline-segments')
+    header = {'data_last_updated': '2025-07-01', 'hts_revision': 'benchmark'}
+    clock = time.perf_counter
+    for _ in range(repeat):
+        shutil.rmtree(segments_dir, ignore_errors=True)
+        stats = preprocess.new_run_stats()
+        seconds = {'process': 0.0, 'serialize': 0.0, 'segment': 0.0}
+        segment_writer = SegmentWriter(segments_dir, segment_workers) if 'segment' in runs else None
+        with open(output_path, 'w', encoding='utf-8') as f, contextlib.redirect_stdout(io.StringIO()):
+            writer = preprocess.StreamingTariffWriter(f, header) if 'serialize' in runs else None
+            entries = preprocess.iter_tariff_entries(csv_path, stats, True, False)
+            while True:
+                started = clock()
+                entry = next(entries, None)
+                seconds['process'] += clock() - started
+                if entry is None:
+                    break
+                preprocess.tally_entry(stats, entry)
+                if writer is not None:
+                    started = clock()
+                    writer.write_entry(entry)
+                    seconds['serialize'] += clock() - started
+                if segment_writer is not None:
+                    started = clock()
+                    segment_writer.add(entry)
+                    seconds['segment'] += clock() - started
+            if writer is not None:
+                started = clock()
+                writer.close({'metadata': preprocess.build_metadata(stats, False, 'benchmark'),
+                              'country_programs': preprocess.COUNTRY_TO_PROGRAMS})
+                seconds['serialize'] += clock() - started
+            if segment_writer is not None:
+                started = clock()
+                segment_writer.close(header['data_last_updated'], header['hts_revision'])
+                seconds['segment'] += clock() - started
+        for stage in runs:
+            runs[stage].append(seconds[stage])
+
+    results = {}
+    if 'process' in runs:
+        results['process'] = _stage_result(runs['process'], stats['total_processed'])
+    if 'serialize' in runs:
+        results['serialize'] = _stage_result(runs['serialize'], stats['total_entries'],
+                                             bytes=os.path.getsize(output_path))
+    if 'segment' in runs:
+        results['segment'] = _stage_result(runs['segment'], stats['total_entries'],
+                                           files=len(segment_writer.segments))
+    os.remove(output_path)
+    shutil.rmtree(segments_dir, ignore_errors=True)
+    return results
+
+def run_benchmarks(scales: List[float], stages: List[str], repeat: int, seed: int, work_dir: str,
+                   section301_csv: str, segment_workers: Optional[int]) -> Dict[str, Any]:
+    os.makedirs(work_dir, exist_ok=True)
+    results = {
+        'format': RESULTS_FORMAT,
+        'created': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': seed,
+        'repeat': repeat,
+        'scales': {},
+    }
+
+    # The overlays are the same at every scale; the rule index only takes them once
+    overlays, overlay_results = bench_overlays(section301_csv, work_dir, repeat, stages)
+    preprocess.SECTION_301_DATA = overlays.section_301
+    preprocess.SECTION_201_DATA = overlays.section_201
+    overlays.add_rules(preprocess.RULE_INDEX)
+
+    for scale in scales:
+        print(f"Scale {scale:g}x:")
+        csv_path = synthetic_input(work_dir, scale, seed, section301_csv)
+        with open(csv_path, 'rb') as f:
+            rows = sum(1 for _ in f) - 1
+        scale_results = {'rows': rows, 'csv_bytes': os.path.getsize(csv_path), 'stages': {}}
+        stage_results = scale_results['stages']
+        if 'excel_to_csv' in stages:
+            stage_results['excel_to_csv'] = bench_excel_to_csv(csv_path, work_dir, repeat)
+        stage_results.update(overlay_results)
+        stage_results.update(bench_pipeline(csv_path, work_dir, repeat, stages, segment_workers))
+        for stage in STAGES:
+            if stage in stage_results:
+                print(f"  {stage:<17} {_describe(stage_results[stage])}")
+        results['scales'][f'{scale:g}'] = scale_results
+    return results
+
+def _describe(result: Dict[str, Any]) -> str:
+    if 'skipped' in result:
+        return f"skipped ({result['skipped']})"
+    text = f"{result['seconds'] * 1000:10.1f} ms"
+    if result.get('items_per_second'):
+        text += f"  {result['items_per_second']:>12,.0f} items/s"
+    if result.get('bytes'):
+        text += f"  {result['bytes'] / 1e6:8.1f} MB"
+    return text
+
+def compare_results(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print stage timings against a baseline; return the regressions"""
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created')}):")
+    for scale, scale_results in results['scales'].items():
+        base_stages = baseline.get('scales', {}).get(scale, {}).get('stages', {})
+        for stage, result in scale_results['stages'].items():
+            base = base_stages.get(stage)
+            if not base or 'seconds' not in base or 'seconds' not in result:
+                continue
+            change = (result['seconds'] - base['seconds']) / base['seconds'] * 100 if base['seconds'] else 0.0
+            slower = (change > threshold
+                      and result['seconds'] - base['seconds'] > MIN_REGRESSION_SECONDS)
+            print(f"  {scale:>4}x {stage:<17} {base['seconds'] * 1000:10.1f} -> "
+                  f"{result['seconds'] * 1000:10.1f} ms  {change:+6.1f}%" + ('  REGRESSION' if slower else ''))
+            if slower:
+                regressions.append(f"{scale}x {stage}: {change:+.1f}%")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the tariff pipeline stages on synthetic tariff databases.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--scales', default='1,10',
+                        help="Comma-separated multiples of the real table size. Default: 1,10.")
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f"Comma-separated stages to run. Default: all of\n{', '.join(STAGES)}.")
+    parser.add_argument('--repeat', type=int, default=3, metavar='N',
+                        help="Runs per stage; the best is reported. Default: 3.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic inputs. Default: 0.")
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR,
+                        help="Directory for generated inputs and scratch output.\n"
+                             "Default: .benchmark_cache next to this script.")
+    parser.add_argument('--section301-csv', default=DEFAULT_SECTION_301_CSV,
+                        help="Section 301 file for the overlay stages and the synthetic codes.\n"
+                             "Default: ../exports/section301_deduplicated.csv.")
+    parser.add_argument('--segment-workers', type=int, default=None, metavar='N',
+                        help="Processes used by SegmentWriter. Default: one per CPU.")
+    parser.add_argument('--output', metavar='JSON',
+                        help="Results file. Default: results-<commit>.json in the work directory.")
+    parser.add_argument('--compare', metavar='BASELINE_JSON',
+                        help="Earlier results file; stages slower by more than --threshold\n"
+                             "are reported and the exit status is 1.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, metavar='PCT',
+                        help=f"Slowdown in percent counted as a regression. Default: {DEFAULT_THRESHOLD:g}.")
+    args = parser.parse_args()
+
+    scales = [float(scale) for scale in args.scales.split(',') if scale.strip()]
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(scales, stages, max(1, args.repeat), args.seed, args.work_dir,
+                             args.section301_csv, args.segment_workers)
+    output = args.output or os.path.join(args.work_dir, f"results-{results['commit'] or 'local'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than the baseline by more than {args.threshold:g}%:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+if __name__ == '__main__':
+    main()
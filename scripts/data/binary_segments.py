@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Binary columnar tariff segments.
+
+An alternative encoding of tariff-XXX.json segment files (tariff-XXX.htsb).
+Entries are sorted by HTS key (hts_keys.hts_key of hts8) and stored
+column by column:
+
+  header        magic, version, entry count, section directory (offset, length)
+  meta          JSON: segment, description, fields (name, kind) in one field
+                order, and the field order of any entry that does not follow it
+  keys          uint64 HTS key per entry, sorted, for binary search
+  order         uint32 position of each entry in the JSON segment
+  present       uint8 (fields x entries): which fields each entry has
+  strings       interned string table (uint32 offsets + one JSON array)
+  objects       interned table of other values such as additive_duties
+                (uint32 offsets + one JSON array)
+  items         interned table of list elements, e.g. the program objects of
+                available_programs (uint32 offsets + one JSON array)
+  lists         interned lists as uint32 item ids (uint32 offsets + ids)
+  values        one (fields of that kind) x (entries) matrix per kind:
+                float64 numbers, uint8 flags, uint32 string/object/list references
+
+All integers are little-endian and every section is 8-byte aligned.
+BinarySegment memory-maps a file and finds an HTS code by binary search over
+the key column, decoding only the matching rows. A full scan parses each
+table with one json.loads call, builds every distinct list once from its
+items, and converts each value matrix with numpy, so nested values are built
+once per distinct value rather than once per entry. Decoded entries compare
+equal to the entries json.load() returns for the JSON segment. The key only
+uses the digits of hts8, so a dotted code such as 0101.21.00 is found like
+01012100 and an hts8 without digits gets the key 0.
+
+Usage:
+  python binary_segments.py build <segments_dir> [<output_dir>]
+  python binary_segments.py lookup <segment.htsb> <hts_code>
+  python binary_segments.py bench <segments_dir> [<output_dir>]
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from itertools import compress
+from typing import Dict, Any, Optional, List, Iterator
+
+import numpy as np
+
+from hts_keys import hts_key
+
+MAGIC = b'HTSB'
+FORMAT_VERSION = 2
+BINARY_SUFFIX = '.htsb'
+
+_HEADER = struct.Struct('<4sHHII')  # magic, version, reserved, entry count, section count
+_SECTION = struct.Struct('<QQ')     # offset, length
+_SPAN = struct.Struct('<II')        # start and end offset of a table value
+
+# Value kinds: each kind is stored as one (fields of that kind) x (entries) matrix
+KIND_DTYPES = {'number': '<f8', 'bool': 'u1', 'string': '<u4', 'object': '<u4', 'list': '<u4'}
+_KIND_STRUCTS = {'number': struct.Struct('<d'), 'bool': struct.Struct('<B'), 'string': struct.Struct('<I'),
+                 'object': struct.Struct('<I'), 'list': struct.Struct('<I')}
+
+SECTION_META, SECTION_KEYS, SECTION_ORDER, SECTION_PRESENT = 0, 1, 2, 3
+SECTION_STRING_OFFSETS, SECTION_STRINGS, SECTION_OBJECT_OFFSETS, SECTION_OBJECTS = 4, 5, 6, 7
+SECTION_ITEM_OFFSETS, SECTION_ITEMS, SECTION_LIST_OFFSETS, SECTION_LISTS = 8, 9, 10, 11
+KIND_SECTIONS = {'number': 12, 'bool': 13, 'string': 14, 'object': 15, 'list': 16}
+# JSON tables: (offsets section, values section)
+_TABLES = {'string': (SECTION_STRING_OFFSETS, SECTION_STRINGS),
+           'object': (SECTION_OBJECT_OFFSETS, SECTION_OBJECTS),
+           'item': (SECTION_ITEM_OFFSETS, SECTION_ITEMS)}
+
+def _value_kind(value: Any) -> str:
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, list):
+        return 'list'
+    return 'object'
+
+def entry_key(entry: Dict[str, Any]) -> int:
+    """Sort and search key of an entry: the digits of its hts8 (dots and the like dropped)"""
+    return hts_key(entry.get('hts8') or '')
+
+class _InternTable:
+    """Deduplicated JSON values addressed by index"""
+
+    def __init__(self):
+        self.index: Dict[bytes, int] = {}
+        self.blobs: List[bytes] = []
+
+    def add(self, blob: bytes) -> int:
+        position = self.index.get(blob)
+        if position is None:
+            position = self.index[blob] = len(self.blobs)
+            self.blobs.append(blob)
+        return position
+
+    def sections(self) -> tuple:
+        """(offsets, blob): the blob is one JSON array; value i starts at offsets[i] and
+        is followed by one separator byte (',' or the closing ']') at offsets[i + 1] - 1"""
+        offsets = np.ones(len(self.blobs) + 1, dtype='<u4')
+        np.cumsum([len(blob) + 1 for blob in self.blobs], out=offsets[1:])
+        offsets[1:] += 1
+        return offsets.tobytes(), b'[' + b','.join(self.blobs) + b']'
+
+class _ListTable:
+    """Deduplicated lists, stored as ids into an _InternTable of their items"""
+
+    def __init__(self, items: _InternTable):
+        self.items = items
+        self.index: Dict[tuple, int] = {}
+
+    def add(self, values: list) -> int:
+        ids = tuple(self.items.add(_json_bytes(value)) for value in values)
+        return self.index.setdefault(ids, len(self.index))
+
+    def sections(self) -> tuple:
+        """(offsets, ids): the item ids of list i are ids[offsets[i]:offsets[i + 1]]"""
+        offsets = np.zeros(len(self.index) + 1, dtype='<u4')
+        np.cumsum([len(ids) for ids in self.index], out=offsets[1:])
+        ids = np.array([item for ids in self.index for item in ids], dtype='<u4')
+        return offsets.tobytes(), ids.tobytes()
+
+def _json_bytes(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _field_order(rows: List[Dict[str, Any]]) -> List[str]:
+    """One field order that every entry follows where the entries agree: fields are
+    sorted topologically by which field comes right before which, ties and cycles
+    broken by first appearance"""
+    successors: Dict[str, set] = {}
+    for entry in rows:
+        previous = None
+        for field in entry:
+            successors.setdefault(field, set())
+            if previous is not None:
+                successors[previous].add(field)
+            previous = field
+    waiting = dict.fromkeys(successors, 0)
+    for followers in successors.values():
+        for field in followers:
+            waiting[field] += 1
+
+    order: List[str] = []
+    remaining = dict.fromkeys(successors)  # First-appearance order
+    while remaining:
+        field = next((field for field in remaining if not waiting[field]), next(iter(remaining)))
+        del remaining[field]
+        order.append(field)
+        for follower in successors[field]:
+            waiting[follower] -= 1
+    return order
+
+def encode_binary_segment(prefix: str, entries: List[Dict[str, Any]],
+                          description: Optional[str] = None) -> bytes:
+    """Encode one segment's entries in the binary columnar format"""
+    order = sorted(range(len(entries)), key=lambda i: entry_key(entries[i]))
+    rows = [entries[i] for i in order]
+    count = len(rows)
+
+    # A field whose values mix kinds is stored as objects
+    kinds: Dict[str, str] = {}
+    for entry in rows:
+        for field, value in entry.items():
+            kind = 'object' if value is None else _value_kind(value)
+            if kinds.setdefault(field, kind) != kind:
+                kinds[field] = 'object'
+    fields = _field_order(rows)
+    positions = {field: position for position, field in enumerate(fields)}
+
+    # Row of each field in its kind's matrix
+    kind_rows: Dict[str, int] = {}
+    kind_counts = dict.fromkeys(KIND_DTYPES, 0)
+    for field in fields:
+        kind_rows[field] = kind_counts[kinds[field]]
+        kind_counts[kinds[field]] += 1
+    matrices = {kind: np.zeros((kind_counts[kind], count), dtype=dtype) for kind, dtype in KIND_DTYPES.items()}
+    present = np.zeros((len(fields), count), dtype='u1')
+    strings, objects, items = _InternTable(), _InternTable(), _InternTable()
+    lists = _ListTable(items)
+    reordered = []
+
+    for row, entry in enumerate(rows):
+        layout = [positions[field] for field in entry]
+        if layout != sorted(layout):
+            reordered.append([row, layout])
+        for field, value in entry.items():
+            kind = kinds[field]
+            present[positions[field], row] = 1
+            if kind == 'string':
+                value = strings.add(_json_bytes(value))
+            elif kind == 'object':
+                value = objects.add(_json_bytes(value))
+            elif kind == 'list':
+                value = lists.add(value)
+            matrices[kind][kind_rows[field], row] = value
+
+    meta = {
+        'segment': prefix,
+        'description': description if description is not None else f'HTS codes starting with {prefix}',
+        'fields': [[field, kinds[field]] for field in fields],
+        'reordered': reordered,
+    }
+    sections = [
+        _json_bytes(meta),
+        np.array([entry_key(entry) for entry in rows], dtype='<u8').tobytes(),
+        np.array(order, dtype='<u4').tobytes(),
+        present.tobytes(),
+        *strings.sections(),
+        *objects.sections(),
+        *items.sections(),
+        *lists.sections(),
+    ] + [matrices[kind].tobytes() for kind in KIND_SECTIONS]
+
+    header_size = _HEADER.size + _SECTION.size * len(sections)
+    directory, body = [], bytearray()
+    offset = (header_size + 7) // 8 * 8
+    for data in sections:
+        directory.append((offset + len(body), len(data)))
+        body += data
+        body += b'\0' * (-len(body) % 8)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, count, len(sections))
+    header += b''.join(_SECTION.pack(*entry) for entry in directory)
+    return header + b'\0' * (offset - len(header)) + bytes(body)
+
+def _number(value: float) -> Any:
+    """Numbers as json.load returns them from a JSON.stringify segment"""
+    return int(value) if value.is_integer() and abs(value) < 1e16 else value
+
+def _numbers(matrix: np.ndarray) -> np.ndarray:
+    """_number() of every value of a float64 array, as an object array"""
+    integral = (matrix == np.trunc(matrix)) & (np.abs(matrix) < 1e16)
+    values = matrix.astype(object)
+    values[integral] = matrix[integral].astype(np.int64).astype(object)
+    return values
+
+class BinarySegment:
+    """Memory-mapped reader for a .htsb segment file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, section_count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path}: not a version {FORMAT_VERSION} binary segment")
+        self._sections = [_SECTION.unpack_from(self._map, _HEADER.size + _SECTION.size * i)
+                          for i in range(section_count)]
+
+        meta = json.loads(self._bytes(SECTION_META).decode('utf-8'))
+        self.segment = meta['segment']
+        self.description = meta['description']
+        self.fields = [(field, kind) for field, kind in meta['fields']]
+        self._reordered = meta['reordered']
+        self.keys = self._array(SECTION_KEYS, '<u8')
+        self._order = self._array(SECTION_ORDER, '<u4')
+        self._present = self._array(SECTION_PRESENT, 'u1').reshape(len(self.fields), self.count)
+        # (offsets position, values position) of each JSON table in the map
+        self._table_spans = {table: (self._sections[offsets][0], self._sections[values][0])
+                             for table, (offsets, values) in _TABLES.items()}
+        # Positions of the fields of each kind, in the order of that kind's matrix rows
+        self._kind_positions: Dict[str, List[int]] = {kind: [] for kind in KIND_DTYPES}
+        for position, (_, kind) in enumerate(self.fields):
+            self._kind_positions[kind].append(position)
+        self._cells: Optional[List[tuple]] = None
+
+    def close(self):
+        self.keys = self._order = self._present = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _bytes(self, section: int) -> bytes:
+        offset, length = self._sections[section]
+        return self._map[offset:offset + length]
+
+    def _array(self, section: int, dtype: str) -> np.ndarray:
+        """Zero-copy view of a section"""
+        offset, length = self._sections[section]
+        return np.frombuffer(self._map, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                             offset=offset)
+
+    def _json_slice(self, table: str, index: int) -> bytes:
+        """Encoded JSON of value `index` of a table (without its trailing separator)"""
+        offsets_at, base = self._table_spans[table]
+        start, end = _SPAN.unpack_from(self._map, offsets_at + index * 4)
+        return self._map[base + start:base + end - 1]
+
+    def _list_json(self, index: int) -> bytes:
+        """Encoded JSON of list `index`, assembled from its items"""
+        start, end = _SPAN.unpack_from(self._map, self._sections[SECTION_LIST_OFFSETS][0] + index * 4)
+        ids = struct.unpack_from(f'<{end - start}I', self._map, self._sections[SECTION_LISTS][0] + start * 4)
+        return b'[' + b','.join(self._json_slice('item', item) for item in ids) + b']'
+
+    def _layout(self, row: int) -> List[int]:
+        """Field positions of a row, in the entry's own order"""
+        for reordered_row, layout in self._reordered:
+            if reordered_row == row:
+                return layout
+        return np.flatnonzero(self._present[:, row]).tolist()
+
+    def _cell_readers(self) -> List[tuple]:
+        """(field, kind, unpack, offset of row 0, cell size) per field, for point lookups"""
+        cells: List[Optional[tuple]] = [None] * len(self.fields)
+        for kind, positions in self._kind_positions.items():
+            unpack, size = _KIND_STRUCTS[kind].unpack_from, _KIND_STRUCTS[kind].size
+            start = self._sections[KIND_SECTIONS[kind]][0]
+            for index, position in enumerate(positions):
+                cells[position] = (self.fields[position][0], kind, unpack, start + index * self.count * size, size)
+        return cells
+
+    def _decode_row(self, row: int) -> Dict[str, Any]:
+        if self._cells is None:
+            self._cells = self._cell_readers()
+        entry = {}
+        nested_fields, nested_json = [], []
+        for position in self._layout(row):
+            field, kind, unpack, offset, size = self._cells[position]
+            value, = unpack(self._map, offset + row * size)
+            if kind == 'number':
+                entry[field] = _number(value)
+            elif kind == 'bool':
+                entry[field] = bool(value)
+            else:
+                entry[field] = None  # Keeps the field order; filled below
+                nested_fields.append(field)
+                nested_json.append(self._list_json(value) if kind == 'list' else self._json_slice(kind, value))
+        # All strings, objects and lists of the row in one json.loads call
+        if nested_fields:
+            entry.update(zip(nested_fields, json.loads(b'[' + b','.join(nested_json) + b']')))
+        return entry
+
+    def find_all(self, hts_code: str) -> List[Dict[str, Any]]:
+        """Every entry whose hts8 equals `hts_code` (binary search on the key column)"""
+        key = hts_key(hts_code)
+        start = int(np.searchsorted(self.keys, key, side='left'))
+        end = int(np.searchsorted(self.keys, key, side='right'))
+        return [self._decode_row(row) for row in range(start, end)]
+
+    def find(self, hts_code: str) -> Optional[Dict[str, Any]]:
+        """The first entry for `hts_code` in segment order, or None"""
+        matches = self.find_all(hts_code)
+        return matches[0] if matches else None
+
+    def entries(self, segment_order: bool = True) -> Iterator[Dict[str, Any]]:
+        """Decode every entry, in JSON segment order or in key order.
+
+        Each kind's matrix is converted with one numpy call, each table is
+        parsed with one json.loads and each distinct list is built once from
+        its items, so entries that had identical nested values share the same
+        objects. Each entry is then built with one dict() call.
+        """
+        count = self.count
+        cells = np.empty((len(self.fields), count), dtype=object)
+        for kind, positions in self._kind_positions.items():
+            if not positions:
+                continue
+            matrix = self._array(KIND_SECTIONS[kind], KIND_DTYPES[kind]).reshape(len(positions), count)
+            if kind == 'number':
+                cells[positions] = _numbers(matrix)
+            elif kind == 'bool':
+                cells[positions] = matrix.astype(bool).astype(object)
+            else:
+                if kind == 'list':
+                    items = json.loads(self._bytes(SECTION_ITEMS))
+                    ids = self._array(SECTION_LISTS, '<u4').tolist()
+                    offsets = self._array(SECTION_LIST_OFFSETS, '<u4').tolist()
+                    table = [list(map(items.__getitem__, ids[start:end]))
+                             for start, end in zip(offsets, offsets[1:])]
+                else:
+                    table = json.loads(self._bytes(_TABLES[kind][1]))
+                cells[positions] = np.fromiter(table, dtype=object, count=len(table))[matrix]
+
+        names = [field for field, _ in self.fields]
+        rows = cells.T.tolist()
+        decoded = [dict(compress(zip(names, values), present))
+                   for values, present in zip(rows, self._present.T.tolist())]
+        for row, layout in self._reordered:
+            decoded[row] = dict(zip(map(names.__getitem__, layout), map(rows[row].__getitem__, layout)))
+
+        if segment_order:
+            decoded = [decoded[row] for row in np.argsort(self._order, kind='stable').tolist()]
+        return iter(decoded)
+
+def write_binary_segment(path: str, prefix: str, entries: List[Dict[str, Any]],
+                         description: Optional[str] = None):
+    with open(path, 'wb') as f:
+        f.write(encode_binary_segment(prefix, entries, description))
+
+def convert_segments(segments_dir: str, output_dir: str) -> List[str]:
+    """Write a .htsb file next to (or in output_dir for) every tariff-XXX.json"""
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for name in sorted(os.listdir(segments_dir)):
+        if not (name.startswith('tariff-') and name.endswith('.json')):
+            continue
+        with open(os.path.join(segments_dir, name), 'r', encoding='utf-8') as f:
+            segment = json.load(f)
+        path = os.path.join(output_dir, name[:-len('.json')] + BINARY_SUFFIX)
+        write_binary_segment(path, segment['segment'], segment['entries'], segment.get('description'))
+        written.append(path)
+    return written
+
+def benchmark(segments_dir: str, output_dir: str):
+    """Compare json.load with binary point lookups and scans on every segment"""
+    json_seconds = scan_seconds = lookup_seconds = json_lookup_seconds = 0.0
+    json_bytes = binary_bytes = lookups = 0
+    for path in convert_segments(segments_dir, output_dir):
+        json_path = os.path.join(segments_dir, os.path.basename(path)[:-len(BINARY_SUFFIX)] + '.json')
+        json_bytes += os.path.getsize(json_path)
+        binary_bytes += os.path.getsize(path)
+
+        started = time.perf_counter()
+        with open(json_path, 'r', encoding='utf-8') as f:
+            expected = json.load(f)['entries']
+        json_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with BinarySegment(path) as segment:
+            scanned = list(segment.entries())
+        scan_seconds += time.perf_counter() - started
+        if scanned != expected:
+            raise AssertionError(f"{path}: scan does not match {json_path}")
+
+        codes = [entry['hts8'] for entry in expected]
+        started = time.perf_counter()
+        with BinarySegment(path) as segment:
+            for code in codes:
+                segment.find(code)
+        lookup_seconds += time.perf_counter() - started
+
+        # The JSON equivalent of a point lookup: load the segment, then search it
+        started = time.perf_counter()
+        with open(json_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)['entries']
+        next(entry for entry in entries if entry['hts8'] == codes[-1])
+        json_lookup_seconds += (time.perf_counter() - started) * len(codes)
+        lookups += len(codes)
+
+    print(f"Size: {json_bytes / 1e6:.1f} MB JSON -> {binary_bytes / 1e6:.1f} MB binary")
+    print(f"Full scan: json.load {json_seconds * 1000:.0f} ms, binary {scan_seconds * 1000:.0f} ms")
+    print(f"Point lookup: {lookups} lookups, JSON load+search {json_lookup_seconds / lookups * 1e6:.0f} us, "
+          f"binary open+search {lookup_seconds / lookups * 1e6:.0f} us per lookup")
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build', 'lookup', 'bench'):
+        print("Usage:")
+        print("  python binary_segments.py build <segments_dir> [<output_dir>]")
+        print("  python binary_segments.py lookup <segment.htsb> <hts_code>")
+        print("  python binary_segments.py bench <segments_dir> [<output_dir>]")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == 'lookup':
+        with BinarySegment(sys.argv[2]) as segment:
+            matches = segment.find_all(''.join(ch for ch in sys.argv[3] if ch.isdigit()))
+        print(json.dumps(matches, indent=2, ensure_ascii=False) if matches else "Not found")
+        return
+
+    segments_dir = sys.argv[2]
+    output_dir = sys.argv[3] if len(sys.argv) > 3 else segments_dir
+    if command == 'build':
+        written = convert_segments(segments_dir, output_dir)
+        print(f"Wrote {len(written)} binary segments to {output_dir}")
+    else:
+        benchmark(segments_dir, output_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Which duties apply to a processed tariff entry for a country of origin.
+
+The rules follow calculateDuty() in src/services/tariffService.ts:
+
+- Base rate: Column 2 for countries with NTR suspended (ntr_suspended_countries)
+  and for Cuba/North Korea when the entry has a Column 2 rate, the FTA program rate when the entry lists the
+  country's program (USMCA/NAFTA only for USMCA-origin goods), MFN otherwise.
+- Additive duties: additive_duties and rule_duties whose countries are 'all'
+  or include the country (Hong Kong and Macau count as China), minus their
+  exclusions; Section 232 uses rate_uk for countries_reduced.
+- reciprocal_tariffs and ieepa_tariffs for their country; IEEPA tariffs are
+  waived for USMCA-origin goods.
+- MPF (0.3464%, between $27.75 and $538.40, waived for USMCA-origin goods
+  from Canada/Mexico) and HMF (0.125%).
+
+Rates are percentages, as in the processed data.
+
+Usage:
+  python duty_applicability.py <segments_dir> <hts_code> <country> [--usmca]
+"""
+
+import json
+import os
+import sys
+from typing import Dict, Any, Optional, List
+
+MPF_RATE = 0.003464
+MPF_MIN = 27.75
+MPF_MAX = 538.40
+HMF_RATE = 0.00125
+
+# Origins whose goods are treated as Chinese for additive duties
+TARIFF_COUNTRY_ALIASES = {'HK': 'CN', 'MO': 'CN'}
+
+# Column 2 countries besides those listed in ntr_suspended_countries
+COLUMN_2_COUNTRIES = ('CU', 'KP')
+
+# Special program fields checked for a country, in order
+COUNTRY_PROGRAMS = {
+    'CA': ['usmca', 'nafta_canada'],
+    'MX': ['usmca', 'nafta_mexico', 'mexico'],
+    'KR': ['korea'],
+    'AU': ['australia'],
+    'CL': ['chile'],
+    'CO': ['colombia'],
+    'PA': ['panama'],
+    'PE': ['peru'],
+    'SG': ['singapore'],
+    'MA': ['morocco'],
+    'JO': ['jordan'],
+    'IL': ['israel_fta'],
+    'BH': ['bahrain'],
+    'OM': ['oman'],
+    'JP': ['japan'],
+}
+USMCA_PROGRAMS = ('usmca', 'nafta_canada', 'nafta_mexico')
+USMCA_COUNTRIES = ('CA', 'MX')
+
+def tariff_country(country: str) -> str:
+    """Country code additive duties are matched against"""
+    country = (country or '').upper()
+    return TARIFF_COUNTRY_ALIASES.get(country, country)
+
+def _rate(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def base_rate(entry: Dict[str, Any], country: str, usmca_origin: bool = False) -> Dict[str, Any]:
+    """Base duty for an origin: {'type', 'rate' (ad valorem %), 'specific' (per unit), 'label'}"""
+    country = (country or '').upper()
+    has_column_2 = entry.get('col2_ad_val_rate') or entry.get('col2_specific_rate')
+    if has_column_2 and (country in entry.get('ntr_suspended_countries', []) or country in COLUMN_2_COUNTRIES):
+        return {'type': 'column_2', 'rate': _rate(entry.get('col2_ad_val_rate')) * 100,
+                'specific': _rate(entry.get('col2_specific_rate')), 'label': 'Column 2 Rate'}
+
+    for program in COUNTRY_PROGRAMS.get(country, []):
+        if program in USMCA_PROGRAMS and not usmca_origin:
+            continue
+        if entry.get(f'{program}_indicator') and f'{program}_ad_val_rate' in entry:
+            return {'type': 'fta', 'program': program,
+                    'rate': _rate(entry[f'{program}_ad_val_rate']) * 100,
+                    'specific': _rate(entry.get(f'{program}_specific_rate')),
+                    'label': f'{program.upper().replace("_", " ")} FTA Rate'}
+
+    return {'type': 'mfn', 'rate': _rate(entry.get('mfn_ad_val_rate')) * 100,
+            'specific': _rate(entry.get('mfn_specific_rate')),
+            'label': f"MFN Rate: {entry.get('mfn_text_rate') or 'Free'}"}
+
+def _applies(duty: Dict[str, Any], country: str) -> bool:
+    countries = duty.get('countries', 'all')
+    if countries != 'all' and country not in countries:
+        return False
+    return country not in duty.get('exclusions', [])
+
+def additive_duties(entry: Dict[str, Any], country: str, usmca_origin: bool = False) -> List[Dict[str, Any]]:
+    """Additive duties that apply to the entry for an origin: [{'type', 'rate', 'label'}]"""
+    origin = (country or '').upper()
+    country = tariff_country(origin)
+    duties = []
+    for duty in entry.get('additive_duties', []) + entry.get('rule_duties', []):
+        if not _applies(duty, country):
+            continue
+        rate = duty['rate']
+        if duty.get('type') == 'section_232' and origin in duty.get('countries_reduced', []):
+            rate = duty.get('rate_uk', rate)
+        duties.append({'type': duty.get('type') or duty.get('rule'), 'rate': rate,
+                       'label': duty.get('label') or duty.get('rule') or duty.get('type')})
+    for tariff in entry.get('reciprocal_tariffs', []):
+        if tariff.get('country') == country:
+            duties.append({'type': 'reciprocal', 'rate': tariff['rate'], 'label': tariff.get('label')})
+    if not (usmca_origin and origin in USMCA_COUNTRIES):
+        for tariff in entry.get('ieepa_tariffs', []):
+            if tariff.get('country') == country:
+                duties.append({'type': 'ieepa', 'rate': tariff['rate'], 'label': tariff.get('label')})
+    return duties
+
+def fees(customs_value: float, country: str, usmca_origin: bool = False) -> Dict[str, float]:
+    """MPF and HMF for one entry line"""
+    if usmca_origin and (country or '').upper() in USMCA_COUNTRIES:
+        mpf = 0.0
+    else:
+        mpf = min(max(customs_value * MPF_RATE, MPF_MIN), MPF_MAX)
+    return {'mpf': mpf, 'hmf': customs_value * HMF_RATE}
+
+def applicable_duties(entry: Dict[str, Any], country: str, usmca_origin: bool = False) -> Dict[str, Any]:
+    """Base rate, additive duties and total ad valorem rate for an origin"""
+    base = base_rate(entry, country, usmca_origin)
+    additive = additive_duties(entry, country, usmca_origin)
+    return {
+        'base': base,
+        'additive_duties': additive,
+        'total_rate': base['rate'] + sum(duty['rate'] for duty in additive),
+    }
+
+def main():
+    if len(sys.argv) < 4:
+        print("Usage: python duty_applicability.py <segments_dir> <hts_code> <country> [--usmca]")
+        sys.exit(1)
+
+    segments_dir, hts_code, country = sys.argv[1:4]
+    digits = ''.join(ch for ch in hts_code if ch.isdigit())[:8]
+    segment_file = os.path.join(segments_dir, f'tariff-{digits[:3]}.json')
+    entry: Optional[Dict[str, Any]] = None
+    if os.path.exists(segment_file):
+        with open(segment_file, 'r', encoding='utf-8') as f:
+            entry = next((e for e in json.load(f)['entries'] if e.get('hts8') == digits), None)
+    if entry is None:
+        print(f"{hts_code} not found in {segments_dir}")
+        sys.exit(1)
+    print(json.dumps(applicable_duties(entry, country, '--usmca' in sys.argv), indent=2))
+
+if __name__ == '__main__':
+    main()
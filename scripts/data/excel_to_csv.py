@@ -2,21 +2,30 @@
 """Quick utility to convert first sheet of an Excel file to a CSV file.
 Used by process_tariff_update.sh. Requires pandas and openpyxl.
 """
-import sys, pandas as pd, os
+import argparse, sys, pandas as pd, os
 
-if len(sys.argv) != 3:
-    print("Usage: excel_to_csv.py <input.xlsx> <output.csv>")
-    sys.exit(1)
+from pipeline_metrics import add_metrics_arguments, metrics_from_args
+
+parser = argparse.ArgumentParser(description="Convert the first sheet of an Excel file to CSV.")
+parser.add_argument('input', help="Excel file (.xlsx).")
+parser.add_argument('output', help="CSV file to write.")
+add_metrics_arguments(parser)
+args = parser.parse_args()
 
-in_path, out_path = sys.argv[1], sys.argv[2]
+in_path, out_path = args.input, args.output
 if not os.path.isfile(in_path):
     print(f"Input file not found: {in_path}")
     sys.exit(1)
 
+metrics = metrics_from_args('excel_to_csv', args)
 try:
-    df = pd.read_excel(in_path, sheet_name=0, engine='openpyxl')
-    df.to_csv(out_path, index=False)
+    with metrics.stage('read_excel') as stage:
+        df = pd.read_excel(in_path, sheet_name=0, engine='openpyxl')
+        stage.add_rows(len(df))
+    with metrics.stage('write_csv', rows=len(df)):
+        df.to_csv(out_path, index=False)
     print(f"Converted {in_path} -> {out_path} (rows={len(df)})")
 except Exception as e:
     print(f"Error converting Excel to CSV: {e}")
-    sys.exit(1) 
\ No newline at end of file
+    sys.exit(1)
+metrics.finish(args.metrics)
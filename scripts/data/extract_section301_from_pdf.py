@@ -2,70 +2,183 @@
 """
 Extract Section 301 HTS codes from USTR PDF lists.
 Converts PDF data to JSON/CSV format for use in tariff calculations.
+
+Each page is read with the cheapest backend first (pdfplumber text, then PyPDF2
+text, then pdfplumber tables); only pages where it finds suspiciously few codes
+(or none) go on to the costlier ones, and tabula over the whole document is the last
+resort. Page text and tables are kept in the PDF page cache (pdf_page_cache.py),
+so re-runs on an unchanged PDF only repeat the pattern matching.
+
+Usage:
+  python extract_section301_from_pdf.py <pdf_file> <list_number> <rate> [--escalate-below FRACTION]
+                                        [--no-cache] [--metrics JSON] [--profile [DIR]]
 """
 
+import argparse
 import json
 import csv
 import re
 import sys
 import os
+from collections import Counter
 from datetime import datetime
 
+from pdf_page_cache import DEFAULT_CACHE_DIR, PdfPageCache
+from pipeline_metrics import add_metrics_arguments, metrics_from_args
+from section301_history import list_effective_date
+
 # Note: Install required packages with:
 # pip install pdfplumber tabula-py PyPDF2
 
-def extract_with_pdfplumber(pdf_path):
-    """Extract HTS codes using pdfplumber (good for complex layouts)"""
+HTS_TEXT_PATTERN = re.compile(r'\b(\d{4}\.\d{2}(?:\.\d{2})?)\b')
+HTS_CELL_PATTERN = re.compile(r'^\d{4}\.\d{2}(\.\d{2})?$')
+
+# Per-page backends, cheapest first: (name, library, kind). A page only goes on
+# to the next backend while it has suspiciously few codes.
+PAGE_BACKENDS = [
+    ('pdfplumber.text', 'pdfplumber', 'text'),
+    ('pypdf2.text', 'PyPDF2', 'text'),
+    ('pdfplumber.tables', 'pdfplumber', 'tables'),
+]
+
+# Pages with fewer codes than this fraction of the median per page are escalated
+ESCALATE_BELOW = 0.5
+
+class PdfPages:
+    """Page text and tables of one PDF, from the page cache or from each
+    library, which opens the PDF only when a page is not cached"""
+
+    def __init__(self, pdf_path, cache):
+        self.pdf_path = pdf_path
+        self.cache = cache
+        self._documents = {}
+
+    def _document(self, library):
+        if library not in self._documents:
+            if library == 'pdfplumber':
+                import pdfplumber
+                self._documents[library] = pdfplumber.open(self.pdf_path)
+            else:
+                import PyPDF2
+                self._documents[library] = PyPDF2.PdfReader(self.pdf_path)
+        return self._documents[library]
+
+    def page_count(self):
+        def count():
+            for library in ('pdfplumber', 'PyPDF2'):
+                try:
+                    return len(self._document(library).pages)
+                except ImportError:
+                    continue
+            raise ImportError("pdfplumber or PyPDF2 is required")
+        return self.cache.page_count(count)
+
+    def read(self, backend, library, kind, page_index):
+        """Text or tables of a page; raises ImportError when the library is missing"""
+        try:
+            return self.cache.get(backend, page_index)
+        except KeyError:
+            page = self._document(library).pages[page_index]
+            value = page.extract_tables() if kind == 'tables' else page.extract_text()
+            self.cache.put(backend, page_index, value)
+            return value
+
+    def close(self):
+        if 'pdfplumber' in self._documents:
+            self._documents['pdfplumber'].close()
+
+def find_codes(kind, value):
+    """HTS codes in a page's text (format: XXXX.XX or XXXX.XX.XX) or table cells"""
+    if kind == 'text':
+        return HTS_TEXT_PATTERN.findall(value or '')
+    return [str(cell).strip() for table in value or [] for row in table for cell in row
+            if cell and HTS_CELL_PATTERN.match(str(cell).strip())]
+
+def extract_by_page(pdf_path, cache, metrics, escalate_below=ESCALATE_BELOW):
+    """Extract HTS codes page by page, escalating only sparse pages to costlier backends.
+
+    Every page is read with the first text backend whose library is installed.
+    Pages without text and pages with fewer than escalate_below times the
+    median codes per page then go through the later backends until they have
+    that many (every page does when the first pass finds no codes at all).
+    Returns each page's codes once, in page order, with the backend that
+    found them.
+    """
+    pages = PdfPages(pdf_path, cache)
+    backends = list(PAGE_BACKENDS)
+
+    def read_codes(entry, page_index):
+        backend, library, kind = entry
+        try:
+            with metrics.stage(backend, rows=1):
+                value = pages.read(backend, library, kind, page_index)
+        except ImportError:
+            print(f"{library} not installed. Install with: pip install {library}")
+            backends[:] = [other for other in backends if other[1] != library]
+            return None, None
+        return value, find_codes(kind, value)
+
     try:
-        import pdfplumber
-        
-        hts_codes = []
-        
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                print(f"Processing page {page_num}...")
-                
-                # Extract tables if present
-                tables = page.extract_tables()
-                for table in tables:
-                    for row in table:
-                        # Look for HTS code patterns (8-10 digits)
-                        for cell in row:
-                            if cell and re.match(r'^\d{4}\.\d{2}(\.\d{2})?$', str(cell).strip()):
-                                hts_codes.append({
-                                    'hts_code': cell.strip(),
-                                    'page': page_num,
-                                    'source': 'table'
-                                })
-                
-                # Also extract from text
-                text = page.extract_text()
-                if text:
-                    # Find HTS codes in text (format: XXXX.XX or XXXX.XX.XX)
-                    matches = re.findall(r'\b(\d{4}\.\d{2}(?:\.\d{2})?)\b', text)
-                    for match in matches:
-                        if match not in [h['hts_code'] for h in hts_codes]:
-                            hts_codes.append({
-                                'hts_code': match,
-                                'page': page_num,
-                                'source': 'text'
-                            })
-        
-        return hts_codes
-    
-    except ImportError:
-        print("pdfplumber not installed. Install with: pip install pdfplumber")
-        return []
+        try:
+            page_total = pages.page_count()
+        except ImportError:
+            print("pdfplumber or PyPDF2 is required. Install with: pip install pdfplumber PyPDF2")
+            return []
 
-def extract_with_tabula(pdf_path):
+        # First pass: cheapest text layer
+        page_codes = []
+        first_pass = []
+        without_text = set()
+        for page_index in range(page_total):
+            codes = None
+            while codes is None:
+                text_backends = [entry for entry in backends if entry[2] == 'text']
+                if not text_backends:
+                    return []
+                text, codes = read_codes(text_backends[0], page_index)
+            if not (text or '').strip():
+                without_text.add(page_index)
+            first_pass.append(text_backends[0])
+            page_codes.append({code: text_backends[0][0] for code in codes})
+
+        counts = sorted(len(codes) for codes in page_codes if codes)
+        threshold = max(escalate_below * counts[len(counts) // 2], 1) if counts else None
+
+        # Escalate pages without text or with too few codes
+        escalated = 0
+        for page_index, codes in enumerate(page_codes):
+            # Pages where the first backend found no codes at all are escalated too: its
+            # text layer can miss a page that another backend reads fine
+            if threshold is not None and page_index not in without_text and len(codes) >= threshold:
+                continue
+            escalated += 1
+            for entry in PAGE_BACKENDS[PAGE_BACKENDS.index(first_pass[page_index]) + 1:]:
+                if entry not in backends:
+                    continue
+                _, found = read_codes(entry, page_index)
+                for code in found or []:
+                    codes.setdefault(code, entry[0])
+                if threshold is not None and len(codes) >= threshold:
+                    break
+        print(f"Read {page_total} pages, escalated {escalated} to costlier backends")
+    finally:
+        pages.close()
+
+    return [{'hts_code': code, 'page': page_index + 1, 'source': source}
+            for page_index, codes in enumerate(page_codes) for code, source in codes.items()]
+
+def extract_with_tabula(pdf_path, cache):
     """Extract HTS codes using tabula-py (best for tabular data)"""
     try:
-        import tabula
-        
         hts_codes = []
         
         # Read all tables from PDF
-        tables = tabula.read_pdf(pdf_path, pages='all', multiple_tables=True)
+        try:
+            tables = cache.get('tabula.tables', 'all')
+        except KeyError:
+            import tabula
+            tables = tabula.read_pdf(pdf_path, pages='all', multiple_tables=True)
+            cache.put('tabula.tables', 'all', tables)
         
         for table_idx, df in enumerate(tables):
             print(f"Processing table {table_idx + 1}...")
@@ -87,35 +200,6 @@ def extract_with_tabula(pdf_path):
         print("tabula-py not installed. Install with: pip install tabula-py")
         return []
 
-def extract_with_pypdf2(pdf_path):
-    """Extract HTS codes using PyPDF2 (basic text extraction)"""
-    try:
-        import PyPDF2
-        
-        hts_codes = []
-        
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text = page.extract_text()
-                
-                # Find HTS codes in text
-                matches = re.findall(r'\b(\d{4}\.\d{2}(?:\.\d{2})?)\b', text)
-                for match in matches:
-                    hts_codes.append({
-                        'hts_code': match,
-                        'page': page_num + 1,
-                        'source': 'pypdf2'
-                    })
-        
-        return hts_codes
-    
-    except ImportError:
-        print("PyPDF2 not installed. Install with: pip install PyPDF2")
-        return []
-
 def deduplicate_codes(hts_codes):
     """Remove duplicate HTS codes, keeping the first occurrence"""
     seen = set()
@@ -137,19 +221,13 @@ def format_for_section301(hts_codes, list_number, rate):
         'effective_date': get_effective_date(list_number),
         'hts_codes': [item['hts_code'] for item in hts_codes],
         'total_codes': len(hts_codes),
+        'sources': dict(Counter(item['source'] for item in hts_codes)),
         'extraction_date': datetime.now().isoformat()
     }
 
 def get_effective_date(list_number):
     """Get the effective date for each Section 301 list"""
-    dates = {
-        '1': '2018-07-06',
-        '2': '2018-08-23',
-        '3': '2018-09-24',
-        '4A': '2019-09-01',
-        '4a': '2019-09-01'
-    }
-    return dates.get(str(list_number), 'unknown')
+    return list_effective_date(list_number) or 'unknown'
 
 def save_to_json(data, output_file):
     """Save extracted data to JSON file"""
@@ -161,53 +239,65 @@ def save_to_csv(hts_codes, output_file, list_number, rate):
     """Save extracted data to CSV file"""
     with open(output_file, 'w', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(['hts_code', 'list_number', 'rate', 'effective_date'])
+        writer.writerow(['hts_code', 'list_number', 'rate', 'effective_date', 'source'])
         
         effective_date = get_effective_date(list_number)
         for item in hts_codes:
-            writer.writerow([item['hts_code'], list_number, rate, effective_date])
+            writer.writerow([item['hts_code'], list_number, rate, effective_date, item['source']])
     
     print(f"Saved to {output_file}")
 
 def main():
-    if len(sys.argv) < 4:
-        print("Usage: python extract_section301_from_pdf.py <pdf_file> <list_number> <rate>")
-        print("Example: python extract_section301_from_pdf.py list1.pdf 1 25")
-        print("         python extract_section301_from_pdf.py list4a.pdf 4A 7.5")
-        sys.exit(1)
-    
-    pdf_path = sys.argv[1]
-    list_number = sys.argv[2]
-    rate = float(sys.argv[3])
+    parser = argparse.ArgumentParser(
+        description="Extract Section 301 HTS codes from a USTR PDF list.",
+        epilog="Example: python extract_section301_from_pdf.py list4a.pdf 4A 7.5",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('pdf_file', help="USTR list PDF.")
+    parser.add_argument('list_number', help="Section 301 list (1, 2, 3, 4A).")
+    parser.add_argument('rate', type=float, help="Additional duty in percent (25, 7.5).")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Extract every page instead of reading them from the page cache.")
+    parser.add_argument('--escalate-below', type=float, default=ESCALATE_BELOW, metavar='FRACTION',
+                        help="Run the costlier backends on pages with fewer codes than FRACTION times\n"
+                             f"the median codes per page (default: {ESCALATE_BELOW}).")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    pdf_path = args.pdf_file
+    list_number = args.list_number
+    rate = args.rate
+    metrics = metrics_from_args('extract_section301', args)
     
     if not os.path.exists(pdf_path):
         print(f"Error: PDF file '{pdf_path}' not found")
         sys.exit(1)
     
     print(f"Extracting Section 301 List {list_number} from {pdf_path}...")
+    cache = PdfPageCache(pdf_path, None if args.no_cache else DEFAULT_CACHE_DIR)
     
     # Try different extraction methods
     hts_codes = []
     
-    # Method 1: Try pdfplumber first (most reliable)
-    codes = extract_with_pdfplumber(pdf_path)
+    # Method 1: Page by page, cheapest backend first
+    with metrics.stage('extract_pages') as stage:
+        codes = extract_by_page(pdf_path, cache, metrics, args.escalate_below)
+        stage.add_rows(len(codes))
     if codes:
         hts_codes.extend(codes)
-        print(f"Found {len(codes)} codes with pdfplumber")
+        print(f"Found {len(codes)} codes page by page")
     
-    # Method 2: Try tabula if no results or as supplement
+    # Method 2: Fallback to tabula over the whole document
     if not hts_codes:
-        codes = extract_with_tabula(pdf_path)
+        with metrics.stage('extract_tabula') as stage:
+            codes = extract_with_tabula(pdf_path, cache)
+            stage.add_rows(len(codes))
         if codes:
             hts_codes.extend(codes)
             print(f"Found {len(codes)} codes with tabula")
     
-    # Method 3: Fallback to PyPDF2
-    if not hts_codes:
-        codes = extract_with_pypdf2(pdf_path)
-        if codes:
-            hts_codes.extend(codes)
-            print(f"Found {len(codes)} codes with PyPDF2")
+    if not args.no_cache:
+        print(f"PDF {cache.summary()}")
     
     if not hts_codes:
         print("No HTS codes found. The PDF might have a complex format.")
@@ -215,8 +305,11 @@ def main():
         sys.exit(1)
     
     # Deduplicate
-    hts_codes = deduplicate_codes(hts_codes)
+    with metrics.stage('deduplicate', rows=len(hts_codes)):
+        hts_codes = deduplicate_codes(hts_codes)
     print(f"\nTotal unique HTS codes found: {len(hts_codes)}")
+    for source, count in Counter(item['source'] for item in hts_codes).most_common():
+        print(f"  {source}: {count}")
     
     # Format data
     data = format_for_section301(hts_codes, list_number, rate)
@@ -226,8 +319,9 @@ def main():
     json_file = f"section301_list{list_number}_{base_name}.json"
     csv_file = f"section301_list{list_number}_{base_name}.csv"
     
-    save_to_json(data, json_file)
-    save_to_csv(hts_codes, csv_file, list_number, rate)
+    with metrics.stage('write_outputs', rows=len(hts_codes)):
+        save_to_json(data, json_file)
+        save_to_csv(hts_codes, csv_file, list_number, rate)
     
     # Print sample
     print("\nSample of extracted codes:")
@@ -235,6 +329,7 @@ def main():
         print(f"  - {code['hts_code']}")
     if len(hts_codes) > 10:
         print(f"  ... and {len(hts_codes) - 10} more")
+    metrics.finish(args.metrics)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Canonical integer keys for HTS codes.
+
+An HTS key packs the digits of a code, right-padded to the 10-digit statistical
+level (chapter, heading, subheading, tariff line, statistical suffix), together
+with the number of significant digits:
+
+    key = int(digits.ljust(10, '0')) << 4 | len(digits)
+
+so 7208.10.00 (8 digits) and 7208.10.00.00 (10 digits) are different keys,
+while prefix_key() turns any key into the key of its chapter, heading or
+subheading. Keys are plain ints (int64 in numpy arrays): cheap to hash, compare
+and sort, and sorting keys sorts the codes.
+
+hts_key() keys the digits of a code as given (up to 10) and is memoized;
+hts_keys_batch() does the same for a whole column at once. legacy_key() and
+legacy_keys_batch() key normalize_hts_code() instead, the lookup normalization
+the Section 301/201 tables are matched with: it also finds codes whose leading
+zero was lost (1012100 for 0101.21.00), but maps some distinct codes to the
+same key (0101.21.00 and 1012.10.00), so it is only for those tables.
+
+Usage:
+  python hts_keys.py <hts_code> [<hts_code> ...]
+"""
+
+import re
+import sys
+from functools import lru_cache
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+KEY_DIGITS = 10
+_COUNT_BITS = 4
+_COUNT_MASK = (1 << _COUNT_BITS) - 1
+_NON_DIGITS = re.compile(r'[^\d]')
+
+# Digit counts of the HTS levels, for prefix_key()
+CHAPTER, HEADING, SUBHEADING, TARIFF_LINE, STATISTICAL = 2, 4, 6, 8, 10
+
+def normalize_hts_code(hts_code: str) -> str:
+    """Normalize HTS code to 8-digit format without dots for matching"""
+    # Remove all non-digits
+    code = _NON_DIGITS.sub('', str(hts_code))
+
+    # Remove leading zeros but ensure we have at least 8 digits
+    code = code.lstrip('0') or '0'  # Keep at least one zero if all zeros
+
+    # If less than 8 digits after removing leading zeros, pad on the right
+    if len(code) < 8:
+        code = code.ljust(8, '0')
+
+    # If more than 8 digits, take first 8
+    if len(code) > 8:
+        code = code[:8]
+
+    # Special handling: if code starts with 0 after normalization, it's likely
+    # a chapter 01-09 code that should not have leading zero in database
+    # Example: 0101.21.00 -> 01012100 -> 10121000
+    if code.startswith('0') and len(code) == 8:
+        # Try without the leading zero
+        code_without_zero = code[1:] + '0'
+        # This transforms 01012100 -> 10121000
+        return code_without_zero
+
+    return code
+
+def encode_hts_key(digits: str) -> int:
+    """Key of a string of up to 10 digits, taken as is ('' is the key 0)"""
+    if len(digits) > KEY_DIGITS or (digits and not digits.isdigit()):
+        raise ValueError(f"Not an HTS digit string: {digits!r}")
+    return int(digits.ljust(KEY_DIGITS, '0')) << _COUNT_BITS | len(digits)
+
+def key_digit_count(key: int) -> int:
+    """Number of significant digits in a key"""
+    return key & _COUNT_MASK
+
+def hts_key_str(key: int) -> str:
+    """The digit string a key was built from"""
+    return str(key >> _COUNT_BITS).zfill(KEY_DIGITS)[:key & _COUNT_MASK]
+
+def prefix_key(key: int, digits: int) -> int:
+    """Key of the first `digits` digits of a key (e.g. its HEADING)"""
+    count = min(digits, key & _COUNT_MASK)
+    scale = 10 ** (KEY_DIGITS - count)
+    return (key >> _COUNT_BITS) // scale * scale << _COUNT_BITS | count
+
+def _key_digits(hts_code: str) -> str:
+    return _NON_DIGITS.sub('', str(hts_code))[:KEY_DIGITS]
+
+def prefix_keys(keys: np.ndarray, digits: int) -> np.ndarray:
+    """prefix_key() for an int64 array of keys"""
+    count = np.minimum(keys & _COUNT_MASK, digits)
+    scale = 10 ** (KEY_DIGITS - count)
+    return (keys >> _COUNT_BITS) // scale * scale << _COUNT_BITS | count
+
+@lru_cache(maxsize=1 << 16)
+def hts_key(hts_code: str) -> int:
+    """Key of the digits of hts_code (the first 10), memoized"""
+    return encode_hts_key(_key_digits(hts_code))
+
+def hts_keys_batch(codes: Iterable[str]) -> np.ndarray:
+    """hts_key() for a whole column, as an int64 array"""
+    digits = pd.Series(codes, dtype=object).astype(str).str.replace(r'[^\d]', '', regex=True).str[:KEY_DIGITS]
+    values = digits.str.ljust(KEY_DIGITS, '0').astype(np.int64).to_numpy(dtype=np.int64)
+    return values << _COUNT_BITS | digits.str.len().to_numpy(dtype=np.int64)
+
+@lru_cache(maxsize=1 << 16)
+def legacy_key(hts_code: str) -> int:
+    """Key of normalize_hts_code(hts_code), for the Section 301/201 tables; memoized"""
+    return encode_hts_key(normalize_hts_code(hts_code))
+
+def legacy_keys_batch(codes: Iterable[str]) -> np.ndarray:
+    """legacy_key() for a whole column, as an int64 array"""
+    digits = pd.Series(codes, dtype=object).astype(str).str.replace(r'[^\d]', '', regex=True)
+    normalized = digits.str.lstrip('0').replace('', '0').str.ljust(8, '0').str[:8]
+    leading_zero = normalized.str.startswith('0')
+    normalized = normalized.where(~leading_zero, normalized.str[1:] + '0')
+    values = normalized.astype(np.int64).to_numpy(dtype=np.int64)
+    return (values * 10 ** (KEY_DIGITS - 8)) << _COUNT_BITS | 8
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python hts_keys.py <hts_code> [<hts_code> ...]")
+        sys.exit(1)
+
+    for code in sys.argv[1:]:
+        key = hts_key(code)
+        print(f"{code:<16} -> {hts_key_str(key)}  key={key}  "
+              f"chapter={hts_key_str(prefix_key(key, CHAPTER))} "
+              f"heading={hts_key_str(prefix_key(key, HEADING))}  "
+              f"legacy={hts_key_str(legacy_key(code))}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Longest-prefix index of HTS rules.
+
+Rules are keyed by an HTS prefix (chapter, heading, subheading or full code).
+The index is a character trie, so "which rules match this code" is a single
+walk down the code, and every node carries the rules and categories collected
+on the way to it. A whole sorted code column can be annotated in one pass:
+each walk restarts from the point where the code diverges from the previous
+one, so adding rules does not add work per row.
+
+Usage:
+  python hts_rule_index.py <hts_code> [<hts_code> ...]
+"""
+
+import os
+import re
+import sys
+from typing import Dict, Any, Optional, List, Iterable, NamedTuple, FrozenSet, Tuple
+
+class HtsRule(NamedTuple):
+    """A rule attached to an HTS prefix"""
+    prefix: str
+    category: str
+    source: str
+    data: Optional[Dict[str, Any]] = None
+
+class _Node:
+    __slots__ = ('children', 'rules', 'path_rules', 'categories')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.rules: List[HtsRule] = []
+        # Filled in by HtsRuleIndex._compile(): everything matched on the way here
+        self.path_rules: Tuple[HtsRule, ...] = ()
+        self.categories: FrozenSet[str] = frozenset()
+
+class HtsRuleIndex:
+    """Character trie of HTS prefix rules.
+
+    Codes are matched exactly as given, character by character, so a rule on
+    '72' matches '72081000' the same way hts_code.startswith('72') does.
+    Prefixes read from source files are stripped to digits when added.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._rule_count = 0
+        self._compiled = True
+
+    def __len__(self) -> int:
+        return self._rule_count
+
+    def add(self, prefix: str, category: str, source: str = '',
+            data: Optional[Dict[str, Any]] = None) -> HtsRule:
+        """Attach a rule to an HTS prefix"""
+        rule = HtsRule(prefix, category, source, data)
+        node = self._root
+        for char in prefix:
+            node = node.children.setdefault(char, _Node())
+        node.rules.append(rule)
+        self._rule_count += 1
+        self._compiled = False
+        return rule
+
+    def _compile(self):
+        """Precompute the cumulative rules and categories of every node"""
+        stack = [(self._root, (), frozenset())]
+        while stack:
+            node, path_rules, categories = stack.pop()
+            if node.rules:
+                path_rules = path_rules + tuple(node.rules)
+                categories = categories | {rule.category for rule in node.rules}
+            node.path_rules = path_rules
+            node.categories = categories
+            for child in node.children.values():
+                stack.append((child, path_rules, categories))
+        self._compiled = True
+
+    def _walk(self, code: str) -> _Node:
+        if not self._compiled:
+            self._compile()
+        node = self._root
+        for char in code:
+            child = node.children.get(char)
+            if child is None:
+                break
+            node = child
+        return node
+
+    def match(self, code: str) -> Tuple[HtsRule, ...]:
+        """All rules whose prefix matches `code`, shortest prefix first"""
+        return self._walk(code).path_rules
+
+    def longest(self, code: str, category: Optional[str] = None) -> Optional[HtsRule]:
+        """The matching rule with the longest prefix (optionally within one category)"""
+        for rule in reversed(self._walk(code).path_rules):
+            if category is None or rule.category == category:
+                return rule
+        return None
+
+    def categories(self, code: str) -> FrozenSet[str]:
+        """Categories of all rules matching `code`"""
+        return self._walk(code).categories
+
+    def _walk_sorted(self, codes: Iterable[str]) -> Iterable[_Node]:
+        """Walk each code, resuming from the path shared with the previous code"""
+        if not self._compiled:
+            self._compile()
+        path = [self._root]  # path[d] is the node reached after d characters
+        previous = ''
+        for code in codes:
+            shared = 0
+            limit = min(len(code), len(previous), len(path) - 1)
+            while shared < limit and code[shared] == previous[shared]:
+                shared += 1
+            del path[shared + 1:]
+            node = path[-1]
+            for char in code[shared:]:
+                node = node.children.get(char)
+                if node is None:
+                    break
+                path.append(node)
+            previous = code
+            yield path[-1]
+
+    def match_sorted(self, codes: Iterable[str]) -> List[Tuple[HtsRule, ...]]:
+        """match() for a whole code column; fastest when the column is sorted"""
+        return [node.path_rules for node in self._walk_sorted(codes)]
+
+    def categories_sorted(self, codes: Iterable[str]) -> List[FrozenSet[str]]:
+        """categories() for a whole code column; fastest when the column is sorted"""
+        return [node.categories for node in self._walk_sorted(codes)]
+
+def _digits(code: str) -> str:
+    return re.sub(r'[^\d]', '', str(code))
+
+def build_rule_index(product_prefixes: Dict[str, List[str]]) -> HtsRuleIndex:
+    """Build an index with one rule per product-category prefix"""
+    index = HtsRuleIndex()
+    for category, prefixes in product_prefixes.items():
+        for prefix in prefixes:
+            index.add(prefix, category, 'product')
+    return index
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python hts_rule_index.py <hts_code> [<hts_code> ...]")
+        sys.exit(1)
+
+    from preprocess_tariff_data_new import PRODUCT_PREFIXES
+    from overlay_store import load_overlay_store
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    index = build_rule_index(PRODUCT_PREFIXES)
+    section301_csv = os.path.join(script_dir, '..', 'exports', 'section301_deduplicated.csv')
+    load_overlay_store(section301_csv).add_rules(index)
+
+    for code in sys.argv[1:]:
+        rules = index.match(_digits(code))
+        print(f"\n{code}: {len(rules)} matching rule(s)")
+        for rule in rules:
+            print(f"  {rule.prefix:<10} {rule.category:<24} {rule.source}")
+
+if __name__ == '__main__':
+    main()
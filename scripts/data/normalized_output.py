@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Normalized processed tariff output.
+
+Most entries repeat the same sub-objects: the available_programs list, the
+Section 232/301 additive_duties, the reciprocal_tariffs and ieepa_tariffs
+lists and ntr_suspended_countries. In the normalized shape each distinct value
+of these fields is stored once in a per-file table and entries refer to it by
+its index. Fields equal to the file's default value are left out.
+
+Field names are listed once in "fields" (by id, in order of first appearance)
+and "field_order" gives the one order all entries follow. Each entry's
+"_fields" is the hex bitmask of the field ids it has, so expand_entry()
+restores the legacy entry exactly, field order included. An entry whose
+fields do not follow that order (in the preprocessor output, Chapter 99
+provisions set is_special_provision earlier than other entries) lists its
+field ids instead:
+
+  {
+    "data_last_updated": ..., "hts_revision": ..., "normalized": 2,
+    "tariffs": [
+      {"_fields":"7f3","hts8":"72081000","brief_description":"...","available_programs":2},
+      ...
+    ],
+    "tables": {
+      "fields": ["hts8","brief_description",...],
+      "field_order": [0,1,...],
+      "defaults": {"is_chapter_99":false,"available_programs":0,...},
+      "available_programs": [[{"program_key":...}],...],
+      ...
+    },
+    "metadata": ..., "country_programs": ...
+  }
+
+Entries and tables are written one per line without indentation. Defaults are
+the most common value of each field in the first DEFAULTS_SAMPLE entries, so
+the writer streams everything after those. Files of format 1, which listed
+every field layout in a "shapes" table, are still expanded.
+
+Usage:
+  python normalized_output.py normalize <processed_json> <output_json>
+  python normalized_output.py expand <normalized_json> <output_json>
+  python normalized_output.py bench <processed_json>
+"""
+
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, Any, Optional, List
+
+NORMALIZED_FORMAT = 2
+
+# Fields whose values are stored once per file and referenced by index
+SHARED_FIELDS = ('available_programs', 'additive_duties', 'reciprocal_tariffs',
+                 'ieepa_tariffs', 'ntr_suspended_countries', 'rule_duties')
+FIELDS_FIELD = '_fields'
+SHAPE_FIELD = '_shape'  # Format 1
+DEFAULTS_SAMPLE = 1000
+
+def dump_nested(value: Any, level: int) -> str:
+    """Serialize a value as it would appear `level` objects deep in an indent=2 dump"""
+    text = json.dumps(value, indent=2, ensure_ascii=False)
+    # JSON strings never contain raw newlines, so every newline is a line break
+    return text.replace('\n', '\n' + '  ' * level)
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+def _default_key(value: Any) -> tuple:
+    # 0, 0.0 and False are equal in Python; the type keeps them apart
+    return type(value).__name__, value
+
+class NormalizedTariffWriter:
+    """Write the normalized output one tariff entry at a time.
+
+    Same interface as StreamingTariffWriter. The first DEFAULTS_SAMPLE entries
+    are held back until the defaults are chosen; the tables are written after
+    the tariffs list, before the keys passed to close().
+    """
+
+    def __init__(self, f, header: Dict[str, Any]):
+        self.f = f
+        self.count = 0
+        # Field names by id, the ids in canonical order and the position of each id in it
+        self.fields: List[str] = []
+        self._field_ids: Dict[str, int] = {}
+        self.order: List[int] = []
+        self._positions: Dict[int, int] = {}
+        self.tables: Dict[str, List[Any]] = {field: [] for field in SHARED_FIELDS}
+        self._table_index: Dict[str, Dict[str, int]] = {field: {} for field in SHARED_FIELDS}
+        self.defaults = None
+        self._sample: List[Dict[str, Any]] = []
+        f.write('{')
+        for key, value in dict(header, normalized=NORMALIZED_FORMAT).items():
+            f.write(f'\n  {json.dumps(key)}: {dump_nested(value, 1)},')
+        f.write('\n  "tariffs": [')
+
+    def _intern(self, field: str, value: Any) -> int:
+        text = _compact(value)
+        index = self._table_index[field].get(text)
+        if index is None:
+            index = self._table_index[field][text] = len(self.tables[field])
+            self.tables[field].append(value)
+        return index
+
+    def _field_set(self, entry: Dict[str, Any]):
+        """Hex bitmask of the entry's field ids, or the ids in entry order if it breaks the canonical order"""
+        mask = 0
+        ids = []
+        previous = -1
+        in_order = True
+        for field in entry:
+            field_id = self._field_ids.get(field)
+            if field_id is None:
+                # A new field goes right after the field before it
+                field_id = self._field_ids[field] = len(self.fields)
+                self.fields.append(field)
+                self.order.insert(previous + 1, field_id)
+                self._positions = {field_id: position for position, field_id in enumerate(self.order)}
+            position = self._positions[field_id]
+            if position < previous:
+                in_order = False
+            previous = max(previous, position)
+            mask |= 1 << field_id
+            ids.append(field_id)
+        return format(mask, 'x') if in_order else ids
+
+    def _reference(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Entry with shared values replaced by table indexes and its field set"""
+        referenced = {FIELDS_FIELD: self._field_set(entry)}
+        for field, value in entry.items():
+            referenced[field] = self._intern(field, value) if field in self.tables else value
+        return referenced
+
+    def _choose_defaults(self):
+        values: Dict[str, Counter] = {}
+        for entry in self._sample:
+            for field, value in entry.items():
+                if field != FIELDS_FIELD and not isinstance(value, (list, dict)):
+                    values.setdefault(field, Counter())[_default_key(value)] += 1
+        self.defaults = {field: counter.most_common(1)[0][0][1] for field, counter in values.items()
+                         if counter.most_common(1)[0][1] > 1}
+        sample, self._sample = self._sample, []
+        for entry in sample:
+            self._write(entry)
+
+    def _write(self, entry: Dict[str, Any]):
+        compact = {field: value for field, value in entry.items()
+                   if field not in self.defaults or _default_key(value) != _default_key(self.defaults[field])
+                   or field == FIELDS_FIELD}
+        self.f.write(',\n    ' if self.count else '\n    ')
+        self.f.write(_compact(compact))
+        self.count += 1
+
+    def write_entry(self, entry: Dict[str, Any]):
+        entry = self._reference(entry)
+        if self.defaults is None:
+            self._sample.append(entry)
+            if len(self._sample) >= DEFAULTS_SAMPLE:
+                self._choose_defaults()
+        else:
+            self._write(entry)
+
+    def close(self, trailer: Dict[str, Any]):
+        if self.defaults is None:
+            self._choose_defaults()
+        self.f.write('\n  ]' if self.count else ']')
+        tables = {'fields': self.fields, 'field_order': self.order, 'defaults': self.defaults}
+        tables.update((field, values) for field, values in self.tables.items() if values)
+        self.f.write(',\n  "tables": {')
+        self.f.write(','.join(f'\n    {json.dumps(key)}: {_compact(value)}' for key, value in tables.items()))
+        self.f.write('\n  }')
+        for key, value in trailer.items():
+            self.f.write(f',\n  {json.dumps(key)}: {dump_nested(value, 1)}')
+        self.f.write('\n}')
+
+def field_layout(tables: Dict[str, Any]) -> List[tuple]:
+    """(bit, field name) of every field in canonical order, for expand_entry()"""
+    return [(1 << field_id, tables['fields'][field_id]) for field_id in tables.get('field_order', [])]
+
+def _entry_fields(entry: Dict[str, Any], tables: Dict[str, Any], layout: List[tuple]) -> List[str]:
+    if SHAPE_FIELD in entry:
+        return tables['shapes'][entry[SHAPE_FIELD]]
+    present = entry[FIELDS_FIELD]
+    if isinstance(present, list):
+        return [tables['fields'][field_id] for field_id in present]
+    mask = int(present, 16)
+    return [field for bit, field in layout if mask & bit]
+
+def expand_entry(entry: Dict[str, Any], tables: Dict[str, Any],
+                 layout: Optional[List[tuple]] = None) -> Dict[str, Any]:
+    """Legacy shape of a normalized entry; pass field_layout(tables) when expanding many"""
+    defaults = tables['defaults']
+    expanded = {}
+    for field in _entry_fields(entry, tables, field_layout(tables) if layout is None else layout):
+        value = entry[field] if field in entry else defaults[field]
+        expanded[field] = tables[field][value] if field in SHARED_FIELDS else value
+    return expanded
+
+def expand_output(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Legacy processed output of a normalized output; other files are returned as is"""
+    if data.get('normalized') not in (1, NORMALIZED_FORMAT):
+        return data
+    tables = data['tables']
+    layout = field_layout(tables)
+    expanded = {}
+    for key, value in data.items():
+        if key == 'tariffs':
+            expanded[key] = [expand_entry(entry, tables, layout) for entry in value]
+        elif key not in ('normalized', 'tables'):
+            expanded[key] = value
+    return expanded
+
+def normalize_output(data: Dict[str, Any], f):
+    """Write a legacy processed output in the normalized shape"""
+    keys = list(data)
+    position = keys.index('tariffs')
+    writer = NormalizedTariffWriter(f, {key: data[key] for key in keys[:position]})
+    for entry in data['tariffs']:
+        writer.write_entry(entry)
+    writer.close({key: data[key] for key in keys[position + 1:]})
+
+def load_tariffs(path: str) -> Dict[str, Any]:
+    """Read a processed output file, expanding it if it is normalized"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return expand_output(json.load(f))
+
+def benchmark(path: str):
+    """Compare size and parse time of a processed output and its normalized shape"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    normalized_path = path + '.normalized.tmp'
+    with open(normalized_path, 'w', encoding='utf-8') as f:
+        normalize_output(data, f)
+    try:
+        results = {}
+        for label, candidate in (('legacy', path), ('normalized', normalized_path)):
+            started = time.perf_counter()
+            with open(candidate, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+            results[label] = (os.path.getsize(candidate), time.perf_counter() - started)
+        started = time.perf_counter()
+        expanded = expand_output(loaded)
+        expand_seconds = time.perf_counter() - started
+        if _compact(expanded) != _compact(data):  # Field order included
+            raise AssertionError("Expanded output does not match the original")
+    finally:
+        os.remove(normalized_path)
+
+    tables = loaded['tables']
+    print(f"{len(data['tariffs'])} entries, {len(tables['fields'])} fields, {len(tables['defaults'])} defaults")
+    for field in SHARED_FIELDS:
+        if field in tables:
+            print(f"  {field}: {len(tables[field])} distinct values")
+    for label, (size, seconds) in results.items():
+        print(f"{label:>10}: {size / 1e6:.1f} MB, json.load {seconds * 1000:.0f} ms")
+    print(f"{'expand':>10}: {expand_seconds * 1000:.0f} ms")
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('normalize', 'expand', 'bench'):
+        print("Usage:")
+        print("  python normalized_output.py normalize <processed_json> <output_json>")
+        print("  python normalized_output.py expand <normalized_json> <output_json>")
+        print("  python normalized_output.py bench <processed_json>")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == 'bench':
+        benchmark(sys.argv[2])
+        return
+    if len(sys.argv) < 4:
+        print(f"Usage: python normalized_output.py {command} <input_json> <output_json>")
+        sys.exit(1)
+
+    with open(sys.argv[2], 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    with open(sys.argv[3], 'w', encoding='utf-8') as f:
+        if command == 'normalize':
+            normalize_output(data, f)
+        else:
+            json.dump(expand_output(data), f, indent=2, ensure_ascii=False)
+    print(f"Wrote {sys.argv[3]}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Overlay store for the Section 301/201/232 and trade remedy CSV files.
+
+Each overlay source is parsed with the csv module into typed lookup tables:
+Section 301 and 201 records keyed by legacy_key(), Section 232 headings and trade
+remedy cases as HtsRule prefix rules. The parsed result of every source is
+saved as a pickle snapshot named after the SHA-256 of the file's contents, so
+a repeat build only hashes the CSVs and loads the snapshots; a source is
+re-parsed only when its contents change.
+
+Usage:
+  python overlay_store.py <section301_csv> [--no-cache]
+"""
+
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import os
+import pickle
+import re
+import time
+from typing import Dict, Any, Optional, List, Callable, Iterable
+
+from hts_keys import legacy_key
+from hts_rule_index import HtsRule, HtsRuleIndex
+
+# Bump when a parser changes so old snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.overlay_cache')
+
+def _digits(code: str) -> str:
+    return re.sub(r'[^\d]', '', str(code))
+
+def _split_list(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+def _csv_rows(text: str) -> Iterable[Dict[str, str]]:
+    """Rows of CSV text, skipping '#' comment lines"""
+    lines = (line for line in io.StringIO(text) if not line.startswith('#'))
+    return csv.DictReader(lines)
+
+def _section_301_rate(list_num: str) -> float:
+    if list_num in ['1', '2', '3']:
+        return 25.0
+    if list_num == '4a':
+        return 7.5
+    return 0.0
+
+def parse_section_301(text: str) -> Dict[int, Dict[str, Any]]:
+    """section301_deduplicated.csv -> {legacy_key: record}"""
+    records = {}
+    for row in _csv_rows(text):
+        hts_code = (row.get('HTS_Code') or '').strip()
+        if not hts_code:
+            continue
+        list_num = (row.get('List') or '').strip()
+        records[legacy_key(hts_code)] = {
+            'list': list_num,
+            'rate': _section_301_rate(list_num),
+            'description': row.get('Description') or '',
+            'original_code': hts_code  # Keep original for reference
+        }
+    return records
+
+def parse_section_201(text: str) -> Dict[int, Dict[str, Any]]:
+    """section201_solar.csv -> {legacy_key: record}"""
+    records = {}
+    for row in _csv_rows(text):
+        hts_code = (row.get('HTS_Code') or '').strip()
+        if not hts_code:
+            continue
+        records[legacy_key(hts_code)] = {
+            'rate': float(row['Current_Rate']) if row.get('Current_Rate') else 14.0,
+            'product_type': row.get('Product_Type') or 'solar',
+            'quota_gw': float(row['Quota_GW']) if row.get('Quota_GW') else 0,
+            'exempt_countries': _split_list(row.get('Exempt_Countries')),
+            'notes': row.get('Notes') or '',
+            'original_code': hts_code  # Keep original for reference
+        }
+    return records
+
+def parse_section_232(text: str) -> List[HtsRule]:
+    """section232_enhanced.csv -> heading-level prefix rules"""
+    rules = []
+    for row in _csv_rows(text):
+        prefix = _digits(row.get('HTS_Code', ''))
+        if not prefix:
+            continue
+        rules.append(HtsRule(prefix, row.get('Section') or '232', 'section232_enhanced', {
+            'description': row.get('Description', ''),
+            'product_type': row.get('Product_Type', ''),
+            'rate_general': float(row['Rate_General']) if row.get('Rate_General') else None,
+            'rate_uk': float(row['Rate_UK']) if row.get('Rate_UK') else None,
+            'quota_countries': _split_list(row.get('Quota_Countries')),
+            'chapter_99_codes': _split_list(row.get('Chapter_99_Codes')),
+            'notes': row.get('Notes', ''),
+        }))
+    return rules
+
+def parse_trade_remedies(text: str) -> List[HtsRule]:
+    """trade_remedies_active.csv -> antidumping/countervailing prefix rules"""
+    rules = []
+    for row in _csv_rows(text):
+        prefix = _digits(row.get('HTS_Pattern', ''))
+        if not prefix:
+            continue
+        remedy_type = (row.get('Type') or '').strip()
+        rules.append(HtsRule(prefix, f'trade_remedy_{remedy_type.lower()}', 'trade_remedies_active', {
+            'product': row.get('Product', ''),
+            'type': remedy_type,
+            'countries': _split_list(row.get('Countries')),
+            'case_numbers': _split_list(row.get('Case_Numbers')),
+            'effective_date': row.get('Effective_Date', ''),
+            'notes': row.get('Notes', ''),
+        }))
+    return rules
+
+def load_snapshot(kind: str, path: str, parser: Callable[[str], Any],
+                  cache_dir: Optional[str]) -> Dict[str, Any]:
+    """Parse one overlay source, or load it from the snapshot of identical contents"""
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    source = {'path': path, 'sha256': digest, 'cached': False}
+
+    snapshot = None
+    if cache_dir:
+        snapshot = os.path.join(cache_dir, f'{kind}-v{SNAPSHOT_VERSION}-{digest}.pickle')
+        if os.path.exists(snapshot):
+            try:
+                with open(snapshot, 'rb') as f:
+                    source['data'] = pickle.load(f)
+                source['cached'] = True
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+                pass  # Unreadable snapshot: fall through and re-parse
+
+    if not source['cached']:
+        source['data'] = parser(content.decode('utf-8-sig'))
+        if snapshot:
+            os.makedirs(cache_dir, exist_ok=True)
+            for stale in glob.glob(os.path.join(cache_dir, f'{kind}-*.pickle')):
+                os.remove(stale)
+            temp_path = f'{snapshot}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                pickle.dump(source['data'], f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, snapshot)
+
+    source['seconds'] = time.perf_counter() - started
+    return source
+
+class OverlayStore:
+    """Typed lookup tables for every overlay source found"""
+
+    def __init__(self):
+        self.section_301: Dict[int, Dict[str, Any]] = {}
+        self.section_201: Dict[int, Dict[str, Any]] = {}
+        self.section_232_rules: List[HtsRule] = []
+        self.trade_remedy_rules: List[HtsRule] = []
+        self.sources: Dict[str, Dict[str, Any]] = {}
+
+    def add_rules(self, index: HtsRuleIndex) -> HtsRuleIndex:
+        """Add the Section 232 and trade remedy prefix rules to a rule index"""
+        for rule in self.section_232_rules + self.trade_remedy_rules:
+            index.add(*rule)
+        return index
+
+    def report(self):
+        for kind, source in self.sources.items():
+            how = 'snapshot' if source['cached'] else 'parsed'
+            print(f"Loaded {len(source['data'])} {kind} records from "
+                  f"{os.path.basename(source['path'])} ({how}, {source['seconds'] * 1000:.1f} ms)")
+
+# Overlay sources: attribute, parser and the directory the file is looked up in
+OVERLAY_SOURCES = [
+    ('section_301', parse_section_301, None),
+    ('section_201', parse_section_201, 'exports'),
+    ('section_232_rules', parse_section_232, 'exports'),
+    ('trade_remedy_rules', parse_trade_remedies, 'data'),
+]
+OVERLAY_FILES = {
+    'section_201': 'section201_solar.csv',
+    'section_232_rules': 'section232_enhanced.csv',
+    'trade_remedy_rules': 'trade_remedies_active.csv',
+}
+
+def load_overlay_store(section301_csv: str, exports_dir: Optional[str] = None,
+                       data_dir: Optional[str] = None,
+                       cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> OverlayStore:
+    """Load every overlay source; only section301_csv is required.
+
+    The other files are looked up as section201_solar.csv and
+    section232_enhanced.csv in `exports_dir` (default: next to the Section 301
+    file) and trade_remedies_active.csv in `data_dir` (default: this
+    directory). Pass cache_dir=None to always parse the CSVs.
+    """
+    directories = {
+        'exports': exports_dir or os.path.dirname(os.path.abspath(section301_csv)),
+        'data': data_dir or os.path.dirname(os.path.abspath(__file__)),
+    }
+    store = OverlayStore()
+    for kind, parser, directory in OVERLAY_SOURCES:
+        path = section301_csv if directory is None else os.path.join(directories[directory], OVERLAY_FILES[kind])
+        if directory is not None and not os.path.exists(path):
+            continue
+        source = load_snapshot(kind, path, parser, cache_dir)
+        setattr(store, kind, source['data'])
+        store.sources[kind] = source
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and snapshot the tariff overlay CSV files.")
+    parser.add_argument('section301_csv', help="Path to the Section 301 deduplicated CSV file.")
+    parser.add_argument('--no-cache', action='store_true', help="Parse the CSVs without using snapshots.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = load_overlay_store(args.section301_csv, cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR)
+    store.report()
+    print(f"Total: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
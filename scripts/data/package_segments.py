@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Precompressed segment variants.
+
+Writes a gzip variant (plus zstd and brotli when the zstandard / brotli
+modules are installed) of every tariff-XXX.json and segment-index.json in a
+segment directory, next to the original:
+
+  tariff-segments/
+  ├── tariff-720.json
+  ├── tariff-720.json.gz
+  ├── tariff-720.json.zst        # zstandard installed
+  ├── tariff-720.json.br         # brotli installed
+  └── package-manifest.json      # sizes and SHA-256 of every file and variant
+
+The level of each codec is picked once per run on a sample of the largest
+segments: the level with the smallest output whose compression speed stays
+within the time budget (--max-ms-per-mb). Files are compressed in parallel
+and only rewritten when their bytes change. The manifest and the report give
+each segment's raw and compressed size and the client-side decompression time.
+
+Usage:
+  python package_segments.py [<segments_dir>] [--output-dir DIR] [--max-ms-per-mb MS]
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Callable
+
+from segment_writer import DEFAULT_SEGMENTS_DIR, INDEX_FILE, write_if_changed
+
+PACKAGE_FORMAT = 1
+MANIFEST_FILE = 'package-manifest.json'
+
+# Compression time budget per MB of raw JSON, and the smallest size gain
+# (fraction of the best size) worth a slower level
+DEFAULT_MAX_MS_PER_MB = 100.0
+DEFAULT_MIN_GAIN = 0.005
+SAMPLE_BYTES = 4 * 1024 * 1024
+
+class Codec:
+    """A compression format: file extension, levels, compress/decompress"""
+
+    def __init__(self, name: str, extension: str, levels: range,
+                 compress: Callable[[bytes, int], bytes], decompress: Callable[[bytes], bytes]):
+        self.name = name
+        self.extension = extension
+        self.levels = levels
+        self.compress = compress
+        self.decompress = decompress
+
+def available_codecs() -> Dict[str, Codec]:
+    """gzip always; zstd and brotli when their modules are installed"""
+    codecs = {'gzip': Codec('gzip', '.gz', range(1, 10),
+                            lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+                            gzip.decompress)}
+    try:
+        import zstandard
+        codecs['zstd'] = Codec('zstd', '.zst', range(1, 20),
+                               lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+                               lambda data: zstandard.ZstdDecompressor().decompress(data))
+    except ImportError:
+        pass
+    try:
+        import brotli
+        codecs['brotli'] = Codec('brotli', '.br', range(0, 12),
+                                 lambda data, level: brotli.compress(data, quality=level),
+                                 brotli.decompress)
+    except ImportError:
+        pass
+    return codecs
+
+def _timed(function: Callable, *args, repeat: int = 1) -> tuple:
+    """(result, best time in seconds) of calling function(*args)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def choose_level(codec: Codec, sample: bytes, max_ms_per_mb: float,
+                 min_gain: float = DEFAULT_MIN_GAIN) -> Dict[str, Any]:
+    """Smallest-output level of `codec` that compresses `sample` within the budget.
+
+    Levels are tried from fastest to slowest and the search stops at the first
+    level over budget. A slower level only wins if it saves more than
+    `min_gain` of the best size so far.
+    """
+    megabytes = max(len(sample), 1) / (1024 * 1024)
+    chosen = None
+    for level in codec.levels:
+        compressed, seconds = _timed(codec.compress, sample, level)
+        ms_per_mb = seconds * 1000 / megabytes
+        if ms_per_mb > max_ms_per_mb and chosen is not None:
+            break
+        if chosen is None or len(compressed) < chosen['sample_bytes'] * (1 - min_gain):
+            chosen = {'level': level, 'sample_bytes': len(compressed), 'ms_per_mb': round(ms_per_mb, 1)}
+    chosen['sample_ratio'] = round(chosen['sample_bytes'] / max(len(sample), 1), 4)
+    return chosen
+
+def _sample(paths: List[str]) -> bytes:
+    """The largest files, up to SAMPLE_BYTES"""
+    sample = b''
+    for path in sorted(paths, key=os.path.getsize, reverse=True):
+        if sample and len(sample) + os.path.getsize(path) > SAMPLE_BYTES:
+            continue
+        with open(path, 'rb') as f:
+            sample += f.read()
+    return sample
+
+def _package_file(task: tuple) -> tuple:
+    """Compress one file with every codec (runs in a pool worker)"""
+    path, output_dir, levels = task
+    codecs = available_codecs()
+    with open(path, 'rb') as f:
+        data = f.read()
+    name = os.path.basename(path)
+    record: Dict[str, Any] = {
+        'raw_bytes': len(data),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'variants': {},
+    }
+    written = 0
+    for codec_name, level in levels.items():
+        codec = codecs[codec_name]
+        compressed = codec.compress(data, level)
+        _, seconds = _timed(codec.decompress, compressed, repeat=3)
+        filename = name + codec.extension
+        if write_if_changed(os.path.join(output_dir, filename), compressed):
+            written += 1
+        record['variants'][codec_name] = {
+            'file': filename,
+            'bytes': len(compressed),
+            'sha256': hashlib.sha256(compressed).hexdigest(),
+            'decompress_ms': round(seconds * 1000, 3),
+        }
+    return name, record, written
+
+def package_segments(segments_dir: str, output_dir: Optional[str] = None,
+                     max_ms_per_mb: float = DEFAULT_MAX_MS_PER_MB,
+                     workers: Optional[int] = None) -> Dict[str, Any]:
+    """Write the compressed variants and package-manifest.json; return the manifest"""
+    output_dir = output_dir or segments_dir
+    paths = sorted(glob.glob(os.path.join(segments_dir, 'tariff-*.json')))
+    if os.path.exists(os.path.join(segments_dir, INDEX_FILE)):
+        paths.append(os.path.join(segments_dir, INDEX_FILE))
+    if not paths:
+        raise FileNotFoundError(f"No segment files in {segments_dir}")
+
+    codecs = available_codecs()
+    sample = _sample(paths)
+    choices = {name: choose_level(codec, sample, max_ms_per_mb) for name, codec in codecs.items()}
+    levels = {name: choice['level'] for name, choice in choices.items()}
+
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(path, output_dir, levels) for path in paths]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            results = pool.map(_package_file, tasks)
+    else:
+        results = [_package_file(task) for task in tasks]
+
+    # Variants of segments that no longer exist
+    current = {name + codec.extension for name, _, _ in results for codec in codecs.values()}
+    removed = []
+    for codec in codecs.values():
+        for path in glob.glob(os.path.join(output_dir, f'tariff-*.json{codec.extension}')):
+            if os.path.basename(path) not in current:
+                os.remove(path)
+                removed.append(os.path.basename(path))
+
+    files = {name: record for name, record, _ in results}
+    totals: Dict[str, Any] = {'files': len(files), 'raw_bytes': sum(r['raw_bytes'] for r in files.values())}
+    for name in codecs:
+        totals[f'{name}_bytes'] = sum(r['variants'][name]['bytes'] for r in files.values())
+    manifest = {
+        'format': PACKAGE_FORMAT,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'budget_ms_per_mb': max_ms_per_mb,
+        'codecs': {name: {'extension': codecs[name].extension, **choices[name]} for name in codecs},
+        'totals': totals,
+        'files': files,
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    manifest['written'] = sum(written for _, _, written in results)
+    manifest['removed'] = removed
+    return manifest
+
+def print_report(manifest: Dict[str, Any], verbose: bool = False):
+    codecs = list(manifest['codecs'])
+    for name, codec in manifest['codecs'].items():
+        print(f"{name}: level {codec['level']} ({codec['ms_per_mb']} ms/MB, "
+              f"ratio {codec['sample_ratio']:.3f} on the sample)")
+
+    if verbose:
+        header = f"{'File':<22}{'Raw KB':>10}" + ''.join(f"{name + ' KB':>12}{'ms':>8}" for name in codecs)
+        print('\n' + header)
+        for filename, record in manifest['files'].items():
+            line = f"{filename:<22}{record['raw_bytes'] / 1024:>10.1f}"
+            for name in codecs:
+                variant = record['variants'][name]
+                line += f"{variant['bytes'] / 1024:>12.1f}{variant['decompress_ms']:>8.2f}"
+            print(line)
+        print()
+
+    totals = manifest['totals']
+    raw = totals['raw_bytes']
+    print(f"{totals['files']} files, {raw / 1e6:.1f} MB raw")
+    for name in codecs:
+        size = totals[f'{name}_bytes']
+        decompress_ms = sum(r['variants'][name]['decompress_ms'] for r in manifest['files'].values())
+        print(f"  {name}: {size / 1e6:.2f} MB transferred ({(1 - size / raw) * 100:.1f}% saved), "
+              f"{decompress_ms:.0f} ms to decompress every file")
+    print(f"{manifest['written']} variant files written"
+          + (f", {len(manifest['removed'])} stale variants removed" if manifest['removed'] else ''))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write compressed variants of the tariff segments and a content-hash manifest.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('segments_dir', nargs='?', default=DEFAULT_SEGMENTS_DIR,
+                        help="Segment directory. Default: tariff-segments next to this script.")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory for the variants and manifest. Default: the segment directory.")
+    parser.add_argument('--max-ms-per-mb', type=float, default=DEFAULT_MAX_MS_PER_MB, metavar='MS',
+                        help=f"Compression time budget per MB of JSON used to pick each codec's level.\n"
+                             f"Default: {DEFAULT_MAX_MS_PER_MB:g}.")
+    parser.add_argument('--workers', type=int, default=None, metavar='N',
+                        help="Processes used to compress. Default: one per CPU.")
+    parser.add_argument('--verbose', action='store_true', help="Print the sizes of every file.")
+    args = parser.parse_args()
+
+    manifest = package_segments(args.segments_dir, args.output_dir, args.max_ms_per_mb, args.workers)
+    print_report(manifest, args.verbose)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of extracted PDF page text and tables.
+
+Entries are keyed by the SHA-256 of the PDF's contents, the page index and the
+extractor backend ('pdfplumber.text', 'pdfplumber.tables', 'pypdf2.text', ...)
+and stored as gzipped pickles under <cache_dir>/<sha256>/. Re-running an
+extraction on unchanged PDFs reads the pages back without opening the PDF, so
+only the pattern matching runs again; a changed PDF gets a new digest and is
+extracted afresh. Whole-document results (tabula) use the page index 'all', and
+the page count of a PDF is cached as backend 'pages'.
+
+Usage:
+  python pdf_page_cache.py [--clear]   # Show (or delete) the cached PDFs
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from typing import Any, Callable, Optional, Union
+
+# Bump when an extractor changes so old entries are ignored
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.pdf_page_cache')
+SOURCE_FILE = 'source.json'
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class PdfPageCache:
+    """Cached extraction results of one PDF; a no-op cache when cache_dir is None.
+
+    Instances are picklable, so pool workers can write the pages they extract.
+    """
+
+    def __init__(self, pdf_path: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        self.pdf_path = pdf_path
+        self.digest = file_sha256(pdf_path)
+        self.directory = os.path.join(cache_dir, self.digest) if cache_dir else None
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, backend: str, page: Union[int, str]) -> str:
+        return os.path.join(self.directory, f'v{CACHE_VERSION}-{backend}-{page}.pickle.gz')
+
+    def get(self, backend: str, page: Union[int, str]) -> Any:
+        """Cached result of `backend` for `page`; raises KeyError when not cached"""
+        if self.directory:
+            try:
+                with open(self._path(backend, page), 'rb') as f:
+                    value = pickle.loads(gzip.decompress(f.read()))
+                self.hits += 1
+                return value
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass  # Missing or unreadable entry: extract again
+        self.misses += 1
+        raise KeyError((backend, page))
+
+    def has(self, backend: str, page: Union[int, str]) -> bool:
+        return bool(self.directory) and os.path.exists(self._path(backend, page))
+
+    def put(self, backend: str, page: Union[int, str], value: Any):
+        if not self.directory:
+            return
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, SOURCE_FILE), 'w', encoding='utf-8') as f:
+                json.dump({'pdf': os.path.abspath(self.pdf_path)}, f)
+        path = self._path(backend, page)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(gzip.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), compresslevel=6))
+        os.replace(temp_path, path)
+
+    def page_count(self, count_pages: Callable[[], int]) -> int:
+        """Number of pages, counted with count_pages() only when not cached"""
+        try:
+            return self.get('pages', 'all')
+        except KeyError:
+            pages = count_pages()
+            self.put('pages', 'all', pages)
+            return pages
+
+    def summary(self) -> str:
+        return f"page cache: {self.hits} hits, {self.misses} misses"
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clear the PDF page cache.")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help=f"Cache directory (default: {DEFAULT_CACHE_DIR}).")
+    parser.add_argument('--clear', action='store_true', help="Delete every cached page.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cache_dir):
+        print(f"No page cache in {args.cache_dir}")
+        return
+    if args.clear:
+        shutil.rmtree(args.cache_dir)
+        print(f"Cleared {args.cache_dir}")
+        return
+    for digest in sorted(os.listdir(args.cache_dir)):
+        directory = os.path.join(args.cache_dir, digest)
+        try:
+            with open(os.path.join(directory, SOURCE_FILE), 'r', encoding='utf-8') as f:
+                source = json.load(f)['pdf']
+        except (OSError, ValueError, KeyError):
+            source = '?'
+        entries = [name for name in os.listdir(directory) if name.endswith('.pickle.gz')]
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in entries)
+        print(f"{digest[:12]}  {len(entries):6} entries  {size / 1024:9.1f} KB  {source}")
+
+if __name__ == '__main__':
+    main()
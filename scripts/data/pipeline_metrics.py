@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and memory metrics for the data pipeline scripts.
+
+A PipelineMetrics records, for every named stage of a run, the wall time, CPU
+time, rows handled, rows/s and how much the resident set size (RSS) of the
+process grew while it ran: the net change and how far it raised the process peak
+(the run itself reports the peak RSS). Memory a stage frees again before it ends
+shows only in the traced peak of --profile runs. Stages nest: the time of a
+stage run inside another (or of a timed iterator consumed inside a stage's
+loop) is taken out of the outer stage, so every stage reports its own time only
+and the stages add up to the run. Using a stage name again adds to it.
+
+RSS is read when a stage is entered and left. A timed iterator only reads the
+clocks around each item, so its memory counts towards the stage consuming it.
+
+  metrics = metrics_from_args('preprocess', args)
+  with metrics.stage('load_overlays'):
+      ...
+  with metrics.stage('write_output'):
+      for entry in metrics.iterate('process', entries):   # Times only next()
+          ...
+  metrics.finish(args.metrics)
+
+With --profile every stage runs under its own cProfile profiler and is
+written to <DIR>/<pipeline>-<stage>.prof (view with `python -m pstats` or
+snakeviz); Python allocations are then also traced with tracemalloc and the
+peak per stage is reported, switching stages on every iterated item. Both slow the run down, so timings taken with
+--profile are not comparable to plain runs.
+
+Usage:
+  python pipeline_metrics.py <metrics_json> [<metrics_json> ...]   # Compare runs
+"""
+
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Iterable, Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.pipeline_profiles')
+METRICS_FORMAT = 1
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024, 1)
+
+def current_rss_mb() -> Optional[float]:
+    """Current resident set size of this process in MB (Linux only)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+
+class Stage:
+    """Accumulated measurements of one named stage"""
+
+    def __init__(self, name: str, profile: bool):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rows: Optional[int] = None
+        self.calls = 0
+        self.rss_delta_mb: Optional[float] = None
+        self.rss_growth_mb: Optional[float] = None
+        self.peak_traced: Optional[int] = None
+        self.profiler = cProfile.Profile() if profile else None
+        self._started: Optional[tuple] = None
+        self._rss: Optional[tuple] = None
+
+    def start(self, rss: bool = True):
+        """Begin one entry of the stage; rss=False skips the memory probes"""
+        self._rss = (current_rss_mb(), peak_rss_mb()) if rss else None
+        self._started = (time.perf_counter(), time.process_time())
+        self.trace()
+
+    def stop(self) -> tuple:
+        """End the running entry and add it; returns (wall, cpu, rss delta, peak growth) of it"""
+        self.untrace()
+        wall = time.perf_counter() - self._started[0]
+        cpu = time.process_time() - self._started[1]
+        self._started = None
+        rss_delta = rss_growth = None
+        if self._rss is not None:
+            # The net RSS change and how far the process peak was raised
+            # (ru_maxrss alone would repeat earlier peaks)
+            rss, peak = self._rss
+            now_rss, now_peak = current_rss_mb(), peak_rss_mb()
+            if rss is not None and now_rss is not None:
+                rss_delta = now_rss - rss
+            if peak is not None and now_peak is not None:
+                rss_growth = now_peak - peak
+        self.add(wall, cpu, rss_delta, rss_growth)
+        return wall, cpu, rss_delta, rss_growth
+
+    def add(self, wall: float, cpu: float, rss_delta: Optional[float] = None,
+            rss_growth: Optional[float] = None):
+        """Add measured time and memory; negative values take out a nested stage's share"""
+        self.wall += wall
+        self.cpu += cpu
+        if rss_delta is not None:
+            self.rss_delta_mb = (self.rss_delta_mb or 0.0) + rss_delta
+        if rss_growth is not None:
+            self.rss_growth_mb = (self.rss_growth_mb or 0.0) + rss_growth
+
+    def trace(self):
+        """With --profile, attribute the profile and traced peak to this stage from now on"""
+        if self.profiler is None:
+            return
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.profiler.enable()
+
+    def untrace(self):
+        if self.profiler is None:
+            return
+        self.profiler.disable()
+        if tracemalloc.is_tracing():
+            self.peak_traced = max(self.peak_traced or 0, tracemalloc.get_traced_memory()[1])
+
+    def add_rows(self, rows: int):
+        self.rows = (self.rows or 0) + rows
+
+    def summary(self) -> Dict[str, Any]:
+        wall, cpu = self.wall, self.cpu
+        if self._started is not None:  # Still running: include the time so far
+            wall += time.perf_counter() - self._started[0]
+            cpu += time.process_time() - self._started[1]
+        result = {'wall_seconds': round(wall, 4), 'cpu_seconds': round(cpu, 4), 'calls': self.calls}
+        if self.rows is not None:
+            result['rows'] = self.rows
+            result['rows_per_second'] = round(self.rows / wall, 1) if wall > 0 else None
+        if self.rss_delta_mb is not None:
+            result['rss_delta_mb'] = round(self.rss_delta_mb, 1)
+        if self.rss_growth_mb is not None:
+            result['peak_rss_growth_mb'] = round(self.rss_growth_mb, 1)
+        if self.peak_traced is not None:
+            result['peak_traced_mb'] = round(self.peak_traced / (1 << 20), 1)
+        return result
+
+class PipelineMetrics:
+    """Named stage timings of one pipeline run"""
+
+    def __init__(self, pipeline: str, profile_dir: Optional[str] = None):
+        self.pipeline = pipeline
+        self.profile_dir = profile_dir
+        self.stages: Dict[str, Stage] = {}
+        self._active: List[Stage] = []
+        self.started = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        if profile_dir and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _get(self, name: str) -> Stage:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(name, self.profile_dir is not None)
+        return stage
+
+    def _enter(self, stage: Stage, rss: bool = True):
+        if self._active:
+            self._active[-1].untrace()
+        self._active.append(stage)
+        stage.start(rss)
+
+    def _exit(self, stage: Stage):
+        wall, cpu, rss_delta, rss_growth = stage.stop()
+        self._active.pop()
+        if self._active:
+            # Stages add up their time including nested ones; take that back out of the outer stage
+            outer = self._active[-1]
+            if outer._rss is None:
+                rss_delta = rss_growth = None
+            outer.add(-wall, -cpu, None if rss_delta is None else -rss_delta,
+                      None if rss_growth is None else -rss_growth)
+            outer.trace()
+
+    @contextmanager
+    def stage(self, name: str, rows: Optional[int] = None):
+        """Time the block as stage `name`; yields the Stage so rows can be added"""
+        stage = self._get(name)
+        stage.calls += 1
+        if rows is not None:
+            stage.add_rows(rows)
+        self._enter(stage)
+        try:
+            yield stage
+        finally:
+            self._exit(stage)
+
+    def iterate(self, name: str, items: Iterable) -> Iterator:
+        """Pass items through, timing only the work of producing them as stage `name`"""
+        stage = self._get(name)
+        stage.calls += 1
+        return self._timed(stage, iter(items))
+
+    def _timed(self, stage: Stage, iterator: Iterator) -> Iterator:
+        if self.profile_dir:
+            yield from self._traced(stage, iterator)
+            return
+        # Runs once per item, so only the clocks are read; the memory of an
+        # iterated stage is counted in the stage that consumes it
+        active = self._active
+        clock, cpu_clock = time.perf_counter, time.process_time
+        while True:
+            active.append(stage)
+            wall, cpu = clock(), cpu_clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                wall, cpu = clock() - wall, cpu_clock() - cpu
+                active.pop()
+                stage.wall += wall
+                stage.cpu += cpu
+                if active:
+                    active[-1].wall -= wall
+                    active[-1].cpu -= cpu
+            stage.rows = (stage.rows or 0) + 1
+            yield item
+
+    def _traced(self, stage: Stage, iterator: Iterator) -> Iterator:
+        """_timed under --profile: switch the profiler and traced peak to the stage per item"""
+        while True:
+            self._enter(stage, rss=False)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit(stage)
+            stage.add_rows(1)
+            yield item
+
+    def summary(self) -> Dict[str, Any]:
+        """Metrics of the run so far, for the output metadata or a metrics file"""
+        result = {
+            'format': METRICS_FORMAT,
+            'pipeline': self.pipeline,
+            'started': self.started,
+            'wall_seconds': round(time.perf_counter() - self._wall_start, 4),
+            'cpu_seconds': round(time.process_time() - self._cpu_start, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': {name: stage.summary() for name, stage in self.stages.items()},
+        }
+        if self.profile_dir:
+            result['profile_dir'] = self.profile_dir
+        return result
+
+    def report(self):
+        summary = self.summary()
+        print(f"\nStage timings ({self.pipeline}, {summary['wall_seconds']:.2f}s wall, "
+              f"{summary['cpu_seconds']:.2f}s CPU, peak RSS {summary['peak_rss_mb']} MB):")
+        for name, stage in summary['stages'].items():
+            line = f"  {name:<20} {stage['wall_seconds']:9.3f}s wall {stage['cpu_seconds']:9.3f}s CPU"
+            if stage.get('rows_per_second'):
+                line += f"  {stage['rows']:>9} rows {stage['rows_per_second']:>11,.0f}/s"
+            if 'rss_delta_mb' in stage:
+                line += f"  {stage['rss_delta_mb']:+.1f} MB RSS"
+            if 'peak_traced_mb' in stage:
+                line += f"  {stage['peak_traced_mb']:.1f} MB traced"
+            print(line)
+
+    def write_profiles(self) -> List[str]:
+        """Write each stage's cProfile stats to the profile directory"""
+        if not self.profile_dir:
+            return []
+        os.makedirs(self.profile_dir, exist_ok=True)
+        paths = []
+        for name, stage in self.stages.items():
+            if stage.profiler is None or not stage.calls:
+                continue
+            path = os.path.join(self.profile_dir, f'{self.pipeline}-{name}.prof')
+            stage.profiler.dump_stats(path)
+            paths.append(path)
+        return paths
+
+    def finish(self, metrics_path: Optional[str] = None) -> Dict[str, Any]:
+        """Print the stage timings, write the profiles and the metrics file; return the summary"""
+        self.report()
+        profiles = self.write_profiles()
+        if profiles:
+            print(f"Wrote {len(profiles)} profiles to {self.profile_dir}")
+        summary = self.summary()
+        if metrics_path:
+            with open(metrics_path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            print(f"Metrics written to {metrics_path}")
+        return summary
+
+def add_metrics_arguments(parser):
+    """--metrics and --profile options of the pipeline scripts"""
+    parser.add_argument('--metrics', metavar='JSON',
+                        help="Write wall/CPU time, rows/s and RSS growth per stage to a JSON file.")
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILE_DIR, metavar='DIR',
+                        help="Run each stage under cProfile and write <script>-<stage>.prof files to DIR\n"
+                             "(default: .pipeline_profiles next to pipeline_metrics.py). Also traces\n"
+                             "Python allocations per stage; slows the run down.")
+
+def metrics_from_args(pipeline: str, args) -> PipelineMetrics:
+    return PipelineMetrics(pipeline, getattr(args, 'profile', None))
+
+def compare_metrics(paths: List[str]):
+    """Print the stage wall times of several metrics files side by side"""
+    runs = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            runs.append(json.load(f))
+    names = []
+    for run in runs:
+        names.extend(name for name in run['stages'] if name not in names)
+    print(f"{'stage':<20}" + ''.join(f"{os.path.basename(path)[:18]:>20}" for path in paths))
+    for name in names + ['(total)']:
+        cells = []
+        for run in runs:
+            seconds = run['wall_seconds'] if name == '(total)' else run['stages'].get(name, {}).get('wall_seconds')
+            cells.append(f"{seconds:19.3f}s" if seconds is not None else f"{'-':>20}")
+        print(f"{name:<20}" + ''.join(cells))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python pipeline_metrics.py <metrics_json> [<metrics_json> ...]")
+        sys.exit(1)
+    compare_metrics(sys.argv[1:])
@@ -5,7 +5,7 @@ This script processes the raw tariff CSV data and integrates Section 301 data
 to create a clean JSON file that's easier for the app to consume.
 
 Usage:
-  python preprocess_tariff_data_new.py <input_csv> <section301_csv> <output_json> [hts_revision] [--inject-extra-tariffs]
+  python preprocess_tariff_data_new.py <input_csv> <section301_csv> <output_json> [hts_revision] [--inject-extra-tariffs] [--stream] [--workers N] [--engine row|columnar] [--rules RULES_CSV] [--incremental-cache DIR] [--segments-dir DIR] [--normalized] [--no-overlay-cache] [--metrics JSON] [--profile [DIR]]
 
 Arguments:
   <input_csv>              Path to the input tariff CSV file.
@@ -13,18 +13,43 @@ Arguments:
   <output_json>            Path to the output JSON file.
   [hts_revision]           Optional HTS revision string.
   --inject-extra-tariffs   Optional flag to inject Reciprocal, Fentanyl, and IEEPA tariffs.
+  --stream                 Write entries to the output file as they are processed.
+  --workers N              Process rows across N worker processes.
+  --engine row|columnar    Row-wise (reference) or batched columnar backend.
+  --rules RULES_CSV        Attach duties from a declarative trade rules file.
+  --incremental-cache DIR  Only reprocess 3-digit HTS prefixes whose rows or overlays changed.
+  --segments-dir DIR       Also write tariff-XXX.json segments and segment-index.json to DIR.
+  --normalized             Store repeated sub-objects once in shared tables (normalized_output.py).
+  --no-overlay-cache       Re-parse the overlay CSVs instead of loading snapshots.
+  --metrics JSON           Write per-stage timings and peak memory to a JSON file.
+  --profile [DIR]          Profile each stage with cProfile and write .prof files to DIR.
 """
 
 import csv
+import glob
+import hashlib
+import io
 import json
+import multiprocessing
+import pickle
 import re
-from typing import Dict, Any, Optional, List
+from itertools import islice
+from typing import Dict, Any, Optional, List, Iterator
 import sys
 import os
 from datetime import datetime
 import argparse
+import numpy as np
 import pandas as pd
 
+from hts_keys import legacy_key, legacy_keys_batch, normalize_hts_code
+from hts_rule_index import HtsRuleIndex, build_rule_index
+from normalized_output import NormalizedTariffWriter, dump_nested, normalize_output
+from overlay_store import DEFAULT_CACHE_DIR, load_overlay_store
+from pipeline_metrics import add_metrics_arguments, metrics_from_args
+from segment_writer import SegmentWriter, encode_segment, segment_prefix
+from trade_rules import load_rule_table
+
 # Special programs mapping based on the uploaded data
 COUNTRY_TO_PROGRAMS = {
     'CA': {'code': 'CA', 'name': 'Canada', 'programs': ['USMCA', 'NAFTA']},
@@ -130,119 +155,27 @@ ADDITIVE_DUTIES = {
     }
 }
 
-# Load Section 301 data
-SECTION_301_DATA = {}
-
-# Load Section 201 data
-SECTION_201_DATA = {}
+# Product categories matched by HTS prefix
+PRODUCT_PREFIXES = {
+    'chapter_99': ['99'],
+    'steel': ADDITIVE_DUTIES['section_232_steel']['chapters'],  # Chapters 72-73
+    'aluminum': ADDITIVE_DUTIES['section_232_aluminum']['chapters'],  # Chapter 76
+    # Solar cells and modules (8541.42 and 8541.43) at 6 and 8 digits, plus
+    # DC/AC generators (8501.31.80, 8501.61.00) and lead-acid batteries
+    # (8507.20.80) with CSPV cells
+    'solar': ['854142', '854143', '85414200', '85414300', '85013180', '85016100', '85072080'],
+    'energy': ['27'],  # Chapter 27 - Mineral fuels, oils
+    'potash': ['310420', '310520'],  # Common potash HTS codes
+}
 
-def normalize_hts_code(hts_code: str) -> str:
-    """Normalize HTS code to 8-digit format without dots for matching"""
-    # Remove all non-digits
-    code = re.sub(r'[^\d]', '', str(hts_code))
-    
-    # Remove leading zeros but ensure we have at least 8 digits
-    code = code.lstrip('0') or '0'  # Keep at least one zero if all zeros
-    
-    # If less than 8 digits after removing leading zeros, pad on the right
-    if len(code) < 8:
-        code = code.ljust(8, '0')
-    
-    # If more than 8 digits, take first 8
-    if len(code) > 8:
-        code = code[:8]
-    
-    # Special handling: if code starts with 0 after normalization, it's likely
-    # a chapter 01-09 code that should not have leading zero in database
-    # Example: 0101.21.00 -> 01012100 -> 10121000
-    if code.startswith('0') and len(code) == 8:
-        # Try without the leading zero
-        code_without_zero = code[1:] + '0'
-        # This transforms 01012100 -> 10121000
-        return code_without_zero
-    
-    return code
+# Longest-prefix index of product categories, Section 232 headings and trade remedies
+RULE_INDEX = build_rule_index(PRODUCT_PREFIXES)
 
-def load_section_301_data(section301_csv_path: str):
-    """Load Section 301 deduplicated data into a lookup dictionary"""
-    global SECTION_301_DATA
-    try:
-        df = pd.read_csv(section301_csv_path)
-        for _, row in df.iterrows():
-            hts_code = str(row['HTS_Code']).strip()
-            # Normalize the HTS code for matching
-            normalized_code = normalize_hts_code(hts_code)
-            
-            list_num = str(row['List']).strip()
-            
-            # Determine rate based on list
-            if list_num in ['1', '2', '3']:
-                rate = 25.0
-            elif list_num == '4a':
-                rate = 7.5
-            else:
-                rate = 0.0
-            
-            SECTION_301_DATA[normalized_code] = {
-                'list': list_num,
-                'rate': rate,
-                'description': row.get('Description', ''),
-                'original_code': hts_code  # Keep original for reference
-            }
-        
-        print(f"Loaded {len(SECTION_301_DATA)} Section 301 HTS codes")
-        # Debug: Show a few examples
-        examples = list(SECTION_301_DATA.items())[:5]
-        print("Section 301 examples (normalized):")
-        for code, data in examples:
-            print(f"  {code} <- {data['original_code']} (List {data['list']})")
-        
-        # Show specific example for horses
-        if '10121000' in SECTION_301_DATA:
-            print(f"\nFound 10121000: {SECTION_301_DATA['10121000']}")
-        if '01012100' in SECTION_301_DATA:
-            print(f"Found 01012100: {SECTION_301_DATA['01012100']}")
-        return True
-    except Exception as e:
-        print(f"Error loading Section 301 data: {e}")
-        return False
+# Load Section 301 data, keyed by legacy_key()
+SECTION_301_DATA: Dict[int, Dict[str, Any]] = {}
 
-def load_section_201_data(section201_csv_path: str):
-    """Load Section 201 solar data into a lookup dictionary"""
-    global SECTION_201_DATA
-    try:
-        # If file doesn't exist, just return True (Section 201 is optional)
-        if not os.path.exists(section201_csv_path):
-            print(f"Section 201 CSV not found at {section201_csv_path}, skipping...")
-            return True
-            
-        df = pd.read_csv(section201_csv_path, comment='#')
-        for _, row in df.iterrows():
-            hts_code = str(row['HTS_Code']).strip()
-            # Normalize the HTS code for matching
-            normalized_code = normalize_hts_code(hts_code)
-            
-            # Parse exempt countries
-            exempt_countries = []
-            exempt_str = row.get('Exempt_Countries')
-            if exempt_str and pd.notna(exempt_str):
-                exempt_countries = [c.strip() for c in str(exempt_str).split(',')]
-            
-            SECTION_201_DATA[normalized_code] = {
-                'rate': float(row.get('Current_Rate', 14.0)) if row.get('Current_Rate') else 14.0,
-                'product_type': row.get('Product_Type', 'solar'),
-                'quota_gw': float(row.get('Quota_GW', 0)) if row.get('Quota_GW') else 0,
-                'exempt_countries': exempt_countries,
-                'notes': row.get('Notes', ''),
-                'original_code': hts_code  # Keep original for reference
-            }
-        
-        print(f"Loaded {len(SECTION_201_DATA)} Section 201 solar HTS codes")
-        return True
-    except Exception as e:
-        print(f"Warning: Could not load Section 201 data: {e}")
-        # Return True anyway - Section 201 is optional
-        return True
+# Load Section 201 data, keyed by legacy_key()
+SECTION_201_DATA: Dict[int, Dict[str, Any]] = {}
 
 def clean_field_name(field_name: str) -> str:
     """Clean and standardize field names"""
@@ -262,36 +195,27 @@ def clean_hts_code(code: str) -> str:
 
 def is_chapter_99_code(hts_code: str) -> bool:
     """Check if an HTS code is a Chapter 99 special provision"""
-    return hts_code.startswith('99')
+    return 'chapter_99' in RULE_INDEX.categories(hts_code)
 
 def is_steel_product(hts_code: str) -> bool:
     """Check if HTS code is a steel product (Chapters 72-73)"""
-    return hts_code.startswith('72') or hts_code.startswith('73')
+    return 'steel' in RULE_INDEX.categories(hts_code)
 
 def is_aluminum_product(hts_code: str) -> bool:
     """Check if HTS code is an aluminum product (Chapter 76)"""
-    return hts_code.startswith('76')
+    return 'aluminum' in RULE_INDEX.categories(hts_code)
 
 def is_solar_product(hts_code: str) -> bool:
     """Check if HTS code is a solar product"""
-    # Solar cells and modules (8541.42 and 8541.43)
-    # Check both 6-digit and 8-digit prefixes to handle different formats
-    return (hts_code.startswith('854142') or hts_code.startswith('854143') or
-            hts_code.startswith('85414200') or hts_code.startswith('85414300') or
-            # Also check for generators and batteries with CSPV cells
-            hts_code.startswith('85013180') or  # DC generators with CSPV
-            hts_code.startswith('85016100') or  # AC generators with CSPV
-            hts_code.startswith('85072080'))    # Lead-acid batteries with CSPV
+    return 'solar' in RULE_INDEX.categories(hts_code)
 
 def is_energy_product(hts_code: str) -> bool:
     """Check if HTS code is an energy product"""
-    # Chapter 27 - Mineral fuels, oils
-    return hts_code.startswith('27')
+    return 'energy' in RULE_INDEX.categories(hts_code)
 
 def is_potash_product(hts_code: str) -> bool:
     """Check if HTS code is a potash product"""
-    # Common potash HTS codes
-    return hts_code.startswith('310420') or hts_code.startswith('310520')
+    return 'potash' in RULE_INDEX.categories(hts_code)
 
 def is_exempt_from_reciprocal_tariff(hts_code: str, country: str) -> bool:
     """Check if HTS code is exempt from reciprocal tariff"""
@@ -323,10 +247,20 @@ def parse_additional_duty_text(text: str) -> Optional[float]:
 
 def determine_additive_duties(hts_code: str, entry: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Determine which additive duties apply to this HTS code"""
+    key = legacy_key(hts_code)
+    return build_additive_duties(
+        is_steel_product(hts_code), is_aluminum_product(hts_code), is_solar_product(hts_code),
+        SECTION_301_DATA.get(key), SECTION_201_DATA.get(key)
+    )
+
+def build_additive_duties(steel: bool, aluminum: bool, solar: bool,
+                          section_301_info: Optional[Dict[str, Any]],
+                          section_201_info: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Build the additive duty list from already-classified product flags and overlay records"""
     additive_duties = []
 
     # Check for Section 232 duties (global application with UK exemption)
-    if is_steel_product(hts_code):
+    if steel:
         steel_info = ADDITIVE_DUTIES.get('section_232_steel', {})
         additive_duties.append({
             'type': 'section_232',
@@ -338,7 +272,7 @@ def determine_additive_duties(hts_code: str, entry: Dict[str, Any]) -> List[Dict
             'label': 'Section 232 Steel (50%, UK 25%)',
             'uk_codes': steel_info.get('uk_codes', [])
         })
-    elif is_aluminum_product(hts_code):
+    elif aluminum:
         aluminum_info = ADDITIVE_DUTIES.get('section_232_aluminum', {})
         additive_duties.append({
             'type': 'section_232',
@@ -351,10 +285,8 @@ def determine_additive_duties(hts_code: str, entry: Dict[str, Any]) -> List[Dict
             'uk_codes': aluminum_info.get('uk_codes', [])
         })
 
-    # Check for Section 301 duties using normalized code
-    normalized_code = normalize_hts_code(hts_code)
-    if normalized_code in SECTION_301_DATA:
-        section_301_info = SECTION_301_DATA[normalized_code]
+    # Section 301 duties (looked up by normalized code)
+    if section_301_info is not None:
         additive_duties.append({
             'type': 'section_301',
             'name': 'Section 301 - China Trade',
@@ -364,9 +296,8 @@ def determine_additive_duties(hts_code: str, entry: Dict[str, Any]) -> List[Dict
             'label': f"Section 301 List {section_301_info['list']} ({section_301_info['rate']}%)"
         })
 
-    # Check for Section 201 duties using normalized code (similar to Section 301)
-    if normalized_code in SECTION_201_DATA:
-        section_201_info = SECTION_201_DATA[normalized_code]
+    # Section 201 duties (looked up by normalized code, similar to Section 301)
+    if section_201_info is not None:
         additive_duties.append({
             'type': 'section_201',
             'name': 'Section 201 - Solar Safeguard',
@@ -377,7 +308,7 @@ def determine_additive_duties(hts_code: str, entry: Dict[str, Any]) -> List[Dict
             'label': f"Section 201 Solar ({section_201_info['rate']}%)",
             'notes': section_201_info.get('notes', '')
         })
-    elif is_solar_product(hts_code):
+    elif solar:
         # Fallback to prefix matching if not in lookup table
         solar_info = ADDITIVE_DUTIES.get('section_201_solar', {})
         additive_duties.append({
@@ -391,73 +322,256 @@ def determine_additive_duties(hts_code: str, entry: Dict[str, Any]) -> List[Dict
 
     return additive_duties
 
+def build_reciprocal_tariffs(hts_code: str, steel: bool, aluminum: bool) -> List[Dict[str, Any]]:
+    """Build the injected reciprocal and fentanyl tariffs for a non-Chapter 99 entry"""
+    reciprocal_tariffs = []
+    if not steel and not aluminum:
+        if not is_exempt_from_reciprocal_tariff(hts_code, 'CN'):
+            reciprocal_tariffs.append({
+                'country': 'CN',
+                'rate': 10.0,
+                'label': 'Reciprocal Tariff - China (10%)',
+                'note': 'Temporary 90-day agreement',
+                'effective': '2025-05-14',
+                'expires': '2025-08-12'
+            })
+
+        if not is_exempt_from_fentanyl_tariff(hts_code, 'CN'):
+            reciprocal_tariffs.append({
+                'country': 'CN',
+                'rate': 20.0,
+                'label': 'Fentanyl Anti-Trafficking Tariff - China (20%)',
+                'note': 'Anti-trafficking measure',
+                'effective': '2025-03-04',
+                'expires': None
+            })
+    return reciprocal_tariffs
+
+def build_ieepa_tariffs(steel: bool, aluminum: bool, solar: bool,
+                        energy: bool, potash: bool) -> List[Dict[str, Any]]:
+    """Build the injected IEEPA tariffs for a non-Chapter 99 entry"""
+    ieepa_tariffs = []
+    if steel or aluminum or solar:
+        return ieepa_tariffs
+
+    if energy or potash:
+        rate = 10.0
+        label = 'IEEPA Tariff - Canada (10% - Energy/Potash)'
+    else:
+        rate = 25.0
+        label = 'IEEPA Tariff - Canada (25%)'
+
+    ieepa_tariffs.append({
+        'country': 'CA',
+        'rate': rate,
+        'label': label,
+        'note': 'USMCA-origin goods exempt; Does not stack with Section 232',
+        'effective': '2025-03-04',
+        'legal_status': 'Under judicial review, currently in effect'
+    })
+
+    if potash:
+        rate = 10.0
+        label = 'IEEPA Tariff - Mexico (10% - Potash)'
+    else:
+        rate = 25.0
+        label = 'IEEPA Tariff - Mexico (25%)'
+
+    ieepa_tariffs.append({
+        'country': 'MX',
+        'rate': rate,
+        'label': label,
+        'note': 'USMCA-origin goods exempt; Does not stack with Section 232',
+        'effective': '2025-03-04',
+        'legal_status': 'Under judicial review, currently in effect'
+    })
+    return ieepa_tariffs
+
+# Field names probed (after cleaning) for the HTS code column
+HTS_FIELD_CANDIDATES = ['hts8', 'HTS8', 'HTS Number', 'hts_8']
+
+# Fields copied verbatim when present and non-empty
+STANDARD_FIELDS = [
+    'quantity_1_code', 'quantity_2_code', 'wto_binding_code',
+    'mfn_text_rate', 'mfn_rate_type_code', 'mfn_ave',
+    'pharmaceutical_ind', 'dyes_indicator',
+    'col2_text_rate', 'col2_rate_type_code',
+    'begin_effect_date', 'end_effective_date',
+    'footnote_comment'
+]
+
+# Numeric rate fields; values of 1000 or more are special indicators
+RATE_FIELDS = ['mfn_specific_rate', 'mfn_other_rate',
+               'col2_ad_val_rate', 'col2_specific_rate', 'col2_other_rate']
+
+# FTA/special program fields with proper program names
+FTA_PROGRAMS = {
+    'gsp': 'GSP',
+    'nafta_canada': 'NAFTA Canada',
+    'nafta_mexico': 'NAFTA Mexico',
+    'mexico': 'Mexico',
+    'cbi': 'Caribbean Basin',
+    'agoa': 'AGOA',
+    'israel_fta': 'Israel FTA',
+    'jordan': 'Jordan FTA',
+    'singapore': 'Singapore FTA',
+    'chile': 'Chile FTA',
+    'morocco': 'Morocco FTA',
+    'australia': 'Australia FTA',
+    'bahrain': 'Bahrain FTA',
+    'dr_cafta': 'CAFTA-DR',
+    'oman': 'Oman FTA',
+    'peru': 'Peru TPA',
+    'korea': 'Korea FTA',
+    'colombia': 'Colombia TPA',
+    'panama': 'Panama TPA',
+    'usmca': 'USMCA'
+}
+
+PROGRAM_RATE_SUFFIXES = ['rate_type_code', 'specific_rate', 'other_rate']
+
+class RowSchema:
+    """Column layout of a tariff CSV, compiled once from its header.
+
+    Everything process_tariff_entry used to work out per row from the field
+    names (cleaned names, which HTS column is present, which program columns
+    exist) is resolved here into column positions, so rows can be read as
+    plain csv.reader lists.
+    """
+
+    def __init__(self, fieldnames: List[str]):
+        self.fieldnames = list(fieldnames)
+        self.width = len(self.fieldnames)
+
+        # Later duplicates win, as they did when rows were cleaned into a dict
+        index = {}
+        for position, name in enumerate(self.fieldnames):
+            cleaned = clean_field_name(name) if isinstance(name, str) else ''
+            index[cleaned] = position
+        self.index = index
+
+        self.hts_field = None
+        for candidate in HTS_FIELD_CANDIDATES:
+            cleaned = clean_field_name(candidate)
+            if cleaned in index:
+                self.hts_field = cleaned
+                break
+        self.hts_index = index.get(self.hts_field)
+
+        self.description_index = index.get('brief_description')
+        self.mfn_ad_val_index = index.get('mfn_ad_val_rate')
+        self.mfn_text_index = index.get('mfn_text_rate')
+        self.col2_ad_val_index = index.get('col2_ad_val_rate')
+        self.standard_fields = [(field, index[field]) for field in STANDARD_FIELDS if field in index]
+        self.rate_fields = [(field, index[field]) for field in RATE_FIELDS if field in index]
+
+        self.programs = []
+        self.missing_programs = []
+        for program_key, program_name in FTA_PROGRAMS.items():
+            indicator_field = f'{program_key}_indicator'
+            ad_val_field = f'{program_key}_ad_val_rate'
+            other_fields = [(f'{program_key}_{suffix}', index[f'{program_key}_{suffix}'])
+                            for suffix in PROGRAM_RATE_SUFFIXES
+                            if f'{program_key}_{suffix}' in index]
+            if indicator_field not in index and not other_fields:
+                self.missing_programs.append(program_key)
+            self.programs.append((
+                program_key, program_name,
+                indicator_field, index.get(indicator_field),
+                ad_val_field, index.get(ad_val_field),
+                other_fields
+            ))
+
+        expected = STANDARD_FIELDS + RATE_FIELDS + ['brief_description', 'mfn_ad_val_rate']
+        self.missing_fields = [field for field in expected if field not in index]
+
+    @property
+    def variant(self) -> str:
+        """Short description of which tariff database layout this header matches"""
+        if self.hts_index is None:
+            return 'unrecognized (no HTS code column)'
+        if 'usmca' not in self.missing_programs:
+            layout = 'USITC tariff database, USMCA era'
+        elif 'nafta_canada_ind' in self.index or 'nafta_canada' not in self.missing_programs:
+            layout = 'USITC tariff database, NAFTA era'
+        else:
+            layout = 'unrecognized tariff layout'
+        return f"{layout} (HTS column '{self.fieldnames[self.hts_index]}')"
+
+    def report(self):
+        """Print the detected layout and any columns that will be missing from every row"""
+        print(f"Detected input layout: {self.variant}")
+        print(f"  - {self.width} columns, {len(self.programs) - len(self.missing_programs)}"
+              f"/{len(self.programs)} trade programs present")
+        if self.missing_programs:
+            print(f"  - Programs without columns: {', '.join(self.missing_programs)}")
+        if self.missing_fields:
+            print(f"  - Fields without columns: {', '.join(self.missing_fields)}")
+
+_SCHEMA_CACHE: Dict[tuple, RowSchema] = {}
+
+def compile_row_schema(fieldnames: List[str]) -> RowSchema:
+    """Compile (or fetch the cached) RowSchema for a CSV header"""
+    key = tuple(fieldnames)
+    schema = _SCHEMA_CACHE.get(key)
+    if schema is None:
+        schema = _SCHEMA_CACHE[key] = RowSchema(fieldnames)
+    return schema
+
 def process_tariff_entry(row: Dict[str, Any], inject_extra_tariffs: bool, section_301_only: bool = True) -> Optional[Dict[str, Any]]:
-    """Process a single tariff entry, handling special cases"""
-
-    # Clean all field names in the row
-    cleaned_row = {}
-    for key, value in row.items():
-        cleaned_key = clean_field_name(key)
-        cleaned_row[cleaned_key] = value
-    row = cleaned_row
-
-    # Get the HTS code - check multiple possible field names
-    hts_code = ''
-    for field_name in ['hts8', 'HTS8', 'HTS Number', 'hts_8']:
-        if field_name in row:
-            hts_code = clean_hts_code(str(row[field_name]))
-            break
+    """Process a single tariff entry given as a csv.DictReader row"""
+    schema = compile_row_schema(list(row.keys()))
+    return process_tariff_values(list(row.values()), schema, inject_extra_tariffs, section_301_only)
+
+def process_tariff_values(values: List[Any], schema: RowSchema, inject_extra_tariffs: bool,
+                          section_301_only: bool = True) -> Optional[Dict[str, Any]]:
+    """Process a single tariff entry given as a csv.reader row, handling special cases"""
+
+    # Short rows read as None for the missing columns, as csv.DictReader does
+    if len(values) < schema.width:
+        values = list(values) + [None] * (schema.width - len(values))
+
+    # Get the HTS code from the column detected in the header
+    if schema.hts_index is None:
+        return None
+    hts_code = clean_hts_code(str(values[schema.hts_index]))
 
     if not hts_code:
         # Skip entries without HTS codes
         return None
 
     # Normalize HTS code for Section 301 matching
-    normalized_code = normalize_hts_code(hts_code)
-    
-    # Debug specific codes
-    if hts_code.startswith('101210') or hts_code.startswith('010121'):
-        print(f"Debug: Processing {hts_code} -> normalized to {normalized_code}")
-        if normalized_code in SECTION_301_DATA:
-            print(f"  Found in Section 301: {SECTION_301_DATA[normalized_code]}")
-        else:
-            print(f"  NOT found in Section 301 data")
-    
+    key = legacy_key(hts_code)
+
     # Check if this HTS code has Section 301 duties
-    has_section_301 = normalized_code in SECTION_301_DATA
+    has_section_301 = key in SECTION_301_DATA
     
     if section_301_only and not has_section_301:
         # Skip entries that don't have Section 301 duties when filtering
         return None
 
+    # One prefix walk classifies the product for every rule below
+    categories = RULE_INDEX.categories(hts_code)
+
     # Create cleaned entry
     entry = {
         'hts8': hts_code,
-        'brief_description': row.get('brief_description', row.get('Description', '')),
-        'is_chapter_99': is_chapter_99_code(hts_code),
+        'brief_description': values[schema.description_index] if schema.description_index is not None else '',
+        'is_chapter_99': 'chapter_99' in categories,
     }
     
     # Add Section 301 info if available
     if has_section_301:
-        entry['section_301_list'] = SECTION_301_DATA[normalized_code]['list']
-        entry['section_301_rate'] = SECTION_301_DATA[normalized_code]['rate']
+        entry['section_301_list'] = SECTION_301_DATA[key]['list']
+        entry['section_301_rate'] = SECTION_301_DATA[key]['rate']
 
     # Copy over standard fields
-    standard_fields = [
-        'quantity_1_code', 'quantity_2_code', 'wto_binding_code',
-        'mfn_text_rate', 'mfn_rate_type_code', 'mfn_ave',
-        'pharmaceutical_ind', 'dyes_indicator',
-        'col2_text_rate', 'col2_rate_type_code',
-        'begin_effect_date', 'end_effective_date',
-        'footnote_comment'
-    ]
-
-    for field in standard_fields:
-        if field in row and row[field]:
-            entry[field] = row[field]
+    for field, position in schema.standard_fields:
+        if values[position]:
+            entry[field] = values[position]
 
     # Handle MFN rates
-    mfn_ad_val = row.get('mfn_ad_val_rate', '0')
+    mfn_ad_val = values[schema.mfn_ad_val_index] if schema.mfn_ad_val_index is not None else '0'
 
     # Check for special Chapter 99 indicator values
     if mfn_ad_val == '9999.999999' or (mfn_ad_val and float(mfn_ad_val) > 100):
@@ -466,7 +580,7 @@ def process_tariff_entry(row: Dict[str, Any], inject_extra_tariffs: bool, sectio
         entry['mfn_ad_val_rate'] = 0  # No base rate
 
         # Extract additional duty from text
-        mfn_text = row.get('mfn_text_rate', '')
+        mfn_text = values[schema.mfn_text_index] if schema.mfn_text_index is not None else ''
         additional_rate = parse_additional_duty_text(mfn_text)
         if additional_rate:
             entry['chapter_99_additional_rate'] = additional_rate
@@ -486,13 +600,10 @@ def process_tariff_entry(row: Dict[str, Any], inject_extra_tariffs: bool, sectio
         entry['is_special_provision'] = False
 
     # Handle other rate fields
-    rate_fields = ['mfn_specific_rate', 'mfn_other_rate',
-                   'col2_ad_val_rate', 'col2_specific_rate', 'col2_other_rate']
-
-    for field in rate_fields:
-        if field in row and row[field]:
+    for field, position in schema.rate_fields:
+        if values[position]:
             try:
-                value = float(row[field])
+                value = float(values[position])
                 # Skip special indicator values
                 if value < 1000:
                     entry[field] = value
@@ -500,7 +611,7 @@ def process_tariff_entry(row: Dict[str, Any], inject_extra_tariffs: bool, sectio
                 pass
 
     # Handle Column 2 rates and determine if they're special trade actions
-    col2_ad_val = row.get('col2_ad_val_rate', '0')
+    col2_ad_val = values[schema.col2_ad_val_index] if schema.col2_ad_val_index is not None else '0'
     if col2_ad_val:
         try:
             col2_rate = float(col2_ad_val)
@@ -512,48 +623,23 @@ def process_tariff_entry(row: Dict[str, Any], inject_extra_tariffs: bool, sectio
         except (ValueError, TypeError):
             pass
 
-    # Handle FTA/special program fields with proper program names
-    fta_programs = {
-        'gsp': 'GSP',
-        'nafta_canada': 'NAFTA Canada',
-        'nafta_mexico': 'NAFTA Mexico',
-        'mexico': 'Mexico',
-        'cbi': 'Caribbean Basin',
-        'agoa': 'AGOA',
-        'israel_fta': 'Israel FTA',
-        'jordan': 'Jordan FTA',
-        'singapore': 'Singapore FTA',
-        'chile': 'Chile FTA',
-        'morocco': 'Morocco FTA',
-        'australia': 'Australia FTA',
-        'bahrain': 'Bahrain FTA',
-        'dr_cafta': 'CAFTA-DR',
-        'oman': 'Oman FTA',
-        'peru': 'Peru TPA',
-        'korea': 'Korea FTA',
-        'colombia': 'Colombia TPA',
-        'panama': 'Panama TPA',
-        'usmca': 'USMCA'
-    }
-
     # Track available programs for this entry
-    entry['available_programs'] = []
+    available_programs = entry['available_programs'] = []
 
-    for program_key, program_name in fta_programs.items():
+    for (program_key, program_name, indicator_field, indicator_index,
+         ad_val_field, ad_val_index, other_fields) in schema.programs:
         # Copy indicator
-        indicator_field = f'{program_key}_indicator'
-        if indicator_field in row and row[indicator_field]:
-            entry[indicator_field] = row[indicator_field]
+        if indicator_index is not None and values[indicator_index]:
+            entry[indicator_field] = values[indicator_index]
 
             # Handle ad valorem rates
-            ad_val_field = f'{program_key}_ad_val_rate'
-            if ad_val_field in row and row[ad_val_field]:
+            if ad_val_index is not None and values[ad_val_index]:
                 try:
-                    value = float(row[ad_val_field])
+                    value = float(values[ad_val_index])
                     # Skip special indicator values
                     if value < 1000:
                         entry[ad_val_field] = value
-                        entry['available_programs'].append({
+                        available_programs.append({
                             'program_key': program_key,
                             'program_name': program_name,
                             'rate': value
@@ -562,83 +648,693 @@ def process_tariff_entry(row: Dict[str, Any], inject_extra_tariffs: bool, sectio
                     pass
 
         # Copy other rate fields
-        for suffix in ['rate_type_code', 'specific_rate', 'other_rate']:
-            field = f'{program_key}_{suffix}'
-            if field in row and row[field]:
-                entry[field] = row[field]
+        for field, position in other_fields:
+            if values[position]:
+                entry[field] = values[position]
 
     # Determine all applicable additive duties for this product
-    additive_duties_info = determine_additive_duties(hts_code, entry)
+    steel = 'steel' in categories
+    aluminum = 'aluminum' in categories
+    solar = 'solar' in categories
+    additive_duties_info = build_additive_duties(
+        steel, aluminum, solar,
+        SECTION_301_DATA.get(key), SECTION_201_DATA.get(key)
+    )
     if additive_duties_info:
         entry['additive_duties'] = additive_duties_info
 
-    # Add reciprocal tariff and fentanyl tariff information if enabled
-    if inject_extra_tariffs and not entry.get('is_chapter_99'):
-        entry['reciprocal_tariffs'] = []
-        if not is_steel_product(hts_code) and not is_aluminum_product(hts_code):
-            if not is_exempt_from_reciprocal_tariff(hts_code, 'CN'):
-                entry['reciprocal_tariffs'].append({
-                    'country': 'CN',
-                    'rate': 10.0,
-                    'label': 'Reciprocal Tariff - China (10%)',
-                    'note': 'Temporary 90-day agreement',
-                    'effective': '2025-05-14',
-                    'expires': '2025-08-12'
-                })
-
-            if not is_exempt_from_fentanyl_tariff(hts_code, 'CN'):
-                entry['reciprocal_tariffs'].append({
-                    'country': 'CN',
-                    'rate': 20.0,
-                    'label': 'Fentanyl Anti-Trafficking Tariff - China (20%)',
-                    'note': 'Anti-trafficking measure',
-                    'effective': '2025-03-04',
-                    'expires': None
-                })
-
-    # Add IEEPA tariffs if enabled
+    # Add reciprocal, fentanyl and IEEPA tariff information if enabled
     if inject_extra_tariffs and not entry.get('is_chapter_99'):
-        if 'ieepa_tariffs' not in entry:
-            entry['ieepa_tariffs'] = []
+        entry['reciprocal_tariffs'] = build_reciprocal_tariffs(hts_code, steel, aluminum)
+        entry['ieepa_tariffs'] = build_ieepa_tariffs(
+            steel, aluminum, solar, 'energy' in categories, 'potash' in categories
+        )
 
-        if not is_steel_product(hts_code) and not is_aluminum_product(hts_code) and not is_solar_product(hts_code):
-            if is_energy_product(hts_code) or is_potash_product(hts_code):
-                rate = 10.0
-                label = 'IEEPA Tariff - Canada (10% - Energy/Potash)'
-            else:
-                rate = 25.0
-                label = 'IEEPA Tariff - Canada (25%)'
-
-            entry['ieepa_tariffs'].append({
-                'country': 'CA',
-                'rate': rate,
-                'label': label,
-                'note': 'USMCA-origin goods exempt; Does not stack with Section 232',
-                'effective': '2025-03-04',
-                'legal_status': 'Under judicial review, currently in effect'
-            })
-
-        if not is_steel_product(hts_code) and not is_aluminum_product(hts_code) and not is_solar_product(hts_code):
-            if is_potash_product(hts_code):
-                rate = 10.0
-                label = 'IEEPA Tariff - Mexico (10% - Potash)'
-            else:
-                rate = 25.0
-                label = 'IEEPA Tariff - Mexico (25%)'
-
-            entry['ieepa_tariffs'].append({
-                'country': 'MX',
-                'rate': rate,
-                'label': label,
-                'note': 'USMCA-origin goods exempt; Does not stack with Section 232',
-                'effective': '2025-03-04',
-                'legal_status': 'Under judicial review, currently in effect'
-            })
+    return entry
 
+def iter_tariff_entries(input_file: str, stats: Dict[str, Any], inject_extra_tariffs: bool,
+                        section_301_only: bool, workers: int = 1,
+                        engine: str = 'row',
+                        incremental_cache: Optional[str] = None,
+                        segment_writer: Optional[SegmentWriter] = None) -> Iterator[Dict[str, Any]]:
+    """Yield processed entries in input order, counting every row read"""
+    if incremental_cache:
+        yield from iter_tariff_entries_incremental(input_file, stats, inject_extra_tariffs,
+                                                   section_301_only, incremental_cache, workers,
+                                                   segment_writer)
+        return
+    if engine == 'columnar':
+        yield from iter_tariff_entries_columnar(input_file, stats, inject_extra_tariffs,
+                                                section_301_only)
+        return
+    if workers > 1:
+        yield from iter_tariff_entries_parallel(input_file, stats, inject_extra_tariffs,
+                                                section_301_only, workers)
+        return
+
+    with open(input_file, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        schema = compile_row_schema(next(reader, []))
+
+        for values in reader:
+            if not values:
+                continue  # Blank line, skipped by csv.DictReader as well
+            stats['total_processed'] += 1
+            entry = process_tariff_values(values, schema, inject_extra_tariffs, section_301_only)
+            if entry is None:
+                continue  # Skip entries based on filtering criteria
+            yield entry
+
+# Rows per worker task are sized so each worker gets several chunks, which
+# keeps the pool busy when some chapters are more expensive than others
+CHUNKS_PER_WORKER = 4
+READ_BLOCK_SIZE = 1 << 20
+
+def read_csv_header(input_file: str) -> tuple:
+    """Return (fieldnames, byte offset of the first data row)"""
+    with open(input_file, 'rb') as f:
+        header_line = f.readline()
+        header_end = f.tell()
+    fieldnames = next(csv.reader([header_line.decode('utf-8-sig')]))
+    return fieldnames, header_end
+
+def split_csv_byte_ranges(input_file: str, start: int, parts: int) -> List[tuple]:
+    """Split the data rows of a CSV file into byte ranges that end on row boundaries.
+
+    A newline only ends a row when it is outside a quoted field. Quotes inside
+    fields are doubled in CSV, so the parity of the quote count since `start`
+    tells whether a newline is inside quotes.
+    """
+    size = os.path.getsize(input_file)
+    if size <= start or parts <= 1:
+        return [(start, size)] if size > start else []
+
+    step = (size - start) // parts
+    targets = [start + step * i for i in range(1, parts)]
+    boundaries = [start]
+    in_quotes = False
+    pos = start
+
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        while targets:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            search_from = 0
+            while targets:
+                newline = block.find(b'\n', max(search_from, targets[0] - pos))
+                if newline < 0:
+                    break
+                quoted = in_quotes ^ (block.count(b'"', 0, newline) % 2 == 1)
+                search_from = newline + 1
+                if quoted:
+                    continue
+                boundary = pos + newline + 1
+                if boundary > boundaries[-1]:
+                    boundaries.append(boundary)
+                while targets and targets[0] < boundary:
+                    targets.pop(0)
+            in_quotes ^= block.count(b'"') % 2 == 1
+            pos += len(block)
+
+    boundaries.append(size)
+    return [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)
+            if boundaries[i] < boundaries[i + 1]]
+
+def _init_worker(section_301_data: Dict, section_201_data: Dict, rule_index: HtsRuleIndex):
+    """Preload the Section 301/201 lookup tables and rule index in a pool worker"""
+    global SECTION_301_DATA, SECTION_201_DATA, RULE_INDEX
+    SECTION_301_DATA = section_301_data
+    SECTION_201_DATA = section_201_data
+    RULE_INDEX = rule_index
+
+def _process_byte_range(task: tuple) -> tuple:
+    """Parse and process one byte range of the input CSV in a pool worker"""
+    input_file, start, end, fieldnames, inject_extra_tariffs, section_301_only = task
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+
+    schema = compile_row_schema(fieldnames)
+    rows_read = 0
+    entries = []
+    for values in csv.reader(io.StringIO(text, newline='')):
+        if not values:
+            continue
+        rows_read += 1
+        entry = process_tariff_values(values, schema, inject_extra_tariffs, section_301_only)
+        if entry is not None:
+            entries.append(entry)
+    return rows_read, entries
+
+def iter_tariff_entries_parallel(input_file: str, stats: Dict[str, Any], inject_extra_tariffs: bool,
+                                 section_301_only: bool, workers: int) -> Iterator[Dict[str, Any]]:
+    """Process the input CSV across a process pool, yielding entries in input order.
+
+    Each worker reads and parses its own byte range of the file, so the parent
+    never parses rows. Results are merged back in chunk order, so the output
+    is identical to a serial run.
+    """
+    fieldnames, data_start = read_csv_header(input_file)
+    ranges = split_csv_byte_ranges(input_file, data_start, workers * CHUNKS_PER_WORKER)
+    tasks = [(input_file, start, end, fieldnames, inject_extra_tariffs, section_301_only)
+             for start, end in ranges]
+    print(f"Processing {len(tasks)} chunks across {workers} workers...")
+
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(SECTION_301_DATA, SECTION_201_DATA, RULE_INDEX)) as pool:
+        for rows_read, entries in pool.imap(_process_byte_range, tasks):
+            stats['total_processed'] += rows_read
+            yield from entries
+
+# Bump when the cached partition format changes
+INCREMENTAL_FORMAT = 2
+# Source files whose code determines the processed entries: this script and
+# every module of this directory it imports, directly or through another one
+INCREMENTAL_SOURCES = ['preprocess_tariff_data_new.py', 'hts_keys.py', 'hts_rule_index.py',
+                       'normalized_output.py', 'overlay_store.py', 'pipeline_metrics.py',
+                       'segment_writer.py', 'trade_rules.py']
+
+def _partition_label(values: List[str], schema: RowSchema) -> str:
+    """3-digit HTS prefix a row is cached under (the segment prefix)"""
+    value = values[schema.hts_index] if schema.hts_index < len(values) else None
+    return clean_hts_code(str(value))[:3]
+
+def _build_salt(fieldnames: List[str], inject_extra_tariffs: bool, section_301_only: bool) -> bytes:
+    """Hash of everything that applies to every partition alike"""
+    hasher = hashlib.sha256(f'{INCREMENTAL_FORMAT}|{inject_extra_tariffs}|{section_301_only}|'.encode())
+    hasher.update('\x1f'.join(fieldnames).encode('utf-8'))
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in INCREMENTAL_SOURCES:
+        with open(os.path.join(script_dir, name), 'rb') as f:
+            hasher.update(f.read())
+    return hasher.digest()
+
+def hash_csv_partitions(input_file: str, schema: RowSchema, salt: bytes) -> tuple:
+    """Hash the rows of each partition together with the overlay data that applies to them.
+
+    Returns (partition label of every non-blank row in input order,
+    {label: hex digest}). A row contributes its raw values, its Section
+    301/201 records and its product categories, so an overlay change only
+    invalidates the partitions holding the codes it touches.
+    """
+    labels = []
+    hashers = {}
+    with open(input_file, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for values in reader:
+            if not values:
+                continue
+            label = _partition_label(values, schema)
+            labels.append(label)
+            hasher = hashers.get(label)
+            if hasher is None:
+                hasher = hashers[label] = hashlib.sha256(salt)
+            hts_code = clean_hts_code(str(values[schema.hts_index] if schema.hts_index < len(values) else None))
+            key = legacy_key(hts_code)
+            overlay = (SECTION_301_DATA.get(key), SECTION_201_DATA.get(key),
+                       sorted(RULE_INDEX.categories(hts_code)))
+            hasher.update('\x1f'.join(values).encode('utf-8'))
+            hasher.update(repr(overlay).encode('utf-8'))
+            hasher.update(b'\x1e')
+    return labels, {label: hasher.hexdigest() for label, hasher in hashers.items()}
+
+class CachedEntry(dict):
+    """An entry restored from the incremental cache.
+
+    Holds only the fields tally_entry() reads; `encoded` is the entry as
+    StreamingTariffWriter writes it. json.loads(encoded) gives the full entry.
+    """
+    __slots__ = ('encoded',)
+
+def _cache_entry(entry: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    """Compact cache form of a processed entry: (encoded JSON, tally fields)"""
+    if entry is None:
+        return None
+    return (dump_nested(entry, 2), entry.get('is_chapter_99'), entry.get('is_special_provision'),
+            bool(entry.get('reciprocal_tariffs')),
+            tuple(duty['type'] for duty in entry.get('additive_duties') or ()),
+            entry.get('section_301_list'))
+
+def _restore_entry(cached: tuple) -> CachedEntry:
+    encoded, chapter_99, special, reciprocal, duty_types, list_num = cached
+    entry = CachedEntry(is_chapter_99=chapter_99, is_special_provision=special,
+                        reciprocal_tariffs=reciprocal,
+                        additive_duties=[{'type': duty_type} for duty_type in duty_types])
+    if list_num is not None:
+        entry['section_301_list'] = list_num
+    entry.encoded = encoded
     return entry
 
+def _partition_segment(entries: List[Dict[str, Any]]) -> str:
+    """Segment file of a partition's entries; '' when they belong to no segment"""
+    prefix = segment_prefix(entries[0]) if entries else None
+    return encode_segment(prefix, entries) if prefix else ''
+
+def _process_rows(task: tuple) -> tuple:
+    """Process a partition's rows in a pool worker.
+
+    Returns the cache form of each row's entry and, if asked for, the
+    partition's encoded segment file (None otherwise).
+    """
+    rows, fieldnames, inject_extra_tariffs, section_301_only, encode_segments = task
+    schema = compile_row_schema(fieldnames)
+    entries = [process_tariff_values(values, schema, inject_extra_tariffs, section_301_only)
+               for values in rows]
+    segment = _partition_segment([entry for entry in entries if entry is not None]) if encode_segments else None
+    return [_cache_entry(entry) for entry in entries], segment
+
+def iter_tariff_entries_incremental(input_file: str, stats: Dict[str, Any], inject_extra_tariffs: bool,
+                                    section_301_only: bool, cache_dir: str, workers: int = 1,
+                                    segment_writer: Optional[SegmentWriter] = None) -> Iterator[Dict[str, Any]]:
+    """Yield entries in input order, reprocessing only partitions whose hash changed.
+
+    Rows are partitioned by 3-digit HTS prefix. Each partition's results (one
+    per row, None for skipped rows) are cached in `cache_dir` under the
+    partition hash (one subdirectory per processing mode), so unchanged
+    partitions are read back instead of processed. Entries are yielded as
+    CachedEntry objects carrying their encoded JSON, so unchanged partitions
+    are neither processed nor re-encoded when written with
+    StreamingTariffWriter. The output is identical to a full run.
+
+    With a segment_writer each partition also caches its encoded segment
+    file (the partition label is the segment prefix), and the segments are
+    handed to the writer instead of being rebuilt from the entries.
+    """
+    fieldnames, _ = read_csv_header(input_file)
+    schema = compile_row_schema(fieldnames)
+    salt = _build_salt(fieldnames, inject_extra_tariffs, section_301_only)
+    # Each processing mode keeps its own partitions, so alternating modes reuse them
+    mode = ('section_301_only' if section_301_only else 'all') + ('_injected' if inject_extra_tariffs else '')
+    cache_dir = os.path.join(cache_dir, mode)
+    labels, hashes = hash_csv_partitions(input_file, schema, salt)
+
+    def cache_path(digest: str) -> str:
+        return os.path.join(cache_dir, f'part-{digest}.pickle')
+
+    def save(label: str):
+        temp_path = f'{cache_path(hashes[label])}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump((results[label], segments[label]), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path(hashes[label]))
+
+    # Cache form of each row's entry, and the encoded segment (None if not encoded yet)
+    results: Dict[str, List[Optional[tuple]]] = {}
+    segments: Dict[str, Optional[str]] = {}
+    for label, digest in hashes.items():
+        if os.path.exists(cache_path(digest)):
+            with open(cache_path(digest), 'rb') as f:
+                results[label], segments[label] = pickle.load(f)
+
+    changed = sorted(label for label in hashes if label not in results)
+    print(f"Incremental build: {len(hashes) - len(changed)}/{len(hashes)} partitions unchanged, "
+          f"{len(changed)} to process")
+    if changed:
+        print(f"  - Processing: {', '.join(changed[:20])}{' ...' if len(changed) > 20 else ''}")
+
+        # Second pass over the file collects only the rows of changed partitions
+        wanted = set(changed)
+        rows: Dict[str, List[List[str]]] = {label: [] for label in changed}
+        with open(input_file, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for values in reader:
+                if values:
+                    label = _partition_label(values, schema)
+                    if label in wanted:
+                        rows[label].append(values)
+
+        tasks = [(rows[label], fieldnames, inject_extra_tariffs, section_301_only, segment_writer is not None)
+                 for label in changed]
+        if workers > 1 and len(tasks) > 1:
+            with multiprocessing.Pool(workers, initializer=_init_worker,
+                                      initargs=(SECTION_301_DATA, SECTION_201_DATA, RULE_INDEX)) as pool:
+                processed = pool.map(_process_rows, tasks)
+        else:
+            processed = [_process_rows(task) for task in tasks]
+
+        os.makedirs(cache_dir, exist_ok=True)
+        for label, (partition_results, segment) in zip(changed, processed):
+            results[label], segments[label] = partition_results, segment
+            save(label)
+
+    if segment_writer is not None:
+        # Partitions cached by a run without segments encode theirs once
+        for label in [label for label, segment in segments.items() if segment is None]:
+            segments[label] = _partition_segment([json.loads(cached[0]) for cached in results[label]
+                                                  if cached is not None])
+            save(label)
+
+    if hashes:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'format': INCREMENTAL_FORMAT, 'input_file': os.path.basename(input_file),
+                       'partitions': hashes}, f, indent=2, sort_keys=True)
+        current = {cache_path(digest) for digest in hashes.values()}
+        for stale in glob.glob(os.path.join(cache_dir, 'part-*.pickle')):
+            if stale not in current:
+                os.remove(stale)
+
+    # Interleave the partition results back into input order
+    positions = {label: 0 for label in results}
+    announced = set()
+    for label in labels:
+        stats['total_processed'] += 1
+        cached = results[label][positions[label]]
+        positions[label] += 1
+        if cached is not None:
+            if segment_writer is not None and label not in announced:
+                # At the partition's first entry, so the index lists segments as a full run does
+                announced.add(label)
+                segment_writer.add_encoded(label if segments[label] else None, segments[label] or None,
+                                           sum(1 for result in results[label] if result is not None))
+            yield _restore_entry(cached)
+
+# Rows per columnar batch: enough for the column operations to pay off, few
+# enough that a batch's columns stay in cache and memory does not grow with the input
+COLUMNAR_BATCH_ROWS = 4096
+
+def _numeric_column(column: tuple) -> tuple:
+    """Parse a column of CSV cells into (is_numeric mask, float64 values).
+
+    A cell is numeric when float() accepts it, as in the row engine; float()
+    runs once per distinct cell value rather than once per cell.
+    """
+    numeric, values = {}, {}
+    for text in set(column):
+        try:
+            values[text] = float(text)
+            numeric[text] = True
+        except (ValueError, TypeError):
+            values[text] = np.nan
+            numeric[text] = False
+    return (np.fromiter(map(numeric.__getitem__, column), dtype=bool, count=len(column)),
+            np.fromiter(map(values.__getitem__, column), dtype=np.float64, count=len(column)))
+
+def _present(column: tuple) -> np.ndarray:
+    """Mask of non-empty cells (neither '' nor missing)"""
+    return np.fromiter(map(bool, column), dtype=bool, count=len(column))
+
+def iter_tariff_entries_columnar(input_file: str, stats: Dict[str, Any], inject_extra_tariffs: bool,
+                                 section_301_only: bool) -> Iterator[Dict[str, Any]]:
+    """Columnar engine: compute every per-row decision as vectorized masks.
+
+    Rows are read with csv.reader in batches of COLUMNAR_BATCH_ROWS and each
+    batch is processed column by column (_columnar_batch), so memory stays
+    flat however large the input is. Blank lines are skipped and every other
+    row is counted, as in the row engine.
+    """
+    section_301_keys = np.fromiter(SECTION_301_DATA, dtype=np.int64, count=len(SECTION_301_DATA))
+    with open(input_file, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        schema = compile_row_schema(next(reader, []))
+        while True:
+            batch = list(islice(reader, COLUMNAR_BATCH_ROWS))
+            if not batch:
+                return
+            batch = [values for values in batch if values]
+            stats['total_processed'] += len(batch)
+            if batch and schema.hts_index is not None:
+                yield from _columnar_batch(batch, schema, inject_extra_tariffs, section_301_only,
+                                           section_301_keys)
+
+def _columnar_batch(batch: List[List[str]], schema: RowSchema, inject_extra_tariffs: bool,
+                    section_301_only: bool, section_301_keys: np.ndarray) -> Iterator[Dict[str, Any]]:
+    """Process one batch of csv.reader rows column by column.
+
+    Parsing, rate filtering, special-provision detection, program availability
+    and product classification are computed once per column. Entry dicts are
+    only assembled when they are yielded, in the same key order as
+    process_tariff_values, so both engines produce identical JSON.
+    """
+    width = schema.width
+    # Short rows read as None for the missing columns, as in process_tariff_values
+    rows = [values if len(values) >= width else values + [None] * (width - len(values))
+            for values in batch]
+
+    # HTS codes (clean_hts_code), their lookup keys (legacy_key) and the rows that are kept
+    hts = [clean_hts_code(str(values[schema.hts_index])) for values in rows]
+    keys = legacy_keys_batch(hts)
+    has_301 = np.isin(keys, section_301_keys)
+    keep = np.fromiter(map(bool, hts), dtype=bool, count=len(hts))
+    if section_301_only:
+        keep &= has_301
+    kept = np.flatnonzero(keep).tolist()
+    if not kept:
+        return
+    row_count = len(kept)
+    if row_count < len(rows):
+        rows = [rows[i] for i in kept]
+        hts = [hts[i] for i in kept]
+        keys = keys[kept]
+        has_301 = has_301[kept]
+    columns = list(zip(*rows))
+
+    def column_at(position: Optional[int], default: Optional[str]) -> tuple:
+        if position is None:
+            return (default,) * row_count
+        return columns[position]
+
+    # Product classification masks from one batch walk of the rule index
+    categories = RULE_INDEX.categories_sorted(hts)
+    is_ch99, steel, aluminum, solar, energy, potash = (
+        [category in found for found in categories]
+        for category in ('chapter_99', 'steel', 'aluminum', 'solar', 'energy', 'potash'))
+
+    # MFN rate and Chapter 99 special provisions
+    mfn_raw = column_at(schema.mfn_ad_val_index, '0')
+    mfn_present = _present(mfn_raw)
+    mfn_numeric, mfn_value = _numeric_column(mfn_raw)
+    sentinel = np.fromiter((text == '9999.999999' for text in mfn_raw), dtype=bool, count=row_count)
+    special = (sentinel | (mfn_present & mfn_numeric & (mfn_value > 100))).tolist()
+    # A present MFN value that is not a number stops the row engine with
+    # float()'s ValueError at that row; stop at the same row
+    invalid = np.flatnonzero(mfn_present & ~mfn_numeric & ~sentinel)
+    stop = int(invalid[0]) if len(invalid) else row_count
+
+    # Other rate fields: numeric values below the 1000 sentinel
+    rate_columns = []
+    for field, position in schema.rate_fields:
+        numeric, value = _numeric_column(columns[position])
+        rate_columns.append((field, (numeric & (value < 1000)).tolist(), value.tolist()))
+
+    col2_numeric, col2_value = _numeric_column(column_at(schema.col2_ad_val_index, '0'))
+    col2_positive = (col2_numeric & (col2_value > 0)).tolist()
+    col2_value = col2_value.tolist()
+
+    # Copied text fields: present when non-empty
+    standard_columns = [(field, columns[position], list(map(bool, columns[position])))
+                        for field, position in schema.standard_fields]
+
+    # Trade programs: indicator present, ad valorem rate numeric and below 1000
+    program_columns = []
+    for (program_key, program_name, indicator_field, indicator_index,
+         ad_val_field, ad_val_index, other_fields) in schema.programs:
+        indicators = column_at(indicator_index, None)
+        has_indicator = _present(indicators)
+        if ad_val_index is not None:
+            numeric, value = _numeric_column(columns[ad_val_index])
+            available = (has_indicator & numeric & (value < 1000)).tolist()
+            value = value.tolist()
+        else:
+            value = available = [False] * row_count
+        others = [(field, columns[position], list(map(bool, columns[position])))
+                  for field, position in other_fields]
+        program_columns.append((program_key, program_name, indicator_field, indicators,
+                                has_indicator.tolist(), ad_val_field, value, available, others))
+
+    descriptions = column_at(schema.description_index, '')
+    mfn_text = column_at(schema.mfn_text_index, '')
+    mfn_value = mfn_value.tolist()
+    keys = keys.tolist()
+    has_301 = has_301.tolist()
+
+    for i in range(stop):
+        hts_code = hts[i]
+        entry = {
+            'hts8': hts_code,
+            'brief_description': descriptions[i],
+            'is_chapter_99': is_ch99[i],
+        }
+        section_301_info = SECTION_301_DATA[keys[i]] if has_301[i] else None
+        if section_301_info is not None:
+            entry['section_301_list'] = section_301_info['list']
+            entry['section_301_rate'] = section_301_info['rate']
+
+        for field, column, present in standard_columns:
+            if present[i]:
+                entry[field] = column[i]
+
+        if special[i]:
+            entry['is_special_provision'] = True
+            entry['mfn_ad_val_rate'] = 0
+            # Additional duty text is only parsed for the special provisions
+            additional_rate = parse_additional_duty_text(mfn_text[i])
+            if additional_rate:
+                entry['chapter_99_additional_rate'] = additional_rate
+                entry['chapter_99_duty_text'] = mfn_text[i]
+                if '99030110' in hts_code:
+                    entry['chapter_99_type'] = 'Canada Special'
+                elif '990385' in hts_code:
+                    entry['chapter_99_type'] = 'Aluminum/Steel'
+        else:
+            entry['mfn_ad_val_rate'] = mfn_value[i] if mfn_raw[i] else 0
+            entry['is_special_provision'] = False
+
+        for field, present, values in rate_columns:
+            if present[i]:
+                entry[field] = values[i]
+
+        if col2_positive[i]:
+            entry['col2_ad_val_rate'] = col2_value[i]
+            entry['ntr_suspended_countries'] = ['RU', 'BY']
+
+        available_programs = entry['available_programs'] = []
+        for (program_key, program_name, indicator_field, indicators, has_indicator,
+             ad_val_field, values, available, others) in program_columns:
+            if has_indicator[i]:
+                entry[indicator_field] = indicators[i]
+                if available[i]:
+                    entry[ad_val_field] = values[i]
+                    available_programs.append({
+                        'program_key': program_key,
+                        'program_name': program_name,
+                        'rate': values[i]
+                    })
+            for field, column, present in others:
+                if present[i]:
+                    entry[field] = column[i]
+
+        additive_duties_info = build_additive_duties(
+            steel[i], aluminum[i], solar[i], section_301_info, SECTION_201_DATA.get(keys[i])
+        )
+        if additive_duties_info:
+            entry['additive_duties'] = additive_duties_info
+
+        if inject_extra_tariffs and not is_ch99[i]:
+            entry['reciprocal_tariffs'] = build_reciprocal_tariffs(hts_code, steel[i], aluminum[i])
+            entry['ieepa_tariffs'] = build_ieepa_tariffs(
+                steel[i], aluminum[i], solar[i], energy[i], potash[i]
+            )
+
+        yield entry
+
+    if stop < row_count:
+        float(mfn_raw[stop])
+
+def new_run_stats() -> Dict[str, Any]:
+    """Create the running counters reported in the output metadata"""
+    return {
+        'total_processed': 0,
+        'total_entries': 0,
+        'chapter_99_count': 0,
+        'special_provision_count': 0,
+        'reciprocal_tariff_count': 0,
+        'section_301_count': 0,
+        'section_232_count': 0,
+        'section_201_count': 0,
+        'list_counts': {},
+    }
+
+def tally_entry(stats: Dict[str, Any], entry: Dict[str, Any]):
+    """Add a processed entry to the running counters"""
+    stats['total_entries'] += 1
+    if entry.get('is_chapter_99'):
+        stats['chapter_99_count'] += 1
+    if entry.get('is_special_provision'):
+        stats['special_provision_count'] += 1
+    if entry.get('reciprocal_tariffs'):
+        stats['reciprocal_tariff_count'] += 1
+    if entry.get('additive_duties'):
+        for duty in entry['additive_duties']:
+            if duty['type'] == 'section_301':
+                stats['section_301_count'] += 1
+            elif duty['type'] == 'section_232':
+                stats['section_232_count'] += 1
+            elif duty['type'] == 'section_201':
+                stats['section_201_count'] += 1
+
+    # Count by Section 301 list
+    if 'section_301_list' in entry:
+        list_num = entry.get('section_301_list', 'Unknown')
+        list_counts = stats['list_counts']
+        list_counts[list_num] = list_counts.get(list_num, 0) + 1
+
+def print_run_summary(stats: Dict[str, Any], section_301_only: bool):
+    """Print the processing summary for a finished run"""
+    print(f"\nProcessed {stats['total_processed']} total tariff entries")
+    if section_301_only:
+        print(f"Found {stats['total_entries']} entries with Section 301 duties")
+    else:
+        print(f"Included {stats['total_entries']} total entries")
+    print(f"  - Chapter 99 codes: {stats['chapter_99_count']}")
+    print(f"  - Special provisions: {stats['special_provision_count']}")
+    print(f"  - With reciprocal tariffs: {stats['reciprocal_tariff_count']}")
+    print(f"  - With Section 301 duties: {stats['section_301_count']}")
+    print(f"  - With Section 232 duties: {stats['section_232_count']}")
+    print(f"  - With Section 201 duties: {stats['section_201_count']}")
+
+    list_counts = stats['list_counts']
+    if list_counts:
+        print("\nSection 301 breakdown by list:")
+        for list_num in sorted(list_counts.keys()):
+            rate = "25%" if list_num in ['1', '2', '3'] else "7.5%" if list_num == '4a' else "Unknown"
+            print(f"  - List {list_num}: {list_counts[list_num]} entries ({rate} tariff)")
+
+def build_metadata(stats: Dict[str, Any], section_301_only: bool, hts_revision: str) -> Dict[str, Any]:
+    """Build the output metadata block from the running counters"""
+    return {
+        'total_entries': stats['total_entries'],
+        'chapter_99_entries': stats['chapter_99_count'],
+        'special_provisions': stats['special_provision_count'],
+        'reciprocal_tariff_entries': stats['reciprocal_tariff_count'],
+        'section_301_entries': stats['section_301_count'],
+        'section_232_entries': stats['section_232_count'],
+        'section_201_entries': stats['section_201_count'],
+        'section_301_only': section_301_only,  # Whether this file contains only Section 301 affected items
+        'section_301_breakdown': stats['list_counts'],
+        'preprocessing_version': '3.0',
+        'hts_revision': hts_revision,
+        'processing_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'additive_duties_info': ADDITIVE_DUTIES
+    }
+
+class StreamingTariffWriter:
+    """Write the output JSON one tariff entry at a time.
+
+    The bytes written are identical to json.dump(output_data, indent=2) on the
+    fully built structure, but only one entry is held in memory at a time.
+    Keys in `header` are written before the tariffs list, keys passed to
+    close() after it.
+    """
+
+    def __init__(self, f, header: Dict[str, Any]):
+        self.f = f
+        self.count = 0
+        f.write('{')
+        for key, value in header.items():
+            f.write(f'\n  {json.dumps(key)}: {dump_nested(value, 1)},')
+        f.write('\n  "tariffs": [')
+
+    def write_entry(self, entry: Dict[str, Any]):
+        self.f.write(',\n    ' if self.count else '\n    ')
+        if isinstance(entry, CachedEntry):
+            self.f.write(entry.encoded)
+        else:
+            self.f.write(dump_nested(entry, 2))
+        self.count += 1
+
+    def close(self, trailer: Dict[str, Any]):
+        self.f.write('\n  ]' if self.count else ']')
+        for key, value in trailer.items():
+            self.f.write(f',\n  {json.dumps(key)}: {dump_nested(value, 1)}')
+        self.f.write('\n}')
+
 def main():
     """Main processing function"""
+    global SECTION_301_DATA, SECTION_201_DATA
 
     parser = argparse.ArgumentParser(
         description="Preprocess tariff data with Section 301 integration.",
@@ -658,7 +1354,77 @@ def main():
         action='store_true',
         help="Filter to ONLY HTS codes that have Section 301 duties."
     )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help="Write each entry as soon as it is processed instead of building the\n"
+             "whole output in memory. Output is identical; peak memory stays flat."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        metavar='N',
+        help="Process rows across N worker processes. Output is identical to a\n"
+             "serial run. Default: 1 (serial)."
+    )
+    parser.add_argument(
+        '--engine',
+        choices=['row', 'columnar'],
+        default='row',
+        help="Processing backend. 'row' (default) processes one CSV row at a time;\n"
+             "'columnar' reads batches of rows and computes rate parsing, filtering\n"
+             "and program availability per column. Both produce identical output;\n"
+             "the columnar engine is not faster (see TARIFF_PROCESSING_README.md)."
+    )
+    parser.add_argument(
+        '--rules',
+        metavar='RULES_CSV',
+        help="Evaluate a trade rules file (e.g. ../config/trade_rules.csv) and attach\n"
+             "the matching duties to each entry as 'rule_duties', dropping the\n"
+             "additive duties they replace."
+    )
+    parser.add_argument(
+        '--incremental-cache',
+        metavar='DIR',
+        help="Cache processed entries per 3-digit HTS prefix in DIR, keyed by a hash of\n"
+             "the prefix's input rows and the overlay data that applies to them. Later\n"
+             "runs only reprocess prefixes whose hash changed. Output is identical.\n"
+             "With --segments-dir each prefix's encoded segment is cached as well.\n"
+             "Changed prefixes are processed row by row (--engine is ignored)."
+    )
+    parser.add_argument(
+        '--segments-dir',
+        metavar='DIR',
+        help="Also write the segment files (tariff-XXX.json per 3-digit prefix) and\n"
+             "segment-index.json to DIR, as segment-tariff-data.js does. Segments are\n"
+             "encoded in a worker pool while rows are processed; unchanged files are\n"
+             "not rewritten and segments that no longer exist are removed."
+    )
+    parser.add_argument(
+        '--segment-workers',
+        type=int,
+        default=None,
+        metavar='N',
+        help="Processes used to encode segments. Default: one per CPU."
+    )
+    parser.add_argument(
+        '--normalized',
+        action='store_true',
+        help="Write the normalized output: repeated sub-objects (available_programs,\n"
+             "additive_duties, reciprocal/IEEPA tariffs) are stored once in per-file\n"
+             "tables and referenced by index, and default-valued fields are left out.\n"
+             "normalized_output.py expands it back to the usual shape."
+    )
+    parser.add_argument(
+        '--no-overlay-cache',
+        action='store_true',
+        help="Parse the Section 301/201/232 and trade remedy CSVs instead of loading\n"
+             "their snapshots from .overlay_cache/."
+    )
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    metrics = metrics_from_args('preprocess', args)
 
     input_file = args.input_csv
     section301_file = args.section301_csv
@@ -679,111 +1445,126 @@ def main():
     else:
         print("Injecting extra tariffs is DISABLED.")
 
-    # Load Section 301 data first
-    if not load_section_301_data(section301_file):
+    # Load Section 301 (required), Section 201 solar, Section 232 headings and
+    # active trade remedies; section201/232 are looked up next to the 301 file
+    try:
+        with metrics.stage('load_overlays'):
+            overlays = load_overlay_store(section301_file,
+                                          cache_dir=None if args.no_overlay_cache else DEFAULT_CACHE_DIR)
+    except Exception as e:
+        print(f"Error loading Section 301 data: {e}")
         print("Failed to load Section 301 data. Exiting.")
         sys.exit(1)
-    
-    # Load Section 201 data (optional - won't fail if file doesn't exist)
-    # Look for section201_solar.csv in the exports directory
-    section201_file = os.path.join(os.path.dirname(section301_file), 'section201_solar.csv')
-    load_section_201_data(section201_file)
-
-    entries = []
-    chapter_99_count = 0
-    special_provision_count = 0
-    reciprocal_tariff_count = 0
-    section_301_count = 0
-    section_232_count = 0
-    section_201_count = 0
-    total_processed = 0
-
-    # Read CSV file
-    with open(input_file, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-
-        for row in reader:
-            total_processed += 1
-            entry = process_tariff_entry(row, inject_extra_tariffs, section_301_only)
-            if entry is None:
-                continue  # Skip entries based on filtering criteria
+    overlays.report()
+    if 'section_201' not in overlays.sources:
+        print("Section 201 CSV not found next to the Section 301 file, skipping...")
+    SECTION_301_DATA = overlays.section_301
+    SECTION_201_DATA = overlays.section_201
+
+    # Section 232 headings and active trade remedies join the prefix rule index
+    overlays.add_rules(RULE_INDEX)
+
+    # Compile the header once and report its layout before any rows are read
+    fieldnames, _ = read_csv_header(input_file)
+    schema = compile_row_schema(fieldnames)
+    schema.report()
+    if schema.hts_index is None:
+        print(f"No HTS code column found (looked for {', '.join(HTS_FIELD_CANDIDATES)}). Exiting.")
+        sys.exit(1)
 
-            entries.append(entry)
+    rule_table = None
+    if args.rules:
+        rule_table = load_rule_table(args.rules, PRODUCT_PREFIXES)
+        print(f"Loaded {len(rule_table.rules)} trade rules in effect from {args.rules}")
 
-            if entry.get('is_chapter_99'):
-                chapter_99_count += 1
-            if entry.get('is_special_provision'):
-                special_provision_count += 1
-            if entry.get('reciprocal_tariffs'):
-                reciprocal_tariff_count += 1
-            if entry.get('additive_duties'):
-                for duty in entry['additive_duties']:
-                    if duty['type'] == 'section_301':
-                        section_301_count += 1
-                    elif duty['type'] == 'section_232':
-                        section_232_count += 1
-                    elif duty['type'] == 'section_201':
-                        section_201_count += 1
-
-    print(f"\nProcessed {total_processed} total tariff entries")
-    if section_301_only:
-        print(f"Found {len(entries)} entries with Section 301 duties")
-    else:
-        print(f"Included {len(entries)} total entries")
-    print(f"  - Chapter 99 codes: {chapter_99_count}")
-    print(f"  - Special provisions: {special_provision_count}")
-    print(f"  - With reciprocal tariffs: {reciprocal_tariff_count}")
-    print(f"  - With Section 301 duties: {section_301_count}")
-    print(f"  - With Section 232 duties: {section_232_count}")
-    print(f"  - With Section 201 duties: {section_201_count}")
-
-    # Count by Section 301 list
-    list_counts = {}
-    for entry in entries:
-        if 'section_301_list' in entry:
-            list_num = entry.get('section_301_list', 'Unknown')
-            list_counts[list_num] = list_counts.get(list_num, 0) + 1
-    
-    if list_counts:
-        print("\nSection 301 breakdown by list:")
-        for list_num in sorted(list_counts.keys()):
-            rate = "25%" if list_num in ['1', '2', '3'] else "7.5%" if list_num == '4a' else "Unknown"
-            print(f"  - List {list_num}: {list_counts[list_num]} entries ({rate} tariff)")
-
-    # Create output structure
-    output_data = {
+    stats = new_run_stats()
+    output_header = {
         'data_last_updated': datetime.now().strftime('%Y-%m-%d'),
         'hts_revision': hts_revision,
-        'tariffs': entries,
-        'metadata': {
-            'total_entries': len(entries),
-            'chapter_99_entries': chapter_99_count,
-            'special_provisions': special_provision_count,
-            'reciprocal_tariff_entries': reciprocal_tariff_count,
-            'section_301_entries': section_301_count,
-            'section_232_entries': section_232_count,
-            'section_201_entries': section_201_count,
-            'section_301_only': section_301_only,  # Whether this file contains only Section 301 affected items
-            'section_301_breakdown': list_counts,
-            'preprocessing_version': '3.0',
-            'hts_revision': hts_revision,
-            'processing_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'additive_duties_info': ADDITIVE_DUTIES
-        },
-        'country_programs': COUNTRY_TO_PROGRAMS
     }
 
-    # Write JSON file
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, indent=2, ensure_ascii=False)
+    segment_writer = SegmentWriter(args.segments_dir, args.segment_workers) if args.segments_dir else None
+    # Rules and normalization need the full entries, not just their cached encoding;
+    # otherwise incremental builds also take the unchanged segments from the cache
+    decode_cached = bool(args.incremental_cache) and bool(rule_table or args.normalized)
+    cached_segments = bool(args.incremental_cache) and not decode_cached
+
+    entries = iter_tariff_entries(input_file, stats, inject_extra_tariffs, section_301_only,
+                                  workers=args.workers, engine=args.engine,
+                                  incremental_cache=args.incremental_cache,
+                                  segment_writer=segment_writer if cached_segments else None)
+    entries = metrics.iterate('process', entries)
+    if decode_cached:
+        entries = (json.loads(entry.encoded) if isinstance(entry, CachedEntry) else entry
+                   for entry in entries)
+    elif args.incremental_cache and not args.stream:
+        print("Incremental builds write cached entries as they are read (--stream).")
+        args.stream = True
+    if rule_table:
+        entries = metrics.iterate('rules', rule_table.apply(entries))
+    if segment_writer and not cached_segments:
+        entries = metrics.iterate('segments', segment_writer.feed(entries))
+
+    if args.stream:
+        print("Streaming entries to the output file as they are processed.")
+        with open(output_file, 'w', encoding='utf-8') as f, metrics.stage('write_output') as stage:
+            writer_class = NormalizedTariffWriter if args.normalized else StreamingTariffWriter
+            writer = writer_class(f, output_header)
+            for entry in entries:
+                tally_entry(stats, entry)
+                writer.write_entry(entry)
+            stage.add_rows(stats['total_entries'])
+            metrics.stages['process'].rows = stats['total_processed']  # Rows read, not entries kept
+
+            print_run_summary(stats, section_301_only)
+            metadata = build_metadata(stats, section_301_only, hts_revision)
+            if rule_table:
+                rule_table.print_report()
+                metadata['rule_engine'] = rule_table.summary()
+            metadata['pipeline_metrics'] = metrics.summary()
+            writer.close({
+                'metadata': metadata,
+                'country_programs': COUNTRY_TO_PROGRAMS
+            })
+    else:
+        tariffs = []
+        with metrics.stage('collect'):
+            for entry in entries:
+                tally_entry(stats, entry)
+                tariffs.append(entry)
+        metrics.stages['process'].rows = stats['total_processed']  # Rows read, not entries kept
+
+        print_run_summary(stats, section_301_only)
+
+        # Create output structure
+        output_data = dict(output_header)
+        output_data['tariffs'] = tariffs
+        output_data['metadata'] = build_metadata(stats, section_301_only, hts_revision)
+        if rule_table:
+            rule_table.print_report()
+            output_data['metadata']['rule_engine'] = rule_table.summary()
+        output_data['metadata']['pipeline_metrics'] = metrics.summary()
+        output_data['country_programs'] = COUNTRY_TO_PROGRAMS
+
+        # Write JSON file
+        with open(output_file, 'w', encoding='utf-8') as f, metrics.stage('write_output', rows=len(tariffs)):
+            if args.normalized:
+                normalize_output(output_data, f)
+            else:
+                json.dump(output_data, f, indent=2, ensure_ascii=False)
 
     print(f"\nOutput written to {output_file}")
+    if segment_writer:
+        with metrics.stage('write_segments'):
+            segment_writer.close(output_header['data_last_updated'], hts_revision)
+        segment_writer.report()
     if section_301_only:
         print("\nIMPORTANT: This output contains ONLY HTS codes that have Section 301 add-ons.")
         print("Use this for HarmonyTi Results and Tariff Intelligence features.")
     else:
         print("\nIMPORTANT: This output contains ALL HTS codes.")
         print("Section 301 rates have been applied where applicable.")
+    metrics.finish(args.metrics)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
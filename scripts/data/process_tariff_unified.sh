@@ -37,6 +37,7 @@ print_info() {
 # Default values
 FILTER_SECTION_301=false
 EXTRACT_SECTION_301=false
+INCREMENTAL=false
 REVISION=""
 EXCEL_INPUT=""
 
@@ -51,6 +52,8 @@ show_usage() {
     echo "  --section-301-only        Process ONLY HTS codes with Section 301 tariffs"
     echo "  --extract-301 <pdf>       Extract Section 301 data from PDF first"
     echo "  --revision <number>       Override HTS revision number"
+    echo "  --incremental             Reuse the CSV if it is newer than the Excel file and only"
+    echo "                            reprocess HTS prefixes whose rows or overlays changed"
     echo "  --help                    Show this help message"
     echo ""
     echo "Examples:"
@@ -90,6 +93,10 @@ while [[ $# -gt 0 ]]; do
             REVISION="$2"
             shift 2
             ;;
+        --incremental)
+            INCREMENTAL=true
+            shift
+            ;;
         --help)
             show_usage
             ;;
@@ -255,16 +262,26 @@ print_status "HTS Revision: $REVISION"
 print_status "CSV output: $CSV_FILE"
 print_status "JSON output: $JSON_FILE"
 
+# Preprocessor options
+PREPROCESS_ARGS=(--inject-extra-tariffs --segments-dir "$SCRIPT_DIR/tariff-segments")
+if [ "$INCREMENTAL" = true ]; then
+    PREPROCESS_ARGS+=(--incremental-cache "$SCRIPT_DIR/.incremental_cache")
+fi
+
 # Step 1: Convert Excel to CSV
-print_info "Converting Excel to CSV..."
-python3 "$SCRIPT_DIR/excel_to_csv.py" "$EXCEL_FILE" "$CSV_FILE"
+if [ "$INCREMENTAL" = true ] && [ "$CSV_FILE" -nt "$EXCEL_FILE" ]; then
+    print_status "CSV is newer than the Excel file, skipping conversion"
+else
+    print_info "Converting Excel to CSV..."
+    python3 "$SCRIPT_DIR/excel_to_csv.py" "$EXCEL_FILE" "$CSV_FILE"
 
-if [ $? -ne 0 ]; then
-    print_error "Failed to convert Excel to CSV"
-    cd "$ORIGINAL_DIR"
-    exit 1
+    if [ $? -ne 0 ]; then
+        print_error "Failed to convert Excel to CSV"
+        cd "$ORIGINAL_DIR"
+        exit 1
+    fi
+    print_status "✓ CSV conversion complete"
 fi
-print_status "✓ CSV conversion complete"
 
 # Step 2: Process tariff data
 if [ "$FILTER_SECTION_301" = true ]; then
@@ -273,7 +290,7 @@ if [ "$FILTER_SECTION_301" = true ]; then
     print_status "Filtering to ONLY HTS codes with Section 301 add-ons..."
     
     python3 "$SCRIPT_DIR/preprocess_tariff_data_new.py" \
-        "$CSV_FILE" "$SECTION_301_CSV" "$JSON_FILE" "$REVISION" --inject-extra-tariffs
+        "$CSV_FILE" "$SECTION_301_CSV" "$JSON_FILE" "$REVISION" "${PREPROCESS_ARGS[@]}"
 else
     print_info "Processing ALL tariff data..."
     
@@ -287,7 +304,7 @@ else
     fi
     
     python3 "$SCRIPT_DIR/preprocess_tariff_data_new.py" \
-        "$CSV_FILE" "$SECTION_301_CSV" "$JSON_FILE" "$REVISION" --inject-extra-tariffs
+        "$CSV_FILE" "$SECTION_301_CSV" "$JSON_FILE" "$REVISION" "${PREPROCESS_ARGS[@]}"
 fi
 
 if [ $? -ne 0 ]; then
@@ -297,25 +314,19 @@ if [ $? -ne 0 ]; then
 fi
 print_status "✓ Tariff data processing complete"
 
-# Step 3: Generate segments
-print_info "Generating segment files..."
-
-# Create segments directory if it doesn't exist
-mkdir -p "$SCRIPT_DIR/tariff-segments"
-
-node "$SCRIPT_DIR/segment-tariff-data.js" "$JSON_FILE"
-
-if [ $? -ne 0 ]; then
-    print_error "Failed to generate segments"
-    cd "$ORIGINAL_DIR"
-    exit 1
-fi
+# Step 3: Segments are written by the preprocessor (--segments-dir) in the
+# same pass; segment-tariff-data.js remains for regenerating them from a JSON file
 print_status "✓ Segment generation complete"
 
 # Count generated files
 SEGMENT_COUNT=$(ls -1 "$SCRIPT_DIR/tariff-segments/tariff-*.json" 2>/dev/null | wc -l)
 print_status "Generated $SEGMENT_COUNT segment files"
 
+# Step 3b: Compressed variants (.gz, plus .zst/.br when available) and package-manifest.json
+print_info "Packaging compressed segment variants..."
+python3 "$SCRIPT_DIR/package_segments.py" "$SCRIPT_DIR/tariff-segments" \
+    || print_warning "Failed to package segment files; uploading uncompressed segments only"
+
 # Step 4: Optional Azure upload
 if command -v az >/dev/null 2>&1; then
     read -p "Upload segment files to Azure? (y/N): " -n 1 -r
@@ -355,6 +366,7 @@ if [ "$FILTER_SECTION_301" = true ]; then
 fi
 print_status "  - JSON: $JSON_FILE"
 print_status "  - Segments: $SCRIPT_DIR/tariff-segments/"
+print_status "  - Package manifest: $SCRIPT_DIR/tariff-segments/package-manifest.json"
 print_status "  - HTS Revision: $REVISION"
 echo ""
 
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Temporal store of Section 301 list membership and rates.
+
+Every code on an extracted Section 301 list (exports/listN_hts_extracted.csv)
+gets one interval per rate period of its list in LIST_SCHEDULE: List 3 was
+10% before it went to 25% on 2019-05-10, and List 4A was 15% before it went
+to 7.5% on 2020-02-14. A code that a later list also covers leaves the earlier
+list the day before the later one takes effect, because the most recent list
+controls (the same rule consolidate_section301.py applies). Product exclusions from
+an optional CSV split the intervals they overlap, and the excluded pieces
+have rate 0.
+
+Intervals are sorted by code and start date, so rate_as_of() is a bisect over
+one code's start dates. rates_as_of() answers any number of (hts, date) pairs
+with one searchsorted over all intervals. Intervals are keyed by hts_key() of
+the exact code on the list (not the overlay's legacy_key(), which maps some
+distinct codes to one key); a 10-digit code with no history of its own is
+looked up by its 8-digit tariff line.
+
+Exclusions CSV columns:
+  HTS_Code    Excluded code
+  Exclusion   Exclusion name or notice (e.g. 84 FR 25895)
+  Effective   First day excluded (YYYY-MM-DD)
+  End         Last day excluded (YYYY-MM-DD, empty = open)
+
+Usage:
+  python section301_history.py <hts_code> [--on YYYY-MM-DD]
+  python section301_history.py --batch entries.csv --output audited.csv   # hts and date columns
+"""
+
+import argparse
+import bisect
+import csv
+import glob
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Optional, List, Iterable, Iterator, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hts_keys import TARIFF_LINE, hts_key, hts_keys_batch, key_digit_count, prefix_key, prefix_keys
+
+DEFAULT_EXPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'exports')
+DEFAULT_CHUNK_SIZE = 250000
+
+# (first day, last day or None, additional duty %) of every rate period of each list
+LIST_SCHEDULE: Dict[str, List[Tuple[str, Optional[str], float]]] = {
+    '1': [('2018-07-06', None, 25.0)],
+    '2': [('2018-08-23', None, 25.0)],
+    '3': [('2018-09-24', '2019-05-09', 10.0), ('2019-05-10', None, 25.0)],
+    '4a': [('2019-09-01', '2020-02-13', 15.0), ('2020-02-14', None, 7.5)],
+}
+# Higher number = more recent = higher priority
+LIST_PRIORITY = {'1': 1, '2': 2, '3': 3, '4a': 4}
+
+EPOCH = date(1970, 1, 1)
+_DAY_BITS = 20
+_OPEN_END = (1 << _DAY_BITS) - 1
+_ONE_DAY = timedelta(days=1)
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    value = (value or '').strip()
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+def _day(value: date) -> int:
+    return (value - EPOCH).days
+
+def list_effective_date(list_number: str) -> Optional[str]:
+    """First day the list was in effect"""
+    periods = LIST_SCHEDULE.get(str(list_number).lower())
+    return periods[0][0] if periods else None
+
+class Section301Interval(NamedTuple):
+    """One period of a code on a list"""
+    hts_code: str
+    list_number: str
+    rate: float
+    effective: date
+    end: Optional[date]      # Last day in effect, None = still in effect
+    exclusion: str = ''      # Set on excluded pieces, whose rate is 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'hts_code': self.hts_code,
+            'list': self.list_number,
+            'rate': self.rate,
+            'effective': self.effective.isoformat(),
+            'end': self.end.isoformat() if self.end else None,
+            'exclusion': self.exclusion or None,
+        }
+
+def list_intervals(hts_code: str, lists: Iterable[str]) -> List[Section301Interval]:
+    """Rate periods of a code on each of its lists, each list ending where a later one starts"""
+    ordered = sorted({name for name in lists if name in LIST_SCHEDULE}, key=LIST_PRIORITY.get)
+    intervals = []
+    for position, name in enumerate(ordered):
+        cutoff = None
+        if position + 1 < len(ordered):
+            cutoff = _parse_date(list_effective_date(ordered[position + 1])) - _ONE_DAY
+        for effective, end, rate in LIST_SCHEDULE[name]:
+            effective, end = _parse_date(effective), _parse_date(end)
+            if cutoff is not None:
+                if effective > cutoff:
+                    break
+                end = cutoff if end is None else min(end, cutoff)
+            intervals.append(Section301Interval(hts_code, name, rate, effective, end))
+    return intervals
+
+def apply_exclusions(intervals: List[Section301Interval],
+                     exclusions: List[Tuple[date, Optional[date], str]]) -> Iterator[Section301Interval]:
+    """Split intervals around the (sorted) exclusions; excluded pieces get rate 0"""
+    for interval in intervals:
+        start = interval.effective
+        for excluded_from, excluded_to, name in exclusions:
+            if start is None:
+                break
+            if (excluded_to is not None and excluded_to < start) or \
+                    (interval.end is not None and excluded_from > interval.end):
+                continue
+            if excluded_from > start:
+                yield interval._replace(effective=start, end=excluded_from - _ONE_DAY)
+            if interval.end is None or excluded_to is None:
+                piece_end = interval.end or excluded_to
+            else:
+                piece_end = min(interval.end, excluded_to)
+            yield interval._replace(effective=max(start, excluded_from), end=piece_end, rate=0.0, exclusion=name)
+            start = piece_end + _ONE_DAY if piece_end is not None else None
+        if start is not None and (interval.end is None or start <= interval.end):
+            yield interval._replace(effective=start)
+
+class Section301History:
+    """Section 301 intervals of every code, sorted by code and start date"""
+
+    def __init__(self, intervals: Iterable[Section301Interval]):
+        keyed = sorted(((hts_key(interval.hts_code), interval) for interval in intervals),
+                       key=lambda item: (item[0], item[1].effective))
+        self.intervals: List[Section301Interval] = [interval for _, interval in keyed]
+        self._start_days = [_day(interval.effective) for interval in self.intervals]
+        self._spans: Dict[int, Tuple[int, int]] = {}
+        for position, (key, _) in enumerate(keyed):
+            first, _ = self._spans.get(key, (position, position))
+            self._spans[key] = (first, position + 1)
+
+        # Flat arrays for the batch lookup: one sorted (key, start day) composite per interval
+        self._keys = np.array([key for key, _ in keyed], dtype=np.int64)
+        self._composite = self._keys << _DAY_BITS | np.array(self._start_days, dtype=np.int64)
+        self._end_days = np.array([_day(interval.end) if interval.end else _OPEN_END
+                                   for interval in self.intervals], dtype=np.int64)
+        self.rates = np.array([interval.rate for interval in self.intervals], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    def _span(self, hts_code: str) -> Optional[Tuple[int, int]]:
+        """Positions of the code's intervals, falling back to its tariff line"""
+        key = hts_key(hts_code)
+        span = self._spans.get(key)
+        if span is None and key_digit_count(key) > TARIFF_LINE:
+            span = self._spans.get(prefix_key(key, TARIFF_LINE))
+        return span
+
+    def history(self, hts_code: str) -> List[Section301Interval]:
+        first, stop = self._span(hts_code) or (0, 0)
+        return self.intervals[first:stop]
+
+    def interval_as_of(self, hts_code: str, as_of: date) -> Optional[Section301Interval]:
+        """The interval in effect for a code on a date, or None when no list covered it"""
+        span = self._span(hts_code)
+        if span is None:
+            return None
+        day = _day(as_of)
+        position = bisect.bisect_right(self._start_days, day, *span) - 1
+        if position < span[0]:
+            return None
+        interval = self.intervals[position]
+        return interval if interval.end is None or as_of <= interval.end else None
+
+    def rate_as_of(self, hts_code: str, as_of: date) -> float:
+        """Section 301 duty % for a code on a date (0 when not covered or excluded)"""
+        interval = self.interval_as_of(hts_code, as_of)
+        return interval.rate if interval else 0.0
+
+    def lookup(self, keys: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """Position in self.intervals of the interval in effect for each (key, day), -1 for none"""
+        if not len(self.intervals):
+            return np.full(len(keys), -1, dtype=np.int64)
+        # 10-digit codes without intervals of their own use their tariff line, as in _span()
+        lines = prefix_keys(keys, TARIFF_LINE)
+        keys = np.where((lines != keys) & ~np.isin(keys, self._keys), lines, keys)
+        valid = (days >= 0) & (days < _OPEN_END)
+        rows = np.searchsorted(self._composite, keys << _DAY_BITS | np.where(valid, days, 0), side='right') - 1
+        safe = np.maximum(rows, 0)
+        found = valid & (rows >= 0) & (self._keys[safe] == keys) & (self._end_days[safe] >= days)
+        return np.where(found, rows, -1)
+
+    def rates_as_of(self, hts_codes: Iterable[str], dates: Iterable) -> np.ndarray:
+        """rate_as_of() for many (hts, date) pairs at once; unparseable dates get 0"""
+        rows = self.lookup(hts_keys_batch(hts_codes), epoch_days(dates))
+        return np.append(self.rates, 0.0)[rows]      # -1 picks the appended 0
+
+def epoch_days(dates: Iterable) -> np.ndarray:
+    """Days since 1970-01-01 of dates or YYYY-MM-DD strings; -1 where a date cannot be parsed"""
+    parsed = pd.to_datetime(pd.Series(list(dates), dtype=object), errors='coerce', format='%Y-%m-%d')
+    days = parsed.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    return np.where(parsed.isna().to_numpy(), -1, days)
+
+def read_list_memberships(exports_dir: str) -> Dict[int, Tuple[str, set]]:
+    """{hts_key: (HTS code, lists)} from every listN_hts_extracted.csv"""
+    memberships: Dict[int, Tuple[str, set]] = {}
+    codes = set()
+    for path in sorted(glob.glob(os.path.join(exports_dir, 'list*_hts_extracted.csv'))):
+        default_list = re.sub(r'^list|_hts_extracted\.csv$', '', os.path.basename(path)).lower()
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                hts_code = (row.get('HTS_Code') or '').strip()
+                if hts_code:
+                    codes.add(re.sub(r'[^\d]', '', hts_code))
+                    _, lists = memberships.setdefault(hts_key(hts_code), (hts_code, set()))
+                    lists.add((row.get('List') or default_list).strip().lower())
+    if len(memberships) != len(codes):
+        raise ValueError(f"{len(codes)} distinct Section 301 codes got {len(memberships)} keys")
+    return memberships
+
+def read_exclusions(path: str) -> Dict[int, List[Tuple[date, Optional[date], str]]]:
+    """{hts_key: sorted (first day, last day, name)} from an exclusions CSV"""
+    exclusions: Dict[int, List[Tuple[date, Optional[date], str]]] = {}
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            hts_code = (row.get('HTS_Code') or '').strip()
+            effective = _parse_date(row.get('Effective'))
+            if not hts_code or effective is None:
+                continue
+            name = (row.get('Exclusion') or '').strip() or 'excluded'
+            exclusions.setdefault(hts_key(hts_code), []).append((effective, _parse_date(row.get('End')), name))
+    for periods in exclusions.values():
+        periods.sort(key=lambda period: period[0])
+    return exclusions
+
+def load_section301_history(exports_dir: str = DEFAULT_EXPORTS_DIR,
+                            exclusions_csv: Optional[str] = None) -> Section301History:
+    memberships = read_list_memberships(exports_dir)
+    exclusions = read_exclusions(exclusions_csv) if exclusions_csv else {}
+    intervals = []
+    for key, (hts_code, lists) in memberships.items():
+        intervals.extend(apply_exclusions(list_intervals(hts_code, lists), exclusions.get(key, [])))
+    return Section301History(intervals)
+
+def audit_entries(history: Section301History, entries_csv: str, output_csv: str,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, int]:
+    """Add section_301_list/rate/exclusion as of each line's date to an entries CSV, chunk by chunk"""
+    totals = {'lines': 0, 'covered': 0}
+    lists = np.array([interval.list_number for interval in history.intervals] + [''], dtype=object)
+    names = np.array([interval.exclusion for interval in history.intervals] + [''], dtype=object)
+    rates = np.append(history.rates, 0.0)
+    with open(output_csv, 'w', encoding='utf-8', newline='') as f:
+        for number, chunk in enumerate(pd.read_csv(entries_csv, dtype=str, keep_default_na=False,
+                                                   chunksize=chunk_size)):
+            columns = {name.strip().lower(): name for name in chunk.columns}
+            if 'hts' not in columns or 'date' not in columns:
+                raise ValueError("Entries CSV needs 'hts' and 'date' columns")
+            # Entries repeat codes, so key each distinct code once
+            codes, distinct = pd.factorize(chunk[columns['hts']])
+            rows = history.lookup(hts_keys_batch(distinct)[codes], epoch_days(chunk[columns['date']]))
+            chunk['section_301_list'] = lists[rows]      # -1 picks the empty last element
+            chunk['section_301_rate'] = rates[rows]
+            chunk['section_301_exclusion'] = names[rows]
+            chunk.to_csv(f, index=False, header=number == 0)
+            totals['lines'] += len(chunk)
+            totals['covered'] += int((rows >= 0).sum())
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Section 301 list and rate of HTS codes on past dates.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('hts_code', nargs='?', help="Show the Section 301 history of this code.")
+    parser.add_argument('--on', metavar='YYYY-MM-DD', help="Also show the rate in effect on this date.")
+    parser.add_argument('--batch', metavar='CSV', help="Entries CSV with hts and date columns.")
+    parser.add_argument('--output', metavar='CSV', help="Output of --batch: the entries plus the Section 301 columns.")
+    parser.add_argument('--exports-dir', default=DEFAULT_EXPORTS_DIR,
+                        help="Directory with the list*_hts_extracted.csv files. Default: ../exports.")
+    parser.add_argument('--exclusions', metavar='CSV', help="Product exclusions (HTS_Code, Exclusion, Effective, End).")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, metavar='N',
+                        help=f"Entry lines per chunk with --batch. Default: {DEFAULT_CHUNK_SIZE}.")
+    args = parser.parse_args()
+    if not args.hts_code and not args.batch:
+        parser.error("give an HTS code or --batch")
+    if args.batch and not args.output:
+        parser.error("--batch needs --output")
+
+    started = time.perf_counter()
+    history = load_section301_history(args.exports_dir, args.exclusions)
+    print(f"Loaded {len(history)} Section 301 intervals in {time.perf_counter() - started:.2f}s")
+
+    if args.hts_code:
+        intervals = history.history(args.hts_code)
+        if not intervals:
+            print(f"{args.hts_code} is not on any Section 301 list")
+        for interval in intervals:
+            end = interval.end.isoformat() if interval.end else 'open'
+            excluded = f"  excluded: {interval.exclusion}" if interval.exclusion else ''
+            print(f"  {interval.effective.isoformat()} .. {end:<10}  List {interval.list_number:<3} "
+                  f"{interval.rate:5.1f}%{excluded}")
+        if args.on:
+            as_of = _parse_date(args.on)
+            print(f"Rate on {as_of.isoformat()}: {history.rate_as_of(args.hts_code, as_of)}%")
+
+    if args.batch:
+        started = time.perf_counter()
+        totals = audit_entries(history, args.batch, args.output, args.chunk_size)
+        elapsed = time.perf_counter() - started
+        print(f"Audited {totals['lines']} lines in {elapsed:.2f}s "
+              f"({totals['lines'] / max(elapsed, 1e-9):,.0f} lines/s), {totals['covered']} under Section 301")
+        print(f"Output written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Write tariff segments from Python.
+
+Produces the same files as segment-tariff-data.js: one tariff-XXX.json per
+3-digit HTS prefix ({segment, description, count, entries}) and
+segment-index.json. Values are encoded the way JSON.stringify(value, null, 2)
+writes them (integral floats without '.0', JavaScript exponent format,
+numeric-looking keys first), so the files are byte-identical to the Node
+output.
+
+SegmentWriter takes entries one at a time while the preprocessor produces
+them. A segment is handed to a worker pool for encoding as soon as the input
+moves on to the next prefix, and a file is only rewritten when its contents
+changed. Segments encoded earlier (the incremental cache keeps one per
+prefix) are passed in with add_encoded() instead.
+
+Usage:
+  python segment_writer.py <processed_json> [--segments-dir DIR] [--workers N]
+"""
+
+import argparse
+import glob
+import math
+import multiprocessing
+import os
+from datetime import datetime, timezone
+from decimal import Decimal
+from json.encoder import encode_basestring
+from typing import Dict, Any, Optional, List, Iterable, Iterator
+
+from normalized_output import load_tariffs
+
+DEFAULT_SEGMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tariff-segments')
+INDEX_FILE = 'segment-index.json'
+
+def _js_number(value: float) -> str:
+    """Number.prototype.toString() of a float"""
+    if math.isnan(value) or math.isinf(value):
+        return 'null'  # JSON.stringify writes non-finite numbers as null
+    if value.is_integer() and abs(value) < 1e16:
+        return str(int(value))
+    text = repr(value)
+    if 'e' not in text:
+        return text
+    mantissa, exponent = text.split('e')
+    exponent = int(exponent)
+    if -7 < exponent < 21:
+        return format(Decimal(text), 'f')
+    return f"{mantissa}e{'+' if exponent > 0 else '-'}{abs(exponent)}"
+
+def _is_array_index(key: str) -> bool:
+    return key.isdigit() and (key == '0' or key[0] != '0') and int(key) < 2 ** 32 - 1
+
+def _js_key_order(keys: List[str]) -> List[str]:
+    """Property order of a JavaScript object: array-index keys ascending, then insertion order"""
+    indexes = [key for key in keys if key[:1].isdigit() and _is_array_index(key)]
+    if not indexes:
+        return keys
+    return sorted(indexes, key=int) + [key for key in keys if not _is_array_index(key)]
+
+def js_json_dumps(value: Any, level: int = 0) -> str:
+    """JSON.stringify(value, null, 2)"""
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return _js_number(value)
+    inner = '\n' + '  ' * (level + 1)
+    if isinstance(value, dict):
+        if not value:
+            return '{}'
+        items = [f'{encode_basestring(key)}: {js_json_dumps(value[key], level + 1)}'
+                 for key in _js_key_order(list(value))]
+        return '{' + inner + (',' + inner).join(items) + '\n' + '  ' * level + '}'
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return '[]'
+        items = [js_json_dumps(item, level + 1) for item in value]
+        return '[' + inner + (',' + inner).join(items) + '\n' + '  ' * level + ']'
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def segment_prefix(entry: Dict[str, Any]) -> Optional[str]:
+    """Segment an entry belongs to, as segment-tariff-data.js assigns it"""
+    hts_code = entry.get('hts8') or entry.get('normalizedCode') or ''
+    return hts_code[:3] if len(hts_code) >= 3 else None
+
+def encode_segment(prefix: str, entries: List[Dict[str, Any]]) -> str:
+    return js_json_dumps({
+        'segment': prefix,
+        'description': f'HTS codes starting with {prefix}',
+        'count': len(entries),
+        'entries': entries,
+    })
+
+def write_if_changed(path: str, text) -> bool:
+    """Write `text` (str or bytes) to `path` unless the file already holds exactly that"""
+    data = text.encode('utf-8') if isinstance(text, str) else text
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+def _encode_segment(task: tuple) -> tuple:
+    """Encode one segment file (runs in a pool worker)"""
+    prefix, entries = task
+    return prefix, encode_segment(prefix, entries)
+
+class SegmentWriter:
+    """Partition entries by 3-digit prefix and encode segment files in parallel.
+
+    Input sorted by HTS code (the usual case) completes each segment before
+    the next starts, so it is encoded while later rows are still being
+    processed. A prefix that shows up again later is encoded at the end.
+    Files are only written in close(), and only when their contents changed.
+    The pool is started by the first segment that needs encoding.
+    """
+
+    def __init__(self, segments_dir: str, workers: Optional[int] = None):
+        self.segments_dir = segments_dir
+        # Entries of each segment in input order; None for one passed in already encoded
+        self.segments: Dict[str, Optional[List[Dict[str, Any]]]] = {}
+        self.total_entries = 0
+        self._current: Optional[str] = None
+        self._pending: Dict[str, Any] = {}
+        self._deferred = set()
+        self.written: List[str] = []
+        self.removed: List[str] = []
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    def add(self, entry: Dict[str, Any]):
+        self.total_entries += 1
+        prefix = segment_prefix(entry)
+        if prefix is None:
+            return
+        if prefix != self._current:
+            if self._current is not None:
+                self._submit(self._current)
+            self._current = prefix
+            if prefix in self.segments:
+                # Input not sorted: encode this segment only once it is complete
+                self._pending.pop(prefix, None)
+                self._deferred.add(prefix)
+        self.segments.setdefault(prefix, []).append(entry)
+
+    def add_encoded(self, prefix: Optional[str], text: Optional[str], count: int):
+        """Take `count` entries whose segment file `text` was encoded earlier.
+
+        prefix None counts entries that belong to no segment.
+        """
+        self.total_entries += count
+        if prefix is not None:
+            self.segments[prefix] = None
+            self._pending[prefix] = text
+
+    def feed(self, entries: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Pass entries through, adding each one to its segment"""
+        for entry in entries:
+            self.add(entry)
+            yield entry
+
+    def _submit(self, prefix: str, final: bool = False):
+        if prefix in self._deferred and not final:
+            return
+        task = (prefix, list(self.segments[prefix]))
+        if self._pool is None and self.workers > 1:
+            self._pool = multiprocessing.Pool(self.workers)
+        if self._pool is None:
+            self._pending[prefix] = _encode_segment(task)[1]
+        else:
+            self._pending[prefix] = self._pool.apply_async(_encode_segment, (task,))
+
+    def close(self, data_last_updated: Optional[str], hts_revision: Optional[str]) -> Dict[str, Any]:
+        """Write the segments that changed and segment-index.json; return the index"""
+        for prefix in self.segments:
+            if prefix not in self._pending:
+                self._submit(prefix, final=True)
+        os.makedirs(self.segments_dir, exist_ok=True)
+        try:
+            for prefix, result in self._pending.items():
+                text = result if isinstance(result, str) else result.get()[1]
+                if write_if_changed(os.path.join(self.segments_dir, f'tariff-{prefix}.json'), text):
+                    self.written.append(prefix)
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+
+        # Segments of an earlier run that no longer have entries
+        current = {f'tariff-{prefix}.json' for prefix in self.segments}
+        for path in glob.glob(os.path.join(self.segments_dir, 'tariff-*.json')):
+            if os.path.basename(path) not in current:
+                os.remove(path)
+                self.removed.append(os.path.basename(path))
+
+        index = {
+            'segments': {prefix: f'tariff-{prefix}.json' for prefix in self.segments},
+            'metadata': {
+                'totalEntries': self.total_entries,
+                'lastUpdated': data_last_updated,
+                'segmentationDate': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+                'hts_revision': hts_revision or 'Unknown',
+            },
+        }
+        with open(os.path.join(self.segments_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+            f.write(js_json_dumps(index))
+        return index
+
+    def report(self):
+        print(f"\nWrote {len(self.segments)} segments to {self.segments_dir}: "
+              f"{len(self.written)} changed, {len(self.segments) - len(self.written)} unchanged"
+              + (f", {len(self.removed)} removed" if self.removed else ''))
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a processed tariff JSON file into segment files.")
+    parser.add_argument('processed_json', help="Path to a preprocess_tariff_data_new.py output file.")
+    parser.add_argument('--segments-dir', default=DEFAULT_SEGMENTS_DIR,
+                        help="Output directory. Default: tariff-segments next to this script.")
+    parser.add_argument('--workers', type=int, default=None, metavar='N',
+                        help="Processes used to encode segments. Default: one per CPU.")
+    args = parser.parse_args()
+
+    data = load_tariffs(args.processed_json)
+
+    writer = SegmentWriter(args.segments_dir, args.workers)
+    for entry in data['tariffs']:
+        writer.add(entry)
+    writer.close(data.get('data_last_updated'), data.get('hts_revision'))
+    writer.report()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Synthetic USITC tariff database CSVs for benchmarking.
+
+Writes a CSV with the full 122-column layout of the USITC tariff database
+(tariff_database_2025_*.csv) at a multiple of its real size (REAL_ROWS rows
+at scale 1). Values follow the distributions of the real file: MFN rates
+that are free, ad valorem, specific or compound; Column 2 rates; the
+*_indicator / *_ad_val_rate columns of every trade program with the shares
+they have in the real data; and Chapter 99 provisions with the 9999.999999
+sentinel rates. Most codes are taken from the Section 301 list so overlay
+lookups hit as often as they do on real data, and every product category of
+the preprocessor (steel, aluminum, solar, energy, potash) gets codes.
+
+The output is deterministic for a given scale and seed.
+
+Usage:
+  python synthetic_tariff_data.py <output_csv> [--scale N] [--seed N] [--section301-csv PATH] [--xlsx PATH]
+"""
+
+import argparse
+import csv
+import os
+import random
+import re
+from typing import Dict, Optional, List
+
+REAL_ROWS = 12935
+EXCEL_MAX_ROWS = 1048575  # Data rows that fit in one sheet next to the header
+DEFAULT_SECTION_301_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       '..', 'exports', 'section301_deduplicated.csv')
+
+# Share of rows that are Chapter 99 provisions, and of rows taken from the Section 301 list
+CHAPTER_99_SHARE = 0.01
+SECTION_301_SHARE = 0.7
+
+# Codes per scale unit under each product category prefix of the preprocessor
+CATEGORY_PREFIXES = {'720810': 6, '730630': 6, '760612': 6, '854142': 3, '854143': 3,
+                     '85013180': 1, '85016100': 1, '85072080': 1, '271019': 4, '310420': 2, '310520': 2}
+
+def _program_columns(program: str, indicator: Optional[str] = None) -> List[str]:
+    return [indicator or f'{program}_indicator', f'{program}_rate_type_code', f'{program}_ad_val_rate',
+            f'{program}_specific_rate', f'{program}_other_rate']
+
+# Column layout of the USITC tariff database, in file order
+TARIFF_COLUMNS = (
+    ['hts8', 'brief_description', 'quantity_1_code', 'quantity_2_code', 'wto_binding_code',
+     'mfn_text_rate', 'mfn_rate_type_code', 'mfn_ave', 'mfn_ad_val_rate', 'mfn_specific_rate',
+     'mfn_other_rate', 'col1_special_text', 'col1_special_mod', 'gsp_indicator', 'gsp_ctry_excluded',
+     'apta_indicator', 'civil_air_indicator', 'nafta_canada_ind', 'nafta_mexico_ind',
+     'mexico_rate_type_code', 'mexico_ad_val_rate', 'mexico_specific_rate',
+     'cbi_indicator', 'cbi_ad_val_rate', 'cbi_specific_rate', 'agoa_indicator',
+     'cbtpa_indicator', 'cbtpa_rate_type_code', 'cbtpa_ad_val_rate', 'cbtpa_specific_rate',
+     'israel_fta_indicator', 'atpa_indicator', 'atpa_ad_val_rate', 'atpa_specific_rate',
+     'atpdea_indicator']
+    + [column for program in ('jordan', 'singapore', 'chile', 'morocco', 'australia', 'bahrain',
+                              'dr_cafta', 'dr_cafta_plus', 'oman', 'peru')
+       for column in _program_columns(program)]
+    + ['pharmaceutical_ind', 'dyes_indicator', 'col2_text_rate', 'col2_rate_type_code',
+       'col2_ad_val_rate', 'col2_specific_rate', 'col2_other_rate', 'begin_effect_date',
+       'end_effective_date', 'footnote_comment', 'additional_duty']
+    + [column for program in ('korea', 'colombia', 'panama') for column in _program_columns(program)]
+    + ['nepal_indicator']
+    + _program_columns('japan') + _program_columns('usmca')
+)
+
+# Indicator codes and the share of (non Chapter 99) rows that carry them
+PROGRAM_INDICATORS = {
+    'gsp': (['A', 'A', 'A+', 'A*'], 0.43), 'cbi': (['E', 'E', 'E', 'E*'], 0.5),
+    'agoa': (['D'], 0.45), 'israel_fta': (['IL'], 0.68), 'jordan': (['JO'], 0.69),
+    'singapore': (['SG'], 0.69), 'chile': (['CL'], 0.69), 'morocco': (['MA'], 0.69),
+    'australia': (['AU'], 0.68), 'bahrain': (['BH'], 0.69), 'dr_cafta': (['P'], 0.69),
+    'oman': (['OM'], 0.7), 'peru': (['PE'], 0.7), 'korea': (['KR'], 0.7),
+    'colombia': (['CO'], 0.7), 'panama': (['PA'], 0.7), 'usmca': (['S'], 0.68),
+}
+# Share of program-eligible rows whose program rate is still being phased out
+STAGED_RATE_SHARE = 0.02
+
+AD_VALOREM_RATES = ['6.5', '6.5', '3.7', '5.5', '10', '14.9', '2.5', '4', '8', '2.6', '5.3', '12',
+                    '7.5', '3.9', '25', '16', '20', '1.5', '2.9', '4.7', '32', '0.9', '11.2']
+COLUMN_2_RATES = ['25', '25', '20', '35', '35', '40', '45', '50', '90', '30', '60', '80', '110']
+QUANTITY_CODES = ['KG', 'KG', 'KG', 'KG', 'KG', 'KG', 'M2', 'DOZ', 'NO', 'T', 'L', 'PCS', 'X', 'M3', 'PRS']
+BEGIN_DATES = ['2020-07-01', '2020-07-01', '2020-07-01', '1989-01-01', '2022-01-27', '2021-01-01',
+               '2004-01-01', '1995-01-01', '2007-07-01', '2017-01-01']
+FOOTNOTES = ['<col1>  See subheading 9903.41.05.', '<col1>  See heading 9817.57.01.',
+             '<col1>  Imports under this subheading may be subject to Federal Excise Tax (26 U.S.C. 5001).']
+DESCRIPTION_WORDS = {
+    'material': ['Steel', 'Aluminum', 'Cotton', 'Wool', 'Plastic', 'Rubber', 'Glass', 'Paper',
+                 'Copper', 'Wooden', 'Ceramic', 'Leather', 'Synthetic', 'Nickel', 'Titanium'],
+    'article': ['tubes and pipes', 'flat-rolled products', 'parts and accessories', 'garments',
+                'footwear', 'containers', 'machinery', 'fittings', 'yarn', 'sheets and plates',
+                'valves', 'instruments', 'furniture', 'toys', 'fasteners', 'cells and modules'],
+    'qualifier': ['nesoi', 'of a width of 600 mm or more', 'not knitted or crocheted',
+                  'for the manufacture of goods', 'in coils, not further worked than hot-rolled',
+                  'of a kind used in motor vehicles', 'valued over $2.50/kg', 'other', 'mixed'],
+}
+
+def _percent(rate: str) -> str:
+    """Rate column value of a percentage: '6.5' -> '0.065'"""
+    return repr(round(float(rate) / 100, 6))
+
+def _mfn_rate(rng: random.Random) -> Dict[str, str]:
+    kind = rng.random()
+    if kind < 0.3:
+        return {'mfn_text_rate': 'Free', 'mfn_rate_type_code': '0', 'mfn_ad_val_rate': '0',
+                'mfn_specific_rate': '0', 'mfn_other_rate': '0'}
+    if kind < 0.9:
+        rate = rng.choice(AD_VALOREM_RATES)
+        return {'mfn_text_rate': f'{rate}%', 'mfn_rate_type_code': '7', 'mfn_ad_val_rate': _percent(rate),
+                'mfn_specific_rate': '0', 'mfn_other_rate': '0'}
+    cents = rng.choice(['0.65', '1.4', '2.2', '4.4', '0.35', '15', '21', '33'])
+    specific = repr(round(float(cents) / 100, 6))
+    if kind < 0.96:
+        return {'mfn_text_rate': f'{cents} cents/kg', 'mfn_rate_type_code': '1', 'mfn_ad_val_rate': '0',
+                'mfn_specific_rate': specific, 'mfn_other_rate': '0'}
+    rate = rng.choice(AD_VALOREM_RATES[:8])
+    return {'mfn_text_rate': f'{cents} cents/kg + {rate}%', 'mfn_rate_type_code': '4',
+            'mfn_ad_val_rate': _percent(rate), 'mfn_specific_rate': specific, 'mfn_other_rate': '0'}
+
+def _tariff_row(code: str, rng: random.Random) -> Dict[str, str]:
+    words = DESCRIPTION_WORDS
+    row = {
+        'hts8': code,
+        'brief_description': f"{rng.choice(words['material'])} {rng.choice(words['article'])}, "
+                             f"{rng.choice(words['qualifier'])}",
+        'quantity_1_code': rng.choice(QUANTITY_CODES),
+        'wto_binding_code': 'B',
+        'begin_effect_date': rng.choice(BEGIN_DATES),
+        'end_effective_date': '2050-12-31',
+    }
+    if rng.random() < 0.22:
+        row['quantity_2_code'] = 'KG'
+    row.update(_mfn_rate(rng))
+    if rng.random() < 0.015:
+        row['mfn_specific_rate'] = '9999.999999'  # Rate not expressible in this column
+
+    col2 = rng.choice(COLUMN_2_RATES)
+    row.update({'col2_text_rate': f'{col2}%', 'col2_rate_type_code': '7', 'col2_ad_val_rate': _percent(col2),
+                'col2_specific_rate': '0', 'col2_other_rate': '0'})
+
+    eligible = row['mfn_rate_type_code'] != '0'  # Programs only matter for dutiable lines
+    for program, (codes, share) in PROGRAM_INDICATORS.items():
+        if rng.random() >= share:
+            continue
+        indicator = f'{program}_indicator' if f'{program}_indicator' in TARIFF_COLUMNS else f'{program}_ind'
+        row[indicator] = rng.choice(codes)
+        if f'{program}_ad_val_rate' in TARIFF_COLUMNS:
+            staged = eligible and rng.random() < STAGED_RATE_SHARE
+            rate = float(row['mfn_ad_val_rate']) / 2 if staged else 0
+            row[f'{program}_ad_val_rate'] = repr(round(rate, 6)) if staged else '0'
+            if f'{program}_rate_type_code' in TARIFF_COLUMNS:
+                row[f'{program}_rate_type_code'] = '7.0' if staged else '0.0'
+            if f'{program}_specific_rate' in TARIFF_COLUMNS:
+                row[f'{program}_specific_rate'] = '0'
+
+    if rng.random() < 0.07:
+        row['pharmaceutical_ind'] = 'K'
+    if rng.random() < 0.017:
+        row['dyes_indicator'] = 'L'
+    if rng.random() < 0.05:
+        row['footnote_comment'] = rng.choice(FOOTNOTES)
+    return row
+
+def _chapter_99_row(code: str, rng: random.Random) -> Dict[str, str]:
+    rate = rng.choice(['10', '25', '25', '20', '7.5', '50', '125', '11', '15'])
+    text = f'The duty provided in the applicable subheading + {rate}%'
+    return {
+        'hts8': code,
+        'brief_description': f"Articles the product of {rng.choice(['China', 'any country', 'Canada', 'Mexico'])}, "
+                             f"as provided in US note 2(v) to this subchapter",
+        'wto_binding_code': 'U',
+        'mfn_text_rate': text, 'col1_special_text': text,
+        'mfn_ad_val_rate': '9999.999999', 'mfn_specific_rate': '9999.999999', 'mfn_other_rate': '9999.999999',
+        'col2_text_rate': 'The duty provided in the applicable subheading',
+        'col2_ad_val_rate': '9999.99', 'col2_specific_rate': '9999.99', 'col2_other_rate': '9999.99',
+        'begin_effect_date': '4/10/25', 'end_effective_date': '12/31/50',
+    }
+
+def read_section_301_codes(path: str) -> List[str]:
+    """8-digit codes of a section301_deduplicated.csv file"""
+    codes = set()
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            digits = re.sub(r'[^\d]', '', row.get('HTS_Code') or '')
+            if len(digits) >= 8:
+                codes.add(digits[:8])
+    return sorted(codes)
+
+def synthetic_codes(rows: int, rng: random.Random, section_301_codes: List[str]) -> tuple:
+    """(sorted regular codes, Chapter 99 codes) for a table of `rows` rows"""
+    scale = max(1, round(rows / REAL_ROWS))
+    chapter_99 = set()
+    chapter_99_count = min(int(rows * CHAPTER_99_SHARE), 9999)
+    while len(chapter_99) < chapter_99_count:
+        chapter_99.add(f'9903{rng.randrange(10000):04d}')
+
+    regular_count = rows - chapter_99_count
+    codes = set(rng.sample(section_301_codes, min(len(section_301_codes), int(regular_count * SECTION_301_SHARE))))
+    for prefix, per_scale in CATEGORY_PREFIXES.items():
+        span = 10 ** (8 - len(prefix))
+        for _ in range(min(per_scale * scale, span)):
+            codes.add(f'{prefix}{rng.randrange(span):0{8 - len(prefix)}d}' if span > 1 else prefix)
+    chapters = [f'{chapter:02d}' for chapter in range(1, 98) if chapter != 77]
+    while len(codes) < regular_count:
+        codes.add(f'{rng.choice(chapters)}{rng.randrange(10 ** 6):06d}')
+    return sorted(codes)[:regular_count], sorted(chapter_99)
+
+def generate_tariff_csv(output_csv: str, scale: float = 1, seed: int = 0,
+                        section301_csv: Optional[str] = DEFAULT_SECTION_301_CSV) -> int:
+    """Write a synthetic tariff database CSV of `scale` x REAL_ROWS rows; return the row count"""
+    rng = random.Random(seed)
+    rows = max(1, int(REAL_ROWS * scale))
+    section_301_codes = read_section_301_codes(section301_csv) if section301_csv and os.path.exists(section301_csv) else []
+    codes, chapter_99 = synthetic_codes(rows, rng, section_301_codes)
+
+    with open(output_csv, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(TARIFF_COLUMNS)
+        # Chapter 99 provisions sort after every other chapter, as in the real file
+        for code, make_row in [(code, _tariff_row) for code in codes] + [(code, _chapter_99_row) for code in chapter_99]:
+            row = make_row(code, rng)
+            writer.writerow([row.get(column, '') for column in TARIFF_COLUMNS])
+    return rows
+
+def write_tariff_excel(csv_path: str, xlsx_path: str):
+    """Excel copy of a tariff CSV, for benchmarking excel_to_csv.py (needs openpyxl)"""
+    import pandas as pd
+    data = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    if len(data) > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(data)} rows do not fit in one Excel sheet ({EXCEL_MAX_ROWS} max)")
+    data.to_excel(xlsx_path, index=False, engine='openpyxl')
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic USITC tariff database CSV for benchmarking.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('output_csv', help="Path of the CSV to write.")
+    parser.add_argument('--scale', type=float, default=1,
+                        help=f"Multiple of the real table size ({REAL_ROWS} rows). Default: 1.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed. Default: 0.")
+    parser.add_argument('--section301-csv', default=DEFAULT_SECTION_301_CSV,
+                        help="Section 301 list the codes are drawn from.\n"
+                             "Default: ../exports/section301_deduplicated.csv.")
+    parser.add_argument('--xlsx', metavar='PATH', help="Also write an Excel copy (needs openpyxl).")
+    args = parser.parse_args()
+
+    rows = generate_tariff_csv(args.output_csv, args.scale, args.seed, args.section301_csv)
+    print(f"Wrote {rows} rows to {args.output_csv}")
+    if args.xlsx:
+        write_tariff_excel(args.output_csv, args.xlsx)
+        print(f"Wrote {args.xlsx}")
+
+if __name__ == '__main__':
+    main()
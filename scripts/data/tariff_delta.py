@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Revision delta engine for tariff segments.
+
+Compares two processed tariff outputs (preprocess_tariff_data_new.py JSON
+files) or two segment directories (segment-index.json + tariff-XXX.json)
+entry by entry, keyed on hts8, and writes one compact patch per changed
+segment plus a manifest linking the two revisions:
+
+  patches/
+  ├── patch-manifest.json        # from/to revision, per-segment summary and hashes
+  ├── tariff-720.patch.json      # added / removed / changed entries of segment 720
+  └── ...
+
+A changed entry only carries the top-level fields that differ ('set') and
+the fields that disappeared ('unset'). apply_segment_patch() moves a segment
+from revision N to N+1; the CLI checks that every patch reproduces the target
+segment before writing anything.
+
+Usage:
+  python tariff_delta.py <old_json_or_segments_dir> <new_json_or_segments_dir> <patch_dir>
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+
+from normalized_output import load_tariffs
+from segment_writer import segment_prefix
+
+PATCH_FORMAT = 1
+
+def _file_sha256(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_segments(path: str) -> Tuple[Dict[str, List[Dict[str, Any]]], Optional[str], Dict[str, str]]:
+    """Read a processed JSON file or a segment directory.
+
+    Returns (entries per segment prefix, HTS revision, sha256 of each segment
+    file; empty for a processed JSON file).
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'segment-index.json'), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        segments, hashes = {}, {}
+        for prefix, filename in index.get('segments', {}).items():
+            segment_file = os.path.join(path, filename)
+            if not os.path.exists(segment_file):
+                continue  # Listed in the index but never generated
+            with open(segment_file, 'r', encoding='utf-8') as f:
+                segments[prefix] = json.load(f)['entries']
+            hashes[prefix] = _file_sha256(segment_file)
+        return segments, index.get('metadata', {}).get('hts_revision'), hashes
+
+    data = load_tariffs(path)
+    segments: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in data['tariffs']:
+        prefix = segment_prefix(entry)
+        if prefix is not None:
+            segments.setdefault(prefix, []).append(entry)
+    return segments, data.get('hts_revision'), {}
+
+def entry_keys(entries: List[Dict[str, Any]]) -> List[str]:
+    """hts8 of each entry; repeated codes get '#2', '#3', ... in order of appearance"""
+    seen: Dict[str, int] = {}
+    keys = []
+    for entry in entries:
+        code = entry.get('hts8', '')
+        seen[code] = seen.get(code, 0) + 1
+        keys.append(code if seen[code] == 1 else f'{code}#{seen[code]}')
+    return keys
+
+def diff_entry(old: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Top-level field changes from old to new, or None if they are equal"""
+    changes: Dict[str, Any] = {}
+    updated = {field: value for field, value in new.items()
+               if field not in old or old[field] != value}
+    removed = [field for field in old if field not in new]
+    if updated:
+        changes['set'] = updated
+    if removed:
+        changes['unset'] = removed
+    # Applying set/unset keeps existing fields in place and appends new ones;
+    # spell out the field order when the target differs from that
+    kept = [field for field in old if field in new]
+    if kept + [field for field in new if field not in old] != list(new):
+        changes['fields'] = list(new)
+    return changes or None
+
+def diff_segment(old_entries: List[Dict[str, Any]],
+                 new_entries: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Patch turning one segment's entries into another's, or None if identical"""
+    old_by_key = dict(zip(entry_keys(old_entries), old_entries))
+    new_keys = entry_keys(new_entries)
+
+    added, changed = {}, {}
+    for key, entry in zip(new_keys, new_entries):
+        if key not in old_by_key:
+            added[key] = entry
+            continue
+        changes = diff_entry(old_by_key[key], entry)
+        if changes:
+            changed[key] = changes
+    new_key_set = set(new_keys)
+    removed = [key for key in old_by_key if key not in new_key_set]
+
+    patch: Dict[str, Any] = {}
+    if added:
+        patch['added'] = added
+    if removed:
+        patch['removed'] = removed
+    if changed:
+        patch['changed'] = changed
+
+    # Entries keep their place; added ones go last unless an order is given
+    kept = [key for key in old_by_key if key in new_key_set]
+    if kept + list(added) != new_keys:
+        patch['order'] = new_keys
+    return patch or None
+
+def apply_segment_patch(entries: List[Dict[str, Any]], patch: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Apply a segment patch to a list of entries, returning the new list"""
+    by_key = dict(zip(entry_keys(entries), entries))
+    for key in patch.get('removed', []):
+        del by_key[key]
+    for key, changes in patch.get('changed', {}).items():
+        entry = dict(by_key[key])
+        for field in changes.get('unset', []):
+            del entry[field]
+        entry.update(changes.get('set', {}))
+        if 'fields' in changes:
+            entry = {field: entry[field] for field in changes['fields']}
+        by_key[key] = entry
+    by_key.update(patch.get('added', {}))
+    order = patch.get('order') or list(by_key)
+    return [by_key[key] for key in order]
+
+def build_patches(old_segments: Dict[str, List[Dict[str, Any]]],
+                  new_segments: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Patch for every segment that differs between two revisions"""
+    patches = {}
+    for prefix in sorted(set(old_segments) | set(new_segments)):
+        patch = diff_segment(old_segments.get(prefix, []), new_segments.get(prefix, []))
+        if patch is not None:
+            patches[prefix] = patch
+    return patches
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write per-segment patches between two tariff revisions.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('old', help="Processed JSON file or segment directory of revision N.")
+    parser.add_argument('new', help="Processed JSON file or segment directory of revision N+1.")
+    parser.add_argument('patch_dir', help="Directory for the patch files and patch-manifest.json.")
+    parser.add_argument('--from-revision', help="Override the revision read from <old>.")
+    parser.add_argument('--to-revision', help="Override the revision read from <new>.")
+    args = parser.parse_args()
+
+    old_segments, old_revision, old_hashes = load_segments(args.old)
+    new_segments, new_revision, new_hashes = load_segments(args.new)
+    from_revision = args.from_revision or old_revision or 'Unknown'
+    to_revision = args.to_revision or new_revision or 'Unknown'
+    print(f"Comparing revision {from_revision} ({sum(map(len, old_segments.values()))} entries) "
+          f"with revision {to_revision} ({sum(map(len, new_segments.values()))} entries)")
+
+    patches = build_patches(old_segments, new_segments)
+
+    # Every patch must reproduce its target segment exactly
+    for prefix, patch in patches.items():
+        if apply_segment_patch(old_segments.get(prefix, []), patch) != new_segments.get(prefix, []):
+            print(f"Error: patch for segment {prefix} does not reproduce revision {to_revision}")
+            sys.exit(1)
+
+    os.makedirs(args.patch_dir, exist_ok=True)
+    manifest = {
+        'format': PATCH_FORMAT,
+        'from_revision': from_revision,
+        'to_revision': to_revision,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'unchanged_segments': len((set(old_segments) | set(new_segments)) - set(patches)),
+        'segments': {},
+    }
+    total_bytes = 0
+    for prefix, patch in patches.items():
+        filename = f'tariff-{prefix}.patch.json'
+        document = {'segment': prefix, 'from_revision': from_revision, 'to_revision': to_revision}
+        document.update(patch)
+        text = json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+        with open(os.path.join(args.patch_dir, filename), 'w', encoding='utf-8') as f:
+            f.write(text)
+        total_bytes += len(text.encode('utf-8'))
+
+        summary: Dict[str, Any] = {
+            'file': filename,
+            'added': len(patch.get('added', {})),
+            'removed': len(patch.get('removed', [])),
+            'changed': len(patch.get('changed', {})),
+        }
+        if prefix not in old_segments:
+            summary['status'] = 'new'
+        elif prefix not in new_segments:
+            summary['status'] = 'deleted'
+        if prefix in old_hashes:
+            summary['base_sha256'] = old_hashes[prefix]
+        if prefix in new_hashes:
+            summary['result_sha256'] = new_hashes[prefix]
+        manifest['segments'][prefix] = summary
+
+    with open(os.path.join(args.patch_dir, 'patch-manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    counts = {kind: sum(s[kind] for s in manifest['segments'].values())
+              for kind in ('added', 'removed', 'changed')}
+    print(f"{len(patches)} segment patches ({total_bytes / 1024:.1f} KB): "
+          f"{counts['added']} added, {counts['removed']} removed, {counts['changed']} changed entries")
+    print(f"{manifest['unchanged_segments']} segments unchanged")
+    print(f"Patches written to {args.patch_dir}")
+
+if __name__ == '__main__':
+    main()
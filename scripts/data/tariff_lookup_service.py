@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Local tariff lookup service.
+
+Serves the contents of tariff-segments/ over HTTP as a stand-in for the
+blob-hosted segments, so lookup latency can be measured and load tested
+offline. asyncio only, no dependencies:
+
+  GET  /lookup?hts=7208.10.15&country=CN[&usmca=1]
+  POST /lookup     {"items": [{"hts": "...", "country": "...", "usmca": false}, ...]}
+  GET  /stats      cache and request counters
+  GET  /health
+
+A lookup answers with the entry and the duties that apply to the origin
+(duty_applicability.py). Decoded segments are kept in an LRU cache; concurrent
+misses for the same segment share one load, which runs in a thread so the
+event loop keeps serving cached segments meanwhile.
+
+Usage:
+  python tariff_lookup_service.py [<segments_dir>] [--host HOST] [--port PORT] [--cache-segments N]
+  python tariff_lookup_service.py [<segments_dir>] --bench [--requests N] [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+from urllib.parse import urlsplit, parse_qs
+
+from duty_applicability import applicable_duties
+from segment_writer import DEFAULT_SEGMENTS_DIR, INDEX_FILE
+
+MAX_BATCH_ITEMS = 10000
+
+class SegmentCache:
+    """LRU of decoded segments (hts8 -> entry) with single-flight loading"""
+
+    def __init__(self, segments_dir: str, capacity: Optional[int] = None):
+        self.segments_dir = segments_dir
+        self._segments: 'OrderedDict[str, Dict[str, Dict[str, Any]]]' = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.files = self._read_index()
+        # Every segment fits unless a cap is given
+        self.capacity = max(1, len(self.files) if capacity is None else min(capacity, len(self.files)))
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'loads': 0, 'evictions': 0, 'load_seconds': 0.0}
+
+    def _read_index(self) -> Dict[str, str]:
+        index_path = os.path.join(self.segments_dir, INDEX_FILE)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"{index_path} not found")
+        with open(index_path, 'r', encoding='utf-8') as f:
+            segments = json.load(f).get('segments', {})
+        # Listed in the index but never generated
+        return {prefix: filename for prefix, filename in segments.items()
+                if os.path.exists(os.path.join(self.segments_dir, filename))}
+
+    def _load(self, prefix: str) -> Dict[str, Dict[str, Any]]:
+        """Read and index one segment file (runs in a worker thread)"""
+        with open(os.path.join(self.segments_dir, self.files[prefix]), 'r', encoding='utf-8') as f:
+            entries = json.load(f)['entries']
+        by_code: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            by_code.setdefault(entry.get('hts8', ''), entry)
+        return by_code
+
+    async def get(self, prefix: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        segment = self._segments.get(prefix)
+        if segment is not None:
+            self._segments.move_to_end(prefix)
+            self.stats['hits'] += 1
+            return segment
+        if prefix not in self.files:
+            return None
+
+        pending = self._loading.get(prefix)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+            return await pending
+
+        self.stats['misses'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[prefix] = future
+        started = time.perf_counter()
+        try:
+            segment = await asyncio.get_running_loop().run_in_executor(None, self._load, prefix)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            del self._loading[prefix]
+        self.stats['loads'] += 1
+        self.stats['load_seconds'] += time.perf_counter() - started
+
+        self._segments[prefix] = segment
+        if len(self._segments) > self.capacity:
+            self._segments.popitem(last=False)
+            self.stats['evictions'] += 1
+        future.set_result(segment)
+        return segment
+
+class LookupService:
+    def __init__(self, cache: SegmentCache):
+        self.cache = cache
+        self.requests = 0
+        self.lookups = 0
+        self.started = time.time()
+
+    async def lookup(self, hts: str, country: str, usmca: bool = False) -> Dict[str, Any]:
+        self.lookups += 1
+        digits = ''.join(ch for ch in str(hts or '') if ch.isdigit())[:8]
+        result: Dict[str, Any] = {'hts': hts, 'country': country}
+        if len(digits) < 3:
+            result['error'] = 'invalid HTS code'
+            return result
+        segment = await self.cache.get(digits[:3])
+        entry = segment.get(digits) if segment is not None else None
+        if entry is None:
+            result['error'] = 'not found'
+            return result
+        result['entry'] = entry
+        if country:
+            result.update(applicable_duties(entry, country, usmca))
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'lookups': self.lookups,
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'cached_segments': len(self.cache._segments),
+            'capacity': self.cache.capacity,
+            'cache': dict(self.cache.stats, load_seconds=round(self.cache.stats['load_seconds'], 3)),
+        }
+
+    async def route(self, method: str, target: str, body: bytes) -> tuple:
+        """(status, payload) for one request"""
+        url = urlsplit(target)
+        if url.path == '/lookup' and method == 'GET':
+            query = parse_qs(url.query)
+            hts = query.get('hts', [''])[0]
+            country = query.get('country', [''])[0]
+            usmca = query.get('usmca', ['0'])[0].lower() in ('1', 'true', 'yes')
+            if not hts:
+                return 400, {'error': "missing 'hts' parameter"}
+            result = await self.lookup(hts, country, usmca)
+            return (404 if result.get('error') == 'not found' else 200), result
+        if url.path == '/lookup' and method == 'POST':
+            try:
+                request = json.loads(body or b'{}')
+            except ValueError:
+                return 400, {'error': 'invalid JSON body'}
+            items = request.get('items') if isinstance(request, dict) else request
+            if not isinstance(items, list) or len(items) > MAX_BATCH_ITEMS:
+                return 400, {'error': f"expected up to {MAX_BATCH_ITEMS} items"}
+            results = [await self.lookup(item.get('hts'), item.get('country', ''), bool(item.get('usmca')))
+                       for item in items if isinstance(item, dict)]
+            return 200, {'results': results}
+        if url.path == '/stats' and method == 'GET':
+            return 200, self.stats()
+        if url.path == '/health' and method == 'GET':
+            return 200, {'status': 'ok', 'segments': len(self.cache.files)}
+        return 404, {'error': f'no route for {method} {url.path}'}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve HTTP/1.1 requests on one connection (keep-alive)"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                body = await reader.readexactly(length) if length else b''
+
+                self.requests += 1
+                try:
+                    status, payload = await self.route(method, target, body)
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+async def serve(segments_dir: str, host: str, port: int, capacity: Optional[int]):
+    service = LookupService(SegmentCache(segments_dir, capacity))
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving {len(service.cache.files)} segments from {segments_dir} on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+async def _client(host: str, port: int, targets: List[str], latencies: List[float]):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for target in targets:
+            started = time.perf_counter()
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = int(next(line.split(':', 1)[1] for line in head.decode('latin-1').split('\r\n')
+                              if line.lower().startswith('content-length')))
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+async def bench(segments_dir: str, requests: int, concurrency: int, capacity: Optional[int]):
+    """Run the service in-process and hit it with keep-alive GET lookups"""
+    service = LookupService(SegmentCache(segments_dir, capacity))
+    server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    # Codes to look up, spread over every segment
+    codes = []
+    for prefix in service.cache.files:
+        segment = await service.cache.get(prefix)
+        codes.extend(list(segment)[:50])
+    service.cache._segments.clear()
+    service.cache.stats = dict.fromkeys(service.cache.stats, 0)
+    countries = ['CN', 'CA', 'MX', 'DE', 'GB', 'KR', 'RU', 'HK']
+    targets = [f"/lookup?hts={random.choice(codes)}&country={random.choice(countries)}"
+               for _ in range(requests)]
+
+    latencies: List[float] = []
+    started = time.perf_counter()
+    async with server:
+        await asyncio.gather(*(_client('127.0.0.1', port, targets[i::concurrency], latencies)
+                               for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{requests} lookups over {concurrency} connections in {elapsed:.2f}s: "
+          f"{requests / elapsed:.0f} lookups/s")
+    print(f"Latency p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+    print(f"Cache: {json.dumps(service.stats()['cache'])}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve tariff segment lookups over HTTP (asyncio).",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('segments_dir', nargs='?', default=DEFAULT_SEGMENTS_DIR,
+                        help="Segment directory. Default: tariff-segments next to this script.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on. Default: 127.0.0.1.")
+    parser.add_argument('--port', type=int, default=8787, help="Port to listen on. Default: 8787.")
+    parser.add_argument('--cache-segments', type=int, metavar='N',
+                        help="Most decoded segments kept in memory. Default: every segment in the index.")
+    parser.add_argument('--bench', action='store_true',
+                        help="Start the service in-process and measure lookups per second.")
+    parser.add_argument('--requests', type=int, default=20000, metavar='N',
+                        help="Lookups sent by --bench. Default: 20000.")
+    parser.add_argument('--concurrency', type=int, default=32, metavar='N',
+                        help="Connections used by --bench. Default: 32.")
+    args = parser.parse_args()
+
+    try:
+        if args.bench:
+            asyncio.run(bench(args.segments_dir, args.requests, args.concurrency, args.cache_segments))
+        else:
+            asyncio.run(serve(args.segments_dir, args.host, args.port, args.cache_segments))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Effective-date interval index over a processed tariff output.
+
+Processed entries are built for one day, but their parts carry dates: every
+entry has begin_effect_date/end_effective_date, the reciprocal, IEEPA and
+rule duties have effective/expires, and the Section 232 and Section 201
+duties take theirs from ADDITIVE_DUTIES (the additive_duties_info in the
+output metadata). Section 301 duties follow LIST_SCHEDULE of
+section301_history.py, so a List 4A duty is 15% before 2020-02-14. Dates
+are inclusive, as in trade_rules.py; a missing date leaves that side open.
+
+Each entry and each of its duties is a component with a day range. For every
+HTS code the index cuts the timeline at all component start and end days and
+stores, for each resulting segment, the components in effect all through it.
+Which components apply to a code on a date is then a bisect over the code's
+segment starts, and duty_applicability.py picks the ones for a country. A
+snapshot looks up every code at once with one searchsorted over all segments,
+and writes the output as it would have been built on that date: entries not
+in effect are dropped and duties not in effect are removed from the others.
+
+Usage:
+  python tariff_timeline.py <processed_json_or_segments_dir> lookup <hts_code> <country> <YYYY-MM-DD> [--usmca]
+  python tariff_timeline.py <processed_json_or_segments_dir> snapshot <YYYY-MM-DD> <output_json>
+"""
+
+import argparse
+import bisect
+import json
+import os
+import re
+import time
+from datetime import date, datetime
+from typing import Dict, Any, Optional, List, NamedTuple, Tuple
+
+import numpy as np
+
+from duty_applicability import applicable_duties
+from duty_engine import load_entries
+from hts_keys import TARIFF_LINE, hts_key, prefix_key
+from normalized_output import load_tariffs
+from section301_history import LIST_SCHEDULE
+
+# Entry fields holding dated duties, in output order
+DATED_FIELDS = ('additive_duties', 'rule_duties', 'reciprocal_tariffs', 'ieepa_tariffs')
+# Left out of a snapshot entry when nothing in them is in effect, as in the processed output
+OMITTED_WHEN_EMPTY = ('additive_duties', 'rule_duties')
+ENTRY_FIELD = 'entry'
+
+# Days are counted from 1900-01-01 so that old begin dates stay positive
+EPOCH = date(1900, 1, 1)
+_DAY_BITS = 20
+_OPEN_END = (1 << _DAY_BITS) - 1
+
+def parse_tariff_date(value: Any) -> Optional[date]:
+    """Date of a YYYY-MM-DD or USITC M/D/YY value; None when empty or unreadable"""
+    value = str(value or '').strip()
+    match = re.fullmatch(r'(\d{1,2})/(\d{1,2})/(\d{2}|\d{4})', value)
+    try:
+        if match:
+            month, day, year = (int(part) for part in match.groups())
+            if len(match.group(3)) == 2:
+                # 00-50 is 20xx, as in formatDate() in src/services/tariffService.ts
+                year += 2000 if year <= 50 else 1900
+            return date(year, month, day)
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+def _line_key(hts_code: str) -> int:
+    """Key of the tariff line (first 8 digits) of a code, as entries are keyed by hts8"""
+    return prefix_key(hts_key(hts_code), TARIFF_LINE)
+
+def _day(value: Optional[date], default: int) -> int:
+    return (value - EPOCH).days if value else default
+
+def _day_date(day: int) -> Optional[date]:
+    return date.fromordinal(EPOCH.toordinal() + day) if day < _OPEN_END else None
+
+class Component(NamedTuple):
+    """An entry (field 'entry') or one of its duties, with the days it is in effect"""
+    entry: int           # Position of the entry in TariffTimeline.entries
+    field: str
+    start: int           # First day in effect, days since EPOCH
+    end: int             # Last day in effect, _OPEN_END when open
+    duty: Optional[Dict[str, Any]] = None
+
+def _additive_components(position: int, duty: Dict[str, Any],
+                         additive_duties_info: Dict[str, Any]) -> List[Component]:
+    """Components of one additive_duties item"""
+    kind = duty.get('type')
+    if kind == 'section_301':
+        periods = LIST_SCHEDULE.get(str(duty.get('list', '')).lower())
+        if periods:
+            components = []
+            for effective, end, rate in periods:
+                period_duty = duty
+                if rate != duty.get('rate'):
+                    period_duty = dict(duty, rate=rate, label=f"Section 301 List {duty['list']} ({rate}%)")
+                components.append(Component(position, 'additive_duties',
+                                            _day(parse_tariff_date(effective), 0),
+                                            _day(parse_tariff_date(end), _OPEN_END), period_duty))
+            return components
+        info = {}
+    elif kind == 'section_232':
+        metal = 'aluminum' if 'aluminum' in (duty.get('name') or '').lower() else 'steel'
+        info = additive_duties_info.get(f'section_232_{metal}', {})
+    elif kind == 'section_201':
+        info = additive_duties_info.get('section_201_solar', {})
+    else:
+        info = duty
+    return [Component(position, 'additive_duties', _day(parse_tariff_date(info.get('effective')), 0),
+                      _day(parse_tariff_date(info.get('expires')), _OPEN_END), duty)]
+
+def entry_components(position: int, entry: Dict[str, Any],
+                     additive_duties_info: Dict[str, Any]) -> List[Component]:
+    """The entry's own component followed by those of its duties, in field order"""
+    components = [Component(position, ENTRY_FIELD,
+                            _day(parse_tariff_date(entry.get('begin_effect_date')), 0),
+                            _day(parse_tariff_date(entry.get('end_effective_date')), _OPEN_END))]
+    for field in DATED_FIELDS:
+        for duty in entry.get(field) or []:
+            if field == 'additive_duties':
+                components.extend(_additive_components(position, duty, additive_duties_info))
+            else:
+                components.append(Component(position, field, _day(parse_tariff_date(duty.get('effective')), 0),
+                                            _day(parse_tariff_date(duty.get('expires')), _OPEN_END), duty))
+    return [component for component in components if component.start <= component.end]
+
+class TariffTimeline:
+    """Processed tariff entries indexed by HTS code and effective date"""
+
+    def __init__(self, entries: List[Dict[str, Any]], additive_duties_info: Optional[Dict[str, Any]] = None):
+        if additive_duties_info is None:
+            from preprocess_tariff_data_new import ADDITIVE_DUTIES
+            additive_duties_info = ADDITIVE_DUTIES
+        self.entries = entries
+        self.components: List[Component] = []
+        by_key: Dict[int, List[int]] = {}
+        for position, entry in enumerate(entries):
+            code = str(entry.get('hts8') or '')
+            if not code:
+                continue
+            ids = by_key.setdefault(_line_key(code), [])
+            for component in entry_components(position, entry, additive_duties_info):
+                ids.append(len(self.components))
+                self.components.append(component)
+
+        # Segments of each code: start day and the components in effect until the next start
+        segment_keys: List[int] = []
+        self._segment_starts: List[int] = []
+        self._segments: List[Tuple[int, ...]] = []
+        self._spans: Dict[int, Tuple[int, int]] = {}
+        for key in sorted(by_key):
+            ids = by_key[key]
+            bounds = sorted({self.components[i].start for i in ids} |
+                            {self.components[i].end + 1 for i in ids if self.components[i].end < _OPEN_END})
+            first = len(self._segments)
+            for start in bounds:
+                segment_keys.append(key)
+                self._segment_starts.append(start)
+                self._segments.append(tuple(i for i in ids
+                                            if self.components[i].start <= start <= self.components[i].end))
+            self._spans[key] = (first, len(self._segments))
+
+        self.keys = np.array(sorted(by_key), dtype=np.int64)
+        self._segment_keys = np.array(segment_keys, dtype=np.int64)
+        self._composite = self._segment_keys << _DAY_BITS | np.array(self._segment_starts, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.components)
+
+    def components_as_of(self, hts_code: str, as_of: date) -> List[Component]:
+        """Components of the code's entries in effect on a date"""
+        span = self._spans.get(_line_key(hts_code))
+        if span is None:
+            return []
+        position = bisect.bisect_right(self._segment_starts, _day(as_of, 0), *span) - 1
+        if position < span[0]:
+            return []
+        active = [self.components[i] for i in self._segments[position]]
+        # Duties count only while their entry is in effect
+        entries = {component.entry for component in active if component.field == ENTRY_FIELD}
+        return [component for component in active if component.entry in entries]
+
+    def _assemble(self, entry_component: int, active: Tuple[int, ...]) -> Dict[str, Any]:
+        """Entry with only the duties of `active` left in its dated fields"""
+        position = self.components[entry_component].entry
+        in_effect: Dict[str, List[Dict[str, Any]]] = {}
+        for i in active:
+            component = self.components[i]
+            if component.entry == position and component.field != ENTRY_FIELD:
+                in_effect.setdefault(component.field, []).append(component.duty)
+        entry = dict(self.entries[position])
+        for field in DATED_FIELDS:
+            if field not in entry:
+                continue
+            if in_effect.get(field):
+                entry[field] = in_effect[field]
+            elif field in OMITTED_WHEN_EMPTY:
+                del entry[field]
+            else:
+                entry[field] = []
+        return entry
+
+    def _entries_in(self, active: Tuple[int, ...]) -> List[Dict[str, Any]]:
+        return [self._assemble(i, active) for i in active if self.components[i].field == ENTRY_FIELD]
+
+    def entries_as_of(self, hts_code: str, as_of: date) -> List[Dict[str, Any]]:
+        """The code's entries in effect on a date, as they would have been processed then"""
+        span = self._spans.get(_line_key(hts_code))
+        if span is None:
+            return []
+        position = bisect.bisect_right(self._segment_starts, _day(as_of, 0), *span) - 1
+        return self._entries_in(self._segments[position]) if position >= span[0] else []
+
+    def applicable_as_of(self, hts_code: str, country: str, as_of: date,
+                         usmca_origin: bool = False) -> Optional[Dict[str, Any]]:
+        """applicable_duties() of the code for an origin on a date; None when no entry was in effect"""
+        entries = self.entries_as_of(hts_code, as_of)
+        return applicable_duties(entries[0], country, usmca_origin) if entries else None  # First entry wins
+
+    def snapshot(self, as_of: date) -> List[Dict[str, Any]]:
+        """Every entry in effect on a date, in input order, as processed on that date"""
+        if not len(self.keys):
+            return []
+        rows = np.searchsorted(self._composite, self.keys << _DAY_BITS | _day(as_of, 0), side='right') - 1
+        found = (rows >= 0) & (self._segment_keys[np.maximum(rows, 0)] == self.keys)
+        pieces = []
+        for row in rows[found].tolist():
+            active = self._segments[row]
+            pieces.extend((self.components[i].entry, self._assemble(i, active))
+                          for i in active if self.components[i].field == ENTRY_FIELD)
+        pieces.sort(key=lambda piece: piece[0])
+        return [entry for _, entry in pieces]
+
+def load_timeline(path: str) -> Tuple[Dict[str, Any], TariffTimeline]:
+    """Processed output (either shape) or segment directory, and its timeline"""
+    if os.path.isdir(path):
+        data = {'tariffs': load_entries(path)}
+    else:
+        data = load_tariffs(path)
+    additive_duties_info = data.get('metadata', {}).get('additive_duties_info')
+    return data, TariffTimeline(data['tariffs'], additive_duties_info)
+
+def snapshot_output(data: Dict[str, Any], timeline: TariffTimeline, as_of: date) -> Dict[str, Any]:
+    """The processed output with `tariffs` replaced by the snapshot on a date"""
+    tariffs = timeline.snapshot(as_of)
+    output = {key: (tariffs if key == 'tariffs' else value) for key, value in data.items()}
+    metadata = output.setdefault('metadata', {})
+    metadata['as_of_snapshot'] = {
+        'as_of': as_of.isoformat(),
+        'entries_in_effect': len(tariffs),
+        'entries_not_in_effect': len(data['tariffs']) - len(tariffs),
+    }
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Look up or materialize a processed tariff output as of a date.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('tariff_data', help="Processed tariff JSON file or segment directory.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    lookup = commands.add_parser('lookup', help="Duties of one HTS code for an origin on a date.")
+    lookup.add_argument('hts_code')
+    lookup.add_argument('country', help="ISO country of origin.")
+    lookup.add_argument('as_of', metavar='YYYY-MM-DD')
+    lookup.add_argument('--usmca', action='store_true', help="USMCA-qualifying goods.")
+    snapshot = commands.add_parser('snapshot', help="Write the output as it would have been processed on a date.")
+    snapshot.add_argument('as_of', metavar='YYYY-MM-DD')
+    snapshot.add_argument('output_json')
+    args = parser.parse_args()
+
+    as_of = parse_tariff_date(args.as_of)
+    if as_of is None:
+        parser.error(f"invalid date: {args.as_of}")
+
+    started = time.perf_counter()
+    data, timeline = load_timeline(args.tariff_data)
+    print(f"Indexed {len(timeline)} dated components of {len(data['tariffs'])} entries "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    if args.command == 'lookup':
+        for component in timeline.components_as_of(args.hts_code, as_of):
+            label = (component.duty or {}).get('label') or component.field
+            end = _day_date(component.end)
+            print(f"  {_day_date(component.start).isoformat()} .. {end.isoformat() if end else 'open':<10}  {label}")
+        duties = timeline.applicable_as_of(args.hts_code, args.country, as_of, args.usmca)
+        if duties is None:
+            print(f"{args.hts_code} had no entry in effect on {as_of.isoformat()}")
+            return
+        print(json.dumps(duties, indent=2))
+        return
+
+    started = time.perf_counter()
+    output = snapshot_output(data, timeline, as_of)
+    with open(args.output_json, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    stats = output['metadata']['as_of_snapshot']
+    print(f"Snapshot as of {as_of.isoformat()}: {stats['entries_in_effect']} entries in effect, "
+          f"{stats['entries_not_in_effect']} not, in {time.perf_counter() - started:.2f}s")
+    print(f"Output written to {args.output_json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Declarative trade rule engine.
+
+Rules are read from scripts/config/trade_rules.csv and compiled into a
+decision table: every rule's HTS scope becomes prefixes in one HtsRuleIndex,
+so a single batch walk over the HTS code column finds every candidate rule
+for every code. Dates, country sets and stacking exclusions are then resolved
+per rule. Applying a changed rules file to an already processed JSON file
+only re-runs this stage, not the per-row preprocessing.
+
+Rules file columns:
+  RuleName             Unique name, also used by DoesNotStackWith
+  RuleType             e.g. Additive
+  Status               Only 'Active' rules are evaluated
+  AppliesTo_DataType   All, Chapter, Prefix, Code or Product_Type
+  AppliesTo_Value      ';'-separated chapters, prefixes, codes or product types
+  Countries            'all' or ';'-separated ISO country codes
+  Rate                 Fraction of customs value (0.25 = 25%)
+  Note                 Free text
+  EffectiveDate        Optional first day in effect (YYYY-MM-DD)
+  ExpiryDate           Optional last day in effect (YYYY-MM-DD)
+  ExcludeCountries     Optional ';'-separated countries the rule does not apply to
+  DoesNotStackWith     Optional ';'-separated rule names or additive duty types
+                       (e.g. section_232); on codes that carry any of them the
+                       rule is dropped for the countries both apply to
+  Replaces             Optional ';'-separated additive duty types the rule
+                       takes over (e.g. section_232): on the codes it applies
+                       to, the preprocessed duty of that type is dropped for
+                       the rule's countries, so the rules file sets the rate
+
+Usage:
+  python trade_rules.py <rules_csv> <processed_json> [output_json] [--as-of YYYY-MM-DD]
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from datetime import date, datetime
+from typing import Dict, Any, Optional, List, Iterable, Iterator, FrozenSet, Tuple
+
+from hts_rule_index import HtsRuleIndex
+from normalized_output import load_tariffs
+
+# Entries are evaluated in batches of this many codes when streaming
+RULE_BATCH_SIZE = 4096
+
+def _split_values(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in re.split(r'[;,]', value or '') if item.strip()]
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    value = (value or '').strip()
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+# Country sets are (countries or None for all, excluded countries)
+CountrySet = Tuple[Optional[FrozenSet[str]], FrozenSet[str]]
+
+def _country_set(duty: Dict[str, Any]) -> CountrySet:
+    countries = duty.get('countries', 'all')
+    return (None if countries == 'all' else frozenset(countries)), frozenset(duty.get('exclusions', []))
+
+def _overlap(a: CountrySet, b: CountrySet) -> CountrySet:
+    """Countries two duties both apply to"""
+    (countries_a, excluded_a), (countries_b, excluded_b) = a, b
+    excluded = excluded_a | excluded_b
+    if countries_a is None and countries_b is None:
+        return None, excluded
+    countries = countries_b if countries_a is None else countries_a if countries_b is None else countries_a & countries_b
+    return countries - excluded, frozenset()
+
+def _without_countries(duty: Dict[str, Any], overlap: CountrySet) -> Optional[Dict[str, Any]]:
+    """The duty narrowed to the countries outside `overlap`; None when none are left"""
+    countries, excluded = _country_set(duty)
+    overlap_countries, overlap_excluded = overlap
+    if overlap_countries is not None and not overlap_countries:
+        return duty
+    if overlap_countries is None:
+        # Only the countries the overlap leaves out remain
+        remaining = overlap_excluded - excluded if countries is None else countries & overlap_excluded
+        if not remaining:
+            return None
+        narrowed = {key: value for key, value in duty.items() if key != 'exclusions'}
+        narrowed['countries'] = sorted(remaining)
+        return narrowed
+    if countries is None:
+        return dict(duty, exclusions=sorted(excluded | overlap_countries))
+    remaining = [country for country in duty['countries'] if country not in overlap_countries]
+    return dict(duty, countries=remaining) if remaining else None
+
+class TradeRule:
+    """One compiled row of the rules file"""
+
+    def __init__(self, row: Dict[str, str], product_prefixes: Dict[str, List[str]]):
+        self.name = row['RuleName'].strip()
+        self.rule_type = (row.get('RuleType') or '').strip()
+        self.status = (row.get('Status') or 'Active').strip()
+        self.applies_to = (row.get('AppliesTo_DataType') or '').strip().lower()
+        self.values = _split_values(row.get('AppliesTo_Value'))
+        countries = _split_values(row.get('Countries'))
+        self.countries = None if not countries or countries[0].lower() == 'all' else countries
+        self.exclude_countries = _split_values(row.get('ExcludeCountries'))
+        self.rate = float(row.get('Rate') or 0)
+        self.note = (row.get('Note') or '').strip()
+        self.effective = _parse_date(row.get('EffectiveDate'))
+        self.expires = _parse_date(row.get('ExpiryDate'))
+        self.no_stack_with = {value.lower() for value in _split_values(row.get('DoesNotStackWith'))}
+        self.replaces = {value.lower() for value in _split_values(row.get('Replaces'))}
+        self.prefixes = self._scope_prefixes(product_prefixes)
+
+    def _scope_prefixes(self, product_prefixes: Dict[str, List[str]]) -> List[str]:
+        """Translate AppliesTo_* into HTS prefixes"""
+        if self.applies_to == 'all':
+            return ['']
+        if self.applies_to == 'chapter':
+            return [re.sub(r'[^\d]', '', value).zfill(2) for value in self.values]
+        if self.applies_to in ('prefix', 'heading', 'subheading', 'code', 'codes'):
+            return [re.sub(r'[^\d]', '', value) for value in self.values]
+        if self.applies_to == 'product_type':
+            prefixes = []
+            for value in self.values:
+                category = value.lower()
+                if category not in product_prefixes:
+                    raise ValueError(f"Rule '{self.name}': unknown product type '{value}'")
+                prefixes.extend(product_prefixes[category])
+            return prefixes
+        raise ValueError(f"Rule '{self.name}': unknown AppliesTo_DataType '{self.applies_to}'")
+
+    def in_effect(self, as_of: date) -> bool:
+        if self.status.lower() != 'active':
+            return False
+        if self.effective and as_of < self.effective:
+            return False
+        if self.expires and as_of > self.expires:
+            return False
+        return True
+
+    def duty(self) -> Dict[str, Any]:
+        """The duty object attached to every entry this rule applies to"""
+        duty = {
+            'rule': self.name,
+            'type': self.rule_type,
+            'rate': self.rate * 100,
+            'countries': self.countries or 'all',
+        }
+        if self.exclude_countries:
+            duty['exclusions'] = self.exclude_countries
+        if self.effective:
+            duty['effective'] = self.effective.isoformat()
+        if self.expires:
+            duty['expires'] = self.expires.isoformat()
+        if self.replaces:
+            duty['replaces'] = sorted(self.replaces)
+        if self.note:
+            duty['note'] = self.note
+        return duty
+
+class RuleTable:
+    """Decision table compiled from a rules file.
+
+    evaluate() answers, for a batch of HTS codes, which rules apply to each
+    one; apply() attaches them and drops the additive duties they replace.
+    Time spent and codes matched are recorded per rule.
+    """
+
+    def __init__(self, rules: List[TradeRule], as_of: date, source: str = ''):
+        self.source = source
+        self.as_of = as_of
+        self.rules = [rule for rule in rules if rule.in_effect(as_of)]
+        self.skipped = [rule.name for rule in rules if not rule.in_effect(as_of)]
+        self._duties = [rule.duty() for rule in self.rules]
+        self._names = [rule.name.lower() for rule in self.rules]
+        self._replaces = {rule.name: (rule_id, rule.replaces) for rule_id, rule in enumerate(self.rules)
+                          if rule.replaces}
+
+        self.index = HtsRuleIndex()
+        for rule_id, rule in enumerate(self.rules):
+            for prefix in rule.prefixes:
+                self.index.add(prefix, rule_id, 'trade_rules')
+
+        self.walk_seconds = 0.0
+        self.rule_stats = [{'rule': rule.name, 'matched': 0, 'applied': 0, 'replaced': 0, 'seconds': 0.0}
+                           for rule in self.rules]
+
+    def evaluate(self, codes: List[str],
+                 existing_duties: Optional[List[Iterable[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
+        """Rule duties for each code, in the order the rules appear in the file.
+
+        `existing_duties` optionally gives the additive duties already on each
+        entry (before any Replaces), which DoesNotStackWith can refer to by
+        type. A rule that does not stack with another duty is dropped only for
+        the countries both apply to; it keeps applying to the rest.
+        """
+        started = time.perf_counter()
+        candidates = self.index.categories_sorted(codes)
+        self.walk_seconds += time.perf_counter() - started
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in codes]
+        for position, found in enumerate(candidates):
+            for rule_id in sorted(found):
+                started = time.perf_counter()
+                stats = self.rule_stats[rule_id]
+                stats['matched'] += 1
+                duty = self._duties[rule_id]
+                no_stack_with = self.rules[rule_id].no_stack_with
+                if no_stack_with:
+                    conflicts = [self._duties[other] for other in found
+                                 if other != rule_id and self._names[other] in no_stack_with]
+                    if existing_duties is not None:
+                        conflicts.extend(existing for existing in existing_duties[position]
+                                         if str(existing.get('type', '')).lower() in no_stack_with)
+                    for conflict in conflicts:
+                        duty = _without_countries(duty, _overlap(_country_set(duty), _country_set(conflict)))
+                        if duty is None:
+                            break
+                if duty is not None:
+                    stats['applied'] += 1
+                    results[position].append(duty)
+                stats['seconds'] += time.perf_counter() - started
+        return results
+
+    def apply(self, entries: Iterable[Dict[str, Any]],
+              batch_size: int = RULE_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """Attach `rule_duties` to entries, evaluating them in batches.
+
+        Additive duties of a type a matched rule replaces are narrowed to the
+        countries outside the rule, or dropped.
+        """
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                yield from self._apply_batch(batch)
+                batch = []
+        if batch:
+            yield from self._apply_batch(batch)
+
+    def _apply_batch(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        codes = [entry['hts8'] for entry in batch]
+        existing = [entry.get('additive_duties', []) for entry in batch]
+        for entry, duties in zip(batch, self.evaluate(codes, existing)):
+            if duties:
+                entry['rule_duties'] = duties
+            else:
+                entry.pop('rule_duties', None)
+            if 'additive_duties' in entry:
+                entry['additive_duties'] = self._replace(entry['additive_duties'], duties)
+        return batch
+
+    def _replace(self, additive: List[Dict[str, Any]], duties: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Additive duties left once the rule duties take over the types they replace"""
+        for duty in duties:
+            if duty['rule'] not in self._replaces:
+                continue
+            rule_id, replaces = self._replaces[duty['rule']]
+            kept = []
+            for existing in additive:
+                if str(existing.get('type', '')).lower() in replaces:
+                    existing = _without_countries(existing, _overlap(_country_set(existing), _country_set(duty)))
+                if existing is not None:
+                    kept.append(existing)
+            if kept != additive:
+                self.rule_stats[rule_id]['replaced'] += 1
+                additive = kept
+        return additive
+
+    def summary(self) -> Dict[str, Any]:
+        """Evaluation report for the output metadata"""
+        return {
+            'rules_file': os.path.basename(self.source),
+            'as_of': self.as_of.isoformat(),
+            'rules_in_effect': len(self.rules),
+            'rules_skipped': self.skipped,
+            'index_walk_seconds': round(self.walk_seconds, 6),
+            'rules': [dict(stats, seconds=round(stats['seconds'], 6)) for stats in self.rule_stats],
+        }
+
+    def print_report(self):
+        print(f"\nTrade rules from {self.source} as of {self.as_of.isoformat()}:")
+        print(f"  - Batch index walk: {self.walk_seconds * 1000:.1f} ms")
+        for stats in self.rule_stats:
+            print(f"  - {stats['rule']}: {stats['applied']}/{stats['matched']} codes "
+                  f"applied/matched in {stats['seconds'] * 1000:.1f} ms"
+                  + (f", replaced the additive duty on {stats['replaced']}" if stats['replaced'] else ''))
+        for name in self.skipped:
+            print(f"  - {name}: not in effect, skipped")
+
+def load_rule_table(rules_csv: str, product_prefixes: Dict[str, List[str]],
+                    as_of: Optional[date] = None) -> RuleTable:
+    """Read and compile a rules file"""
+    with open(rules_csv, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = [row for row in csv.DictReader(f) if (row.get('RuleName') or '').strip()]
+    rules = [TradeRule(row, product_prefixes) for row in rows]
+    return RuleTable(rules, as_of or date.today(), rules_csv)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Apply trade rules to an already processed tariff JSON file.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('rules_csv', help="Path to the trade rules CSV file.")
+    parser.add_argument('processed_json', help="Path to a preprocess_tariff_data_new.py output file.")
+    parser.add_argument('output_json', nargs='?', help="Output path. Default: overwrite the input.")
+    parser.add_argument('--as-of', help="Evaluate rules in effect on this date (YYYY-MM-DD). Default: today.")
+    args = parser.parse_args()
+
+    from preprocess_tariff_data_new import PRODUCT_PREFIXES
+
+    started = time.perf_counter()
+    table = load_rule_table(args.rules_csv, PRODUCT_PREFIXES, _parse_date(args.as_of))
+
+    data = load_tariffs(args.processed_json)
+    list(table.apply(data['tariffs']))
+    data.setdefault('metadata', {})['rule_engine'] = table.summary()
+
+    output_file = args.output_json or args.processed_json
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+    table.print_report()
+    print(f"\nApplied {len(table.rules)} rules to {len(data['tariffs'])} entries "
+          f"in {time.perf_counter() - started:.2f}s")
+    print(f"Output written to {output_file}")
+
+if __name__ == '__main__':
+    main()
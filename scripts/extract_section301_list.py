@@ -1,70 +1,77 @@
-import pdfplumber
-import pandas as pd
+import argparse
+import itertools
 import os
-import re
 import sys
 
-# --- CONFIG ---
-if len(sys.argv) < 2:
-    print("Usage: python extract_section301_list.py <list_number>")
-    print("Example: python extract_section301_list.py 2")
-    print("         python extract_section301_list.py 4a")
-    sys.exit(1)
-
-list_number = sys.argv[1]
-input_pdf = f"pdfs/List {list_number}.pdf"
-output_csv = f"exports/list{list_number}_hts_extracted.csv"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+from pipeline_metrics import add_metrics_arguments, metrics_from_args
+from pdf_page_cache import DEFAULT_CACHE_DIR
+from section301_extraction import (
+    PAGES_PER_TASK, list_pdf_path, list_csv_path, iter_page_texts, scan_hts_rows, write_list_csv
+)
 
-# Check if input PDF exists
-if not os.path.exists(input_pdf):
-    print(f"❌ Error: {input_pdf} not found!")
-    print("Please make sure the PDF file is in the pdfs/ directory")
-    sys.exit(1)
+# --- CONFIG ---
+parser = argparse.ArgumentParser(
+    description="Extract HTS codes from pdfs/List <list_number>.pdf to exports/list<list_number>_hts_extracted.csv.\n"
+                "Pages of all given lists are extracted in one process pool.",
+    epilog="Example: python extract_section301_list.py 2\n"
+           "         python extract_section301_list.py 1 2 3 4a --workers 4",
+    formatter_class=argparse.RawTextHelpFormatter
+)
+parser.add_argument('list_numbers', nargs='+', metavar='list_number', help="Section 301 list (1, 2, 3, 4a).")
+parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, metavar='N',
+                    help="Extraction processes (default: one per CPU).")
+parser.add_argument('--pages-per-task', type=int, default=PAGES_PER_TASK, metavar='N',
+                    help=f"Pages extracted per pool task (default: {PAGES_PER_TASK}).")
+parser.add_argument('--no-cache', action='store_true',
+                    help="Extract every page instead of reading unchanged pages from the page cache.")
+add_metrics_arguments(parser)
+args = parser.parse_args()
 
-os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+metrics = metrics_from_args('extract_section301_list', args)
+input_pdfs = {list_number: list_pdf_path(list_number) for list_number in args.list_numbers}
 
-# --- HTS Pattern ---
-# Matches patterns like: 2845.90.00 or 8411.11.40
-hts_pattern = re.compile(r'(\d{4}\.\d{2}\.\d{2})\s+(.+?)(?=\s*\d{4}\.\d{2}\.\d{2}|$)', re.DOTALL)
+# Check if input PDFs exist
+for input_pdf in input_pdfs.values():
+    if not os.path.exists(input_pdf):
+        print(f"❌ Error: {input_pdf} not found!")
+        print("Please make sure the PDF file is in the pdfs/ directory")
+        sys.exit(1)
 
-# --- Collect Rows ---
-all_rows = []
-print(f"\n📄 Extracting HTS codes from List {list_number}...")
+# --- Extract page text of every list ---
+print(f"\n📄 Extracting HTS codes from List {', '.join(args.list_numbers)} ({args.workers} workers)...")
+pages = metrics.iterate('extract_text', iter_page_texts(
+    list(input_pdfs.values()), args.workers, args.pages_per_task,
+    cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR
+))
+pages_by_pdf = itertools.groupby(pages, key=lambda page: page[0])
+next_group = None
 
-with pdfplumber.open(input_pdf) as pdf:
-    # First pass: collect all text
-    full_text = ""
-    for i, page in enumerate(pdf.pages, start=1):
-        page_text = page.extract_text()
-        if page_text:
-            # Clean up text - replace newlines with spaces, multiple spaces with single
-            page_text = page_text.replace('\n', ' ')
-            page_text = re.sub(r'\s+', ' ', page_text)
-            full_text += page_text + " "
-        print(f"✓ Page {i} processed.")
-    
-    # Second pass: extract HTS codes and descriptions
-    matches = hts_pattern.findall(full_text)
-    for hts_code, description in matches:
-        # Clean up description
-        description = description.strip()
-        if description:
-            all_rows.append([hts_code, description])
+for list_number, input_pdf in input_pdfs.items():
+    output_csv = list_csv_path(list_number)
+    # A PDF without pages has no group, so match the groups by path, not position
+    if next_group is None:
+        next_group = next(pages_by_pdf, None)
+    if next_group is not None and next_group[0] == input_pdf:
+        list_pages, next_group = next_group[1], None
+    else:
+        list_pages = iter(())
 
-# --- Create DataFrame ---
-df = pd.DataFrame(all_rows, columns=pd.Index(["HTS_Code", "Description"]))
-df.drop_duplicates(inplace=True)
+    # --- Extract HTS codes and descriptions as the pages arrive ---
+    with metrics.stage('parse_codes') as stage:
+        all_rows = list(scan_hts_rows(text for _, text in list_pages))
+        stage.add_rows(len(all_rows))
 
-# Add List column to identify which Section 301 list this is from
-df['List'] = list_number
+    # --- Save to CSV ---
+    with metrics.stage('write_csv', rows=len(all_rows)):
+        df = write_list_csv(all_rows, list_number, output_csv)
+    print(f"\n✅ Extraction complete. Found {len(df)} unique HTS codes from List {list_number}.")
+    print(f"📁 Saved to: {output_csv}")
 
-# --- Save to CSV ---
-df.to_csv(output_csv, index=False)
-print(f"\n✅ Extraction complete. Found {len(df)} unique HTS codes from List {list_number}.")
-print(f"📁 Saved to: {output_csv}")
+    # --- Show tariff rate info ---
+    if list_number in ['1', '2', '3']:
+        print(f"💰 List {list_number} items are subject to 25% additional tariff")
+    elif list_number == '4a':
+        print("💰 List 4a items are subject to 7.5% additional tariff")
 
-# --- Show tariff rate info ---
-if list_number in ['1', '2', '3']:
-    print(f"💰 List {list_number} items are subject to 25% additional tariff")
-elif list_number == '4a':
-    print("💰 List 4a items are subject to 7.5% additional tariff") 
\ No newline at end of file
+metrics.finish(args.metrics)
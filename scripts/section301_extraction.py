@@ -0,0 +1,171 @@
+"""
+Section 301 list extraction shared by extract_section301_list.py and
+extract_list1_hts.py.
+
+Page text is extracted with pdfplumber in a process pool. Every list PDF is
+split into runs of PAGES_PER_TASK pages and the runs of all requested PDFs
+share one pool, so several lists and the pages of one long list are extracted
+at the same time. The page texts are put back in page order before the HTS
+pattern runs, so descriptions that continue on the next page match exactly as
+in a sequential run and the CSVs are unchanged. The HTS pattern is matched page
+by page as the pages arrive (scan_hts_rows), carrying only an unfinished match
+across page boundaries instead of joining the whole document first.
+
+The raw text of every page is kept in the PDF page cache (data/pdf_page_cache.py),
+so re-runs on unchanged PDFs skip pdfplumber and only re-run the cleanup and
+the HTS pattern.
+"""
+
+import multiprocessing
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple, Iterable, Iterator
+
+import pandas as pd
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+from pdf_page_cache import DEFAULT_CACHE_DIR, PdfPageCache
+
+PAGES_PER_TASK = 8
+TEXT_BACKEND = 'pdfplumber.text'
+
+# --- HTS Pattern ---
+# Matches patterns like: 2845.90.00 or 8411.11.40
+HTS_PATTERN = re.compile(r'(\d{4}\.\d{2}\.\d{2})\s+(.+?)(?=\s*\d{4}\.\d{2}\.\d{2}|$)', re.DOTALL)
+
+def list_pdf_path(list_number: str) -> str:
+    return f"pdfs/List {list_number}.pdf"
+
+def list_csv_path(list_number: str) -> str:
+    return f"exports/list{list_number}_hts_extracted.csv"
+
+def clean_page_text(text: Optional[str]) -> str:
+    """Page text on one line with single spaces ('' for pages without text)"""
+    if not text:
+        return ''
+    text = text.replace('\n', ' ')
+    return re.sub(r'\s+', ' ', text)
+
+def _open_pdf(pdf_path: str):
+    if pdfplumber is None:
+        raise ImportError("pdfplumber is required to extract uncached pages: pip install pdfplumber")
+    return pdfplumber.open(pdf_path)
+
+def page_count(pdf_path: str) -> int:
+    with _open_pdf(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def _extract_pages(task: Tuple[PdfPageCache, List[int]]) -> List[Optional[str]]:
+    """Raw text of the given pages of one PDF, written to the page cache (runs in the pool)"""
+    cache, pages = task
+    texts = []
+    with _open_pdf(cache.pdf_path) as pdf:
+        for i in pages:
+            text = pdf.pages[i].extract_text()
+            cache.put(TEXT_BACKEND, i, text)
+            texts.append(text)
+    return texts
+
+def iter_page_texts(pdf_paths: List[str], workers: Optional[int] = None,
+                    pages_per_task: int = PAGES_PER_TASK,
+                    cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> Iterator[Tuple[str, str]]:
+    """(pdf_path, cleaned page text) of every page of every PDF, in page order.
+
+    Cached pages are read back as they are reached; the rest are extracted in
+    the pool and each page is yielded as soon as its run comes back. Pass
+    cache_dir=None to extract every page.
+    """
+    plans = []
+    tasks = []
+    for pdf_path in pdf_paths:
+        cache = PdfPageCache(pdf_path, cache_dir)
+        pages = cache.page_count(lambda: page_count(pdf_path))
+        missing = [i for i in range(pages) if not cache.has(TEXT_BACKEND, i)]
+        print(f"  {os.path.basename(pdf_path)}: {pages - len(missing)}/{pages} pages cached")
+        plans.append((cache, pages, set(missing)))
+        tasks.extend((cache, missing[start:start + pages_per_task])
+                     for start in range(0, len(missing), pages_per_task))
+
+    workers = workers or os.cpu_count() or 1
+    pool = multiprocessing.Pool(min(workers, len(tasks))) if workers > 1 and len(tasks) > 1 else None
+    try:
+        # imap hands back the runs in task order while the pool works ahead
+        results = zip(tasks, pool.imap(_extract_pages, tasks) if pool else map(_extract_pages, tasks))
+        for cache, pages, missing in plans:
+            extracted: Dict[int, Optional[str]] = {}
+            for i in range(pages):
+                if i in missing:
+                    if i not in extracted:
+                        (_, run), texts = next(results)
+                        extracted = dict(zip(run, texts))
+                        print(f"✓ {os.path.basename(cache.pdf_path)}: pages {run[0] + 1}-{run[-1] + 1} processed.")
+                    text = extracted.pop(i)
+                else:
+                    try:
+                        text = cache.get(TEXT_BACKEND, i)
+                    except KeyError:  # Unreadable entry
+                        text = _extract_pages((cache, [i]))[0]
+                yield cache.pdf_path, clean_page_text(text)
+    finally:
+        if pool:
+            pool.terminate()
+
+# Text at the end of the scanned part that can still start a match once the
+# next page arrives: shorter than a code, one space and one description character
+MATCH_HEAD_LENGTH = len('0000.00.00') + 1
+
+def _row(hts_code: str, description: str) -> Optional[List[str]]:
+    # Clean up description
+    description = description.strip()
+    return [hts_code, description] if description else None
+
+def scan_hts_rows(page_texts: Iterable[str]) -> Iterator[List[str]]:
+    """Yield [HTS code, description] for every match with a non-empty description.
+
+    Matches HTS_PATTERN page by page instead of over the joined document text,
+    with the same rows as a single findall over it. A match that ends before
+    the end of the text so far was cut off by the lookahead for the next code
+    and cannot change; one that runs to the end may still grow, so it is
+    carried into the next page together with any possible start of a match.
+    """
+    tail = ''
+    for text in page_texts:
+        if not text:
+            continue
+        buffer = tail + text + ' '
+        done = 0
+        for match in HTS_PATTERN.finditer(buffer):
+            if match.end() == len(buffer):
+                done = match.start()
+                break
+            row = _row(*match.groups())
+            if row:
+                yield row
+            done = match.end()
+        else:
+            done = max(done, len(buffer) - MATCH_HEAD_LENGTH)
+        tail = buffer[done:]
+    for match in HTS_PATTERN.finditer(tail):
+        row = _row(*match.groups())
+        if row:
+            yield row
+
+def write_list_csv(rows: List[List[str]], list_number: str, output_csv: str) -> pd.DataFrame:
+    """Write the unique rows of one list to its listN_hts_extracted.csv, sorted by HTS code"""
+    df = pd.DataFrame(rows, columns=pd.Index(["HTS_Code", "Description"]))
+    df.drop_duplicates(inplace=True)
+    # consolidate_section301.py merges the lists by code; a stable sort keeps PDF order within a code
+    df.sort_values("HTS_Code", kind="stable", inplace=True)
+
+    # Add List column to identify which Section 301 list this is from
+    df['List'] = list_number
+
+    os.makedirs(os.path.dirname(output_csv) or '.', exist_ok=True)
+    df.to_csv(output_csv, index=False)
+    return df